@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models.functions import Lower
+
+from api.passwords import check_password_bounded, make_password_bounded
+
+
+class EmailBackend(ModelBackend):
+    '''
+    メールアドレス（大文字小文字を区別しない）+ パスワードでの認証
+    - LOWER(email) の一意インデックスで1回だけ引く
+    - ハッシュ計算は api.passwords のスレッドプールで行う（混み合っている場合は PasswordHashBusy = 503）
+    - ユーザーが存在しない場合もハッシュ計算は行う（応答時間でのユーザー有無の推測を防ぐ）
+    - ハッシュ方式/強度が変わっている場合は、ログイン時に再ハッシュして保存する
+    - 無効ユーザーの判定（user_can_authenticate）・権限の扱いは ModelBackend のまま
+    '''
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        User = get_user_model()
+        email = username if username is not None else kwargs.get(User.USERNAME_FIELD)
+        if email is None or password is None:
+            return None
+
+        user = User.objects.alias(email_lower=Lower("email")).filter(email_lower=email.lower()).first()
+        is_correct, must_update = check_password_bounded(password, user.password if user else None)
+        if user is None or not is_correct or not self.user_can_authenticate(user):
+            return None
+
+        if must_update:
+            user.password = make_password_bounded(password)
+            user.save(update_fields=["password"])
+        return user
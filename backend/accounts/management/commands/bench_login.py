@@ -0,0 +1,107 @@
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+
+from tenants.models import Tenant
+
+User = get_user_model()
+
+BENCH_DOMAIN = "login-bench.example.com"
+
+
+class Command(BaseCommand):
+    help = "Benchmark the login endpoint (logins/sec) against N seeded users"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100_000, help="Number of benchmark users to ensure")
+        parser.add_argument("--requests", type=int, default=2_000, help="Number of login requests to send")
+        parser.add_argument("--concurrency", type=int, default=8, help="Number of concurrent client threads")
+        parser.add_argument("--password", default="bench-password-123", help="Password for benchmark users")
+        parser.add_argument("--fail-ratio", type=float, default=0.0, help="Ratio of requests sent with a wrong password")
+        parser.add_argument("--cleanup", action="store_true", help="Delete benchmark users after the run")
+
+    def handle(self, *args, **options):
+        n_users = options["users"]
+        password = options["password"]
+
+        # ============
+        # 前提データ作成
+        # ============
+        tenant, _ = Tenant.objects.get_or_create(
+            email=f"tenant@{BENCH_DOMAIN}",
+            defaults={"tenant_name": "ログインベンチマーク", "representative_name": "ベンチマーク"},
+        )
+        self._ensure_users(tenant, n_users, password)
+
+        # ============
+        # 計測
+        # ============
+        rnd = random.Random(0)
+        jobs = [
+            (
+                f"bench{rnd.randrange(n_users)}@{BENCH_DOMAIN}",
+                password if rnd.random() >= options["fail_ratio"] else "wrong-password",
+            )
+            for _ in range(options["requests"])
+        ]
+
+        def login(job):
+            email, pw = job
+            t0 = time.perf_counter()
+            res = Client().post("/api/auth/login/", {"email": email, "password": pw}, content_type="application/json")
+            return res.status_code, time.perf_counter() - t0
+
+        def run(chunk):
+            try:
+                return [login(j) for j in chunk]
+            finally:
+                connections.close_all()
+
+        concurrency = max(1, options["concurrency"])
+        chunks = [jobs[i::concurrency] for i in range(concurrency)]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = [r for rs in pool.map(run, chunks) for r in rs]
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(r[1] * 1000 for r in results)
+        ok = sum(1 for status, _ in results if status == 200)
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+        self.stdout.write(f"users={n_users} requests={len(results)} concurrency={concurrency}")
+        self.stdout.write(f"ok={ok} failed={len(results) - ok}")
+        self.stdout.write(
+            f"latency ms: mean={statistics.fmean(latencies):.1f} p50={pct(0.50):.1f} p95={pct(0.95):.1f} p99={pct(0.99):.1f}"
+        )
+        self.stdout.write(self.style.SUCCESS(f"throughput: {len(results) / elapsed:.1f} logins/sec"))
+
+        if options["cleanup"]:
+            deleted, _ = User.objects.filter(email__endswith=f"@{BENCH_DOMAIN}").delete()
+            self.stdout.write(f"Cleanup: deleted {deleted} rows")
+
+    def _ensure_users(self, tenant, n_users, password):
+        existing = User.objects.filter(tenant=tenant, email__endswith=f"@{BENCH_DOMAIN}").count()
+        if existing >= n_users:
+            return
+
+        # ハッシュ計算は1回だけ行い、全ユーザーで共有する
+        encoded = make_password(password)
+        batch = []
+        for i in range(n_users):
+            batch.append(User(email=f"bench{i}@{BENCH_DOMAIN}", password=encoded, tenant=tenant))
+            if len(batch) >= 5_000:
+                User.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        if batch:
+            User.objects.bulk_create(batch, ignore_conflicts=True)
+        self.stdout.write(f"Seeded benchmark users: {n_users}")
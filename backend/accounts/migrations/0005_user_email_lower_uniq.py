@@ -0,0 +1,46 @@
+# Generated by Django 5.2.10 on 2026-10-19 02:52
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_case_duplicates(apps, schema_editor):
+    '''
+    大文字小文字違いで重複しているメールアドレスがあれば、一覧を出して止める（一意制約を作れないため）
+    - どのユーザーを残すかは運用で判断する（メールアドレスを変更するか、不要なユーザーを削除してから再実行する）
+    '''
+    User = apps.get_model("accounts", "User")
+    duplicates = list(
+        User.objects.annotate(email_lower=Lower("email"))
+        .values("email_lower")
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)
+        .order_by("email_lower")
+        .values_list("email_lower", flat=True)
+    )
+    if duplicates:
+        rows = User.objects.annotate(email_lower=Lower("email")).filter(email_lower__in=duplicates).order_by("email_lower", "id")
+        lines = "\n".join(f"  id={u.pk} email={u.email}" for u in rows)
+        raise RuntimeError(
+            "大文字小文字だけが違うメールアドレスのユーザーがあるため、一意制約を追加できません。"
+            f"解消してから再度 migrate してください:\n{lines}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_alter_user_tenant'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_case_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='accounts_user_email_lower_uniq'),
+        ),
+    ]
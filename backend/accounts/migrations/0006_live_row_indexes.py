@@ -0,0 +1,19 @@
+# Generated by Django 5.2.10 on 2026-10-19 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_user_email_lower_uniq'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['tenant'], name='user_live_tenant_idx'),
+        ),
+    ]
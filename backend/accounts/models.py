@@ -1,11 +1,12 @@
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils.translation import gettext_lazy as _
-from api.base import BaseModel
+from api.base import BaseModel, TenantScopedQuerySet, live_index
 from tenants.models import Tenant
 
 
-class UserManager(BaseUserManager):
+class UserManager(BaseUserManager.from_queryset(TenantScopedQuerySet)):
     use_in_migrations = True
 
     def _create_user(self, email, password, **extra_fields):
@@ -51,5 +52,14 @@ class User(AbstractUser, BaseModel):
 
     objects = UserManager()
 
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # ログイン時の LOWER(email) = ... を1回のインデックス検索で引くため（大文字小文字違いの重複も防ぐ）
+            models.UniqueConstraint(Lower("email"), name="accounts_user_email_lower_uniq"),
+        ]
+        indexes = [
+            live_index("tenant", name="user_live_tenant_idx"),
+        ]
+
     def __str__(self):
         return self.email
\ No newline at end of file
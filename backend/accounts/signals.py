@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.authentication import invalidate_users
+from tenants.models import Tenant
+from .models import User
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    '''
+    ユーザー変更（無効化・パスワード変更など）時に認証キャッシュを破棄する
+    - コミット前に破棄すると、その間のリクエストが変更前のユーザーを再びキャッシュしてしまうため、コミット後に破棄する
+    '''
+    user_ids = [instance.pk]
+    transaction.on_commit(lambda: invalidate_users(user_ids), using=kwargs.get("using"))
+
+
+@receiver([post_save, post_delete], sender=Tenant)
+def invalidate_tenant_user_cache(sender, instance, **kwargs):
+    '''
+    テナント変更時に所属ユーザーの認証キャッシュを破棄する（キャッシュ内のテナント情報が古くなるため）
+    '''
+    if kwargs.get("created"):
+        return
+    user_ids = list(User.objects.filter(tenant_id=instance.pk).values_list("id", flat=True))
+    transaction.on_commit(lambda: invalidate_users(user_ids), using=kwargs.get("using"))
@@ -1,3 +1,111 @@
-from django.test import TestCase
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 
-# Create your tests here.
+from api.authentication import _user_cache_key
+from api.passwords import PasswordHashBusy
+from tenants.models import Tenant
+from .models import User
+
+
+class AuthUserCacheTests(TestCase):
+    '''
+    JWT認証のユーザー + テナント解決がキャッシュされ、ユーザー・テナントの変更がコミット後に反映されることを確認する
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(tenant_name="テナント", representative_name="代表者", email="t@example.com")
+        cls.user = User.objects.create_user(email="auth@example.com", password="pw-12345678", tenant=cls.tenant)
+
+    def setUp(self):
+        cache.clear()
+        self.headers = {"Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    def me(self):
+        return self.client.get("/api/me/", headers=self.headers)
+
+    def test_cache_hit_and_no_password_hash(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.me().json()["email"], "auth@example.com")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.me().status_code, 200)
+
+        data = cache.get(_user_cache_key(self.user.pk))
+        self.assertNotIn(self.user.password, repr(data))
+        self.assertIn(self.tenant.tenant_name, data["tenant"])
+
+    def test_deactivation_takes_effect_after_commit(self):
+        self.me()
+        with self.captureOnCommitCallbacks() as callbacks:
+            user = User.objects.get(pk=self.user.pk)
+            user.is_active = False
+            user.save()
+        # コミット前（他のリクエストからはまだ有効に見える間）はキャッシュを破棄しない
+        self.assertIsNotNone(cache.get(_user_cache_key(self.user.pk)))
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(cache.get(_user_cache_key(self.user.pk)))
+        self.assertEqual(self.me().status_code, 401)
+
+    def test_tenant_change_invalidates_members(self):
+        self.me()
+        with self.captureOnCommitCallbacks(execute=True):
+            tenant = Tenant.objects.get(pk=self.tenant.pk)
+            tenant.tenant_name = "新テナント名"
+            tenant.save()
+        self.assertIsNone(cache.get(_user_cache_key(self.user.pk)))
+        self.me()
+        self.assertIn("新テナント名", cache.get(_user_cache_key(self.user.pk))["tenant"])
+
+
+# パスワードのハッシュ計算で PERF_LOG_MIN_MS を超えるため、テスト出力に api.perf のログを出さない
+@override_settings(PERF_LOG_MIN_MS=60_000)
+class LoginTests(TestCase):
+    '''
+    ログイン（/api/auth/login/）がメールアドレスの大文字小文字を区別せず、
+    失敗時のシグナル・無効ユーザー・再ハッシュ・ハッシュ計算の混雑（503）を扱えることを確認する
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(tenant_name="テナント", representative_name="代表者", email="t@example.com")
+        cls.user = User.objects.create_user(email="Login@Example.com", password="pw-12345678", tenant=cls.tenant)
+
+    def login(self, email, password="pw-12345678"):
+        return self.client.post("/api/auth/login/", {"email": email, "password": password}, content_type="application/json")
+
+    def test_login_is_case_insensitive(self):
+        response = self.login("login@example.COM")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {"access", "refresh"})
+
+    def test_failure_sends_user_login_failed(self):
+        failures = []
+
+        def receiver(sender, credentials, **kwargs):
+            failures.append(credentials)
+
+        user_login_failed.connect(receiver)
+        self.addCleanup(user_login_failed.disconnect, receiver)
+
+        self.assertEqual(self.login("login@example.com", "wrong-password").status_code, 400)
+        self.assertEqual(self.login("nobody@example.com").status_code, 400)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.login("login@example.com").status_code, 400)
+        self.assertEqual([c["email"] for c in failures], ["login@example.com", "nobody@example.com", "login@example.com"])
+        self.assertNotEqual(failures[0]["password"], "wrong-password")  # シグナルではパスワードは伏せられる
+
+    def test_outdated_hash_is_upgraded(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password("pw-12345678", hasher="pbkdf2_sha1"))
+        self.assertEqual(self.login("login@example.com").status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$"))
+
+    @override_settings(PASSWORD_HASH_TIMEOUT_SECONDS=0)
+    def test_busy_hash_pool_returns_503(self):
+        response = self.login("login@example.com")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["detail"], PasswordHashBusy.default_detail)
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from django.apps import apps
+from django.db import connections, transaction
+
+
+def get_archive_model(model):
+    '''
+    モデルに対応するアーカイブモデルを返す（Model.ARCHIVE_MODEL = "app_label.ModelName"）
+    '''
+    label = getattr(model, "ARCHIVE_MODEL", None)
+    return apps.get_model(label) if label else None
+
+
+def archivable_models() -> list:
+    return [m for m in apps.get_models() if get_archive_model(m) is not None]
+
+
+def _move_sql(connection, src, dst, where: str) -> str:
+    '''
+    src から条件に合う行を DELETE し、同じ列を dst へ INSERT する1文を組み立てる
+    - 列はモデル定義（src 側）の並びで明示し、テーブルの物理的な列順には依存しない
+    '''
+    qn = connection.ops.quote_name
+    cols = ", ".join(qn(f.column) for f in src._meta.concrete_fields)
+    return (
+        f"WITH moved AS (DELETE FROM {qn(src._meta.db_table)} WHERE {where} RETURNING {cols}) "
+        f"INSERT INTO {qn(dst._meta.db_table)} ({cols}) SELECT {cols} FROM moved"
+    )
+
+
+def archive_batch(model, *, cutoff: datetime, batch_size: int, lock_timeout_ms: int = 2000, using: str = "default") -> int:
+    '''
+    削除済みかつ cutoff より前に更新された行を、最大 batch_size 件アーカイブへ移動する
+    - 1バッチ = 1トランザクション = 1文（長時間のロックを取らない）
+    - 他トランザクションが掴んでいる行は SKIP LOCKED で飛ばす
+    - 戻り値: 移動した件数（0 なら対象なし）
+    '''
+    archive = get_archive_model(model)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    pk = qn(model._meta.pk.column)
+
+    where = (
+        f"{pk} IN (SELECT {pk} FROM {table} "
+        f"WHERE {qn('is_deleted')} AND {qn('updated_at')} < %s "
+        f"ORDER BY {qn('updated_at')} LIMIT %s FOR UPDATE SKIP LOCKED)"
+    )
+    sql = _move_sql(connection, model, archive, where)
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute("SELECT set_config('lock_timeout', %s, true)", [f"{lock_timeout_ms}ms"])
+        cursor.execute(sql, [cutoff, batch_size])
+        return cursor.rowcount
+
+
+def unarchive(model, *, tenant, pk, using: str = "default") -> bool:
+    '''
+    アーカイブ済みの行を元のテーブルへ戻す（id はそのまま）
+    - 呼び出し側のトランザクション内で実行する
+    - 一意制約に反する場合は IntegrityError を送出する
+    - 戻り値: 戻した行があれば True
+    '''
+    archive = get_archive_model(model)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    where = f"{qn(archive._meta.pk.column)} = %s AND {qn('tenant_id')} = %s"
+    sql = _move_sql(connection, archive, model, where)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [pk, tenant.pk])
+        return cursor.rowcount > 0
@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .async_views import health
+
+urlpatterns = [
+    path("health/", health),
+]
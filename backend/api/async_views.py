@@ -0,0 +1,126 @@
+import math
+from functools import wraps
+
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from rest_framework import exceptions
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .authentication import CachedJWTAuthentication
+
+# 非同期ビュー（ASGI 用の読み取り系）の共通部品
+# - DRF のビューは同期実行のため、読み取り系だけ Django の非同期ビュー + 非同期ORMで実装する
+# - 応答形式（ページング / エラー）は DRF 版と揃える
+
+
+def json_response(data, status: int = 200) -> JsonResponse:
+    '''
+    DRF の JSONRenderer と同じ形式（非ASCIIはそのまま / 区切りの空白なし）で JSON を返す
+    '''
+    return JsonResponse(
+        data,
+        status=status,
+        safe=False,
+        encoder=JSONEncoder,
+        json_dumps_params={"ensure_ascii": False, "separators": (",", ":")},
+    )
+
+
+def error_response(exc: exceptions.APIException) -> JsonResponse:
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    response = json_response(data, status=exc.status_code)
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        response["WWW-Authenticate"] = CachedJWTAuthentication().authenticate_header(None)
+    return response
+
+
+def async_api_view(*, auth_required: bool = True):
+    '''
+    非同期の読み取り専用ビュー（GET / HEAD）用デコレーター
+    - JWT 認証（CachedJWTAuthentication.aauthenticate）を行い、request.user / request.tenant を設定する
+    - auth_required=False でも、不正なトークンが付いていれば 401 にする（DRF と同じ）
+    - 例外は DRF と同じ形式（{"detail": ...}）で返す
+    '''
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                if request.method not in ("GET", "HEAD"):
+                    raise exceptions.MethodNotAllowed(request.method)
+
+                result = await CachedJWTAuthentication().aauthenticate(request)
+                if result is not None:
+                    request.user = result[0]
+                elif auth_required:
+                    raise exceptions.NotAuthenticated()
+
+                return await view(request, *args, **kwargs)
+            except Http404 as exc:
+                return error_response(exceptions.NotFound(*exc.args))
+            except exceptions.APIException as exc:
+                return error_response(exc)
+
+        return wrapper
+
+    return decorator
+
+
+def get_ordering(request, fields, default) -> list[str]:
+    '''
+    ordering クエリパラメータを OrderingFilter と同じ規則で解釈する
+    - 許可されていない項目は無視し、有効な項目がなければ既定の並び順
+    '''
+    param = request.GET.get("ordering")
+    if param:
+        terms = [t.strip() for t in param.split(",")]
+        terms = [t for t in terms if t and t.lstrip("-") in fields]
+        if terms:
+            return terms
+    return list(default)
+
+
+async def apaginate(request, queryset, serialize) -> dict:
+    '''
+    PageNumberPagination と同じ形式（count / next / previous / results）でページングする
+    - 件数は acount()、ページの行は非同期イテレーションで取得する
+    - serialize: 取得した行のリストを JSON 化できる値に変換する関数
+    '''
+    page_size = settings.REST_FRAMEWORK["PAGE_SIZE"]
+    count = await queryset.acount()
+    num_pages = max(1, math.ceil(count / page_size))
+
+    param = request.GET.get(PageNumberPagination.page_query_param) or "1"
+    try:
+        page = num_pages if param in PageNumberPagination.last_page_strings else int(param)
+    except ValueError:
+        page = 0
+    if not 1 <= page <= num_pages:
+        raise exceptions.NotFound(PageNumberPagination.invalid_page_message)
+
+    offset = (page - 1) * page_size
+    rows = [obj async for obj in queryset[offset:offset + page_size]]
+
+    url = request.build_absolute_uri()
+    if page == 1:
+        previous = None
+    elif page == 2:
+        previous = remove_query_param(url, PageNumberPagination.page_query_param)
+    else:
+        previous = replace_query_param(url, PageNumberPagination.page_query_param, page - 1)
+
+    return {
+        "count": count,
+        "next": replace_query_param(url, PageNumberPagination.page_query_param, page + 1) if page < num_pages else None,
+        "previous": previous,
+        "results": serialize(rows),
+    }
+
+
+@async_api_view(auth_required=False)
+async def health(request):
+    """
+    ヘルスチェック（非同期版）
+    """
+    return json_response({"status": "ok"})
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .perf import timer
+
+
+# 認証キャッシュに載せる項目（パスワードハッシュなど認証に使わない項目は載せない）
+# - キャッシュから作ったユーザー・テナントでは、それ以外の項目は遅延読み込みになる
+USER_CACHE_FIELDS = ("id", "email", "first_name", "last_name", "is_active", "is_staff", "is_superuser", "is_deleted", "tenant_id")
+TENANT_CACHE_FIELDS = ("id", "tenant_code", "tenant_name", "is_deleted")
+
+
+def _user_cache_key(user_id) -> str:
+    return f"auth_user:{user_id}"
+
+
+def _user_queryset():
+    fields = [f for f in USER_CACHE_FIELDS if f != "tenant_id"]
+    return get_user_model().objects.select_related("tenant").only(
+        *fields, "password", *(f"tenant__{f}" for f in TENANT_CACHE_FIELDS),
+    )
+
+
+def _cached_values(obj, fields) -> list:
+    # from_db に渡す順（モデルの項目順）
+    return [getattr(obj, f.attname) for f in obj._meta.concrete_fields if f.attname in fields]
+
+
+def _to_cache(user) -> dict:
+    return {
+        "user": _cached_values(user, USER_CACHE_FIELDS),
+        "tenant": _cached_values(user.tenant, TENANT_CACHE_FIELDS) if user.tenant_id else None,
+        # パスワード変更によるトークン失効の確認用（ハッシュそのものは載せない）
+        "password_md5": get_md5_hash_password(user.password),
+    }
+
+
+def _from_cache(data: dict):
+    User = get_user_model()
+    user = User.from_db(DEFAULT_DB_ALIAS, [f.attname for f in User._meta.concrete_fields if f.attname in USER_CACHE_FIELDS], data["user"])
+    tenant_field = User._meta.get_field("tenant")
+    if data["tenant"] is not None:
+        Tenant = tenant_field.related_model
+        names = [f.attname for f in Tenant._meta.concrete_fields if f.attname in TENANT_CACHE_FIELDS]
+        tenant_field.set_cached_value(user, Tenant.from_db(DEFAULT_DB_ALIAS, names, data["tenant"]))
+    user._password_md5 = data["password_md5"]
+    return user
+
+
+def load_user(user_id):
+    '''
+    ユーザー + テナントを1クエリで取得し、認証に使う項目だけを短時間キャッシュする
+    - 存在しない場合は User.DoesNotExist を送出する
+    '''
+    key = _user_cache_key(user_id)
+    data = cache.get(key)
+    if data is None:
+        data = _to_cache(_user_queryset().get(**{api_settings.USER_ID_FIELD: user_id}))
+        cache.set(key, data, timeout=settings.AUTH_USER_CACHE_SECONDS)
+    return _from_cache(data)
+
+
+async def aload_user(user_id):
+    '''
+    load_user の非同期版（非同期ビュー用）
+    '''
+    key = _user_cache_key(user_id)
+    data = await cache.aget(key)
+    if data is None:
+        data = _to_cache(await _user_queryset().aget(**{api_settings.USER_ID_FIELD: user_id}))
+        await cache.aset(key, data, timeout=settings.AUTH_USER_CACHE_SECONDS)
+    return _from_cache(data)
+
+
+def invalidate_users(user_ids) -> None:
+    '''
+    ユーザーキャッシュを破棄する（ユーザー/テナント変更時）
+    '''
+    cache.delete_many([_user_cache_key(uid) for uid in user_ids])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    '''
+    JWT認証（ユーザー + テナント解決のキャッシュ付き）
+    - ユーザーとテナントを select_related で1クエリにまとめ、AUTH_USER_CACHE_SECONDS の間キャッシュする
+    - 解決したテナントを request.tenant に格納する（以降の処理で再取得しない）
+    - ユーザー/テナントの変更時は accounts.signals でキャッシュを破棄する
+    '''
+
+    def authenticate(self, request):
+        with timer("auth"):
+            result = super().authenticate(request)
+        if result is None:
+            return None
+
+        user, validated_token = result
+        # DRF の Request ではなく元の HttpRequest に載せる（ミドルウェアからも参照できるように）
+        getattr(request, "_request", request).tenant = user.tenant
+        return user, validated_token
+
+    async def aauthenticate(self, request):
+        '''
+        authenticate の非同期版（非同期ビュー用）
+        - トークンの検証はDBを使わないためそのまま呼び、ユーザー取得だけを非同期にする
+        '''
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        with timer("auth"):
+            validated_token = self.get_validated_token(raw_token)
+            user = await self.aget_user(validated_token)
+        request.tenant = user.tenant
+        return user, validated_token
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        try:
+            user = load_user(user_id)
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+        return self.check_user(user, validated_token)
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        try:
+            user = await aload_user(user_id)
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+        return self.check_user(user, validated_token)
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+    def check_user(self, user, validated_token):
+        '''
+        simplejwt の JWTAuthentication.get_user と同じ検証（有効ユーザー / パスワード変更によるトークン失効）
+        '''
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != user._password_md5:
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
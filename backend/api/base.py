@@ -1,23 +1,300 @@
 from __future__ import annotations
 
+import codecs
 import csv
+import re
+import time
+import unicodedata
 from django.conf import settings
 from django.db import models
+from django.db.models import F, Q
+from django.contrib.postgres.indexes import OpClass
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from datetime import datetime
 from io import StringIO
+from rest_framework import serializers
 from rest_framework.response import Response
 from typing import Any, Iterable
 from django.http import HttpResponse
 from django.db import transaction, IntegrityError
 
-class BaseModel(models.Model):
+from .metrics import record_import
+
+
+# -----------------------------
+# 電話番号・Email の検索用の列
+# -----------------------------
+# 検索用の列と、その元になる列
+SEARCH_KEY_SOURCES = {"tel_digits": "tel_number", "email_lower": "email", "email_domain": "email"}
+
+
+def digits_only(value: str | None) -> str:
+    '''
+    数字だけを残す（全角数字は半角にそろえる。「03-1234-5678」「０３（１２３４）５６７８」→「0312345678」）
+    '''
+    return re.sub(r"[^0-9]", "", unicodedata.normalize("NFKC", value or ""))
+
+
+def contact_search_keys(tel_number: str | None, email: str | None) -> dict[str, str]:
+    email = (email or "").strip().lower()
+    return {
+        "tel_digits": digits_only(tel_number),
+        "email_lower": email,
+        "email_domain": email.rpartition("@")[2] if "@" in email else "",
+    }
+
+
+def with_search_keys(fields: Iterable[str]) -> list[str]:
+    '''
+    保存する列に、元の列が含まれている検索用の列を加える（save(update_fields=...) / bulk_update 用）
+    '''
+    fields = list(fields)
+    return fields + [key for key, source in SEARCH_KEY_SOURCES.items() if source in fields and key not in fields]
+
+
+def contact_search_q(q: str) -> Q | None:
+    '''
+    q= が電話番号・Email らしい場合に、検索用の列（インデックスあり）での条件を返す（それ以外は None）
+    - 数字と区切り文字だけ（数字4桁以上）: 電話番号（数字のみ）の前方一致（「0312345678」で「03-1234-5678」も引ける）
+    - 「@」を含む: 「@example.com」は Email ドメイン、それ以外は Email（小文字）の前方一致
+    - ドメインらしい文字列（example.co.jp）: Email ドメインの前方一致
+    '''
+    s = unicodedata.normalize("NFKC", q).strip().lower()
+    if re.fullmatch(r"[0-9\-‐−ー()+\s]+", s):
+        digits = digits_only(s)
+        return Q(tel_digits__startswith=digits) if len(digits) >= 4 else None
+    if "@" in s:
+        local, _, domain = s.partition("@")
+        if local:
+            return Q(email_lower__startswith=s)
+        return Q(email_domain__startswith=domain) if domain else None
+    if re.fullmatch(r"[a-z0-9\-]+(\.[a-z0-9\-]+)*\.[a-z]{2,}", s):
+        return Q(email_domain__startswith=s)
+    return None
+
+
+def search_key_index(field: str, *, name: str, scoped: bool = True) -> models.Index:
+    '''
+    検索用の列の、未削除行だけを対象にした部分インデックス
+    - text_pattern_ops で前方一致（LIKE 'abc%'）にも効く
+    - scoped=True ならテナント + 列（テナント内の検索用）
+    '''
+    expressions = [F('tenant')] if scoped else []
+    expressions.append(OpClass(F(field), name='text_pattern_ops'))
+    return models.Index(*expressions, name=name, condition=Q(is_deleted=False))
+
+
+def backfill_search_keys(model, connection, *, batch_size: int = 5000) -> None:
+    '''
+    既存行の検索用の列を埋める（マイグレーション用。model は履歴モデルでよい）
+    - 主キー順に batch_size 行ずつ更新する。atomic = False のマイグレーションから呼べば1バッチずつコミットされ、
+      1文でテーブル全体を更新して行ロックと WAL を溜め込むことがない
+    - PostgreSQL はバッチごとに UPDATE 1文で contact_search_keys() と同じ値を作る
+    '''
+    if connection.vendor == "postgresql":
+        qn = connection.ops.quote_name
+        table = qn(model._meta.db_table)
+        pk = qn(model._meta.pk.column)
+        last = 0
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"WITH batch AS (SELECT {pk} FROM {table} WHERE {pk} > %s ORDER BY {pk} LIMIT %s),"
+                    f" updated AS (UPDATE {table} SET"
+                    " tel_digits = regexp_replace(normalize(coalesce(tel_number, ''), NFKC), '[^0-9]', '', 'g'),"
+                    " email_lower = lower(btrim(coalesce(email, ''))),"
+                    " email_domain = coalesce(substring(lower(btrim(coalesce(email, ''))) from '@([^@]*)$'), '')"
+                    f" FROM batch WHERE {table}.{pk} = batch.{pk} RETURNING {table}.{pk})"
+                    f" SELECT max({pk}) FROM updated",
+                    [last, batch_size],
+                )
+                last = cursor.fetchone()[0]
+            if last is None:
+                return
+
+    queryset = model._base_manager.only("pk", "tel_number", "email").order_by("pk")
+    last = 0
+    while True:
+        objs = list(queryset.filter(pk__gt=last)[:batch_size])
+        if not objs:
+            return
+        for obj in objs:
+            for name, value in contact_search_keys(obj.tel_number, obj.email).items():
+                setattr(obj, name, value)
+        model._base_manager.bulk_update(objs, list(SEARCH_KEY_SOURCES), batch_size=batch_size)
+        last = objs[-1].pk
+
+
+class ContactSearchFields(models.Model):
+    '''
+    電話番号・Email の検索用の列（tel_number / email から保存時に作る）
+    - tel_digits: 電話番号の数字だけ / email_lower: 小文字の Email / email_domain: Email の @ 以降
+    - save() と bulk_create / bulk_update（ContactSearchQuerySet）で更新する
+      （QuerySet.update() や COPY で tel_number / email を書き換える場合は呼び出し側で合わせる）
+    '''
+    tel_digits = models.CharField(max_length=20, blank=True, default='', editable=False, verbose_name='電話番号（数字のみ）')
+    email_lower = models.CharField(max_length=254, blank=True, default='', editable=False, verbose_name='メールアドレス（小文字）')
+    email_domain = models.CharField(max_length=254, blank=True, default='', editable=False, verbose_name='メールアドレスのドメイン')
+
+    class Meta:
+        abstract = True
+
+    def refresh_search_keys(self) -> None:
+        for name, value in contact_search_keys(self.tel_number, self.email).items():
+            setattr(self, name, value)
+
+    def save(self, *args, **kwargs):
+        self.refresh_search_keys()
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = with_search_keys(kwargs["update_fields"])
+        super().save(*args, **kwargs)
+
+
+class ContactSearchQuerySet(models.QuerySet):
+    '''
+    bulk_create / bulk_update でも検索用の列（ContactSearchFields）を更新する QuerySet
+    '''
+
+    def _has_search_keys(self) -> bool:
+        return issubclass(self.model, ContactSearchFields)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        if not self._has_search_keys():
+            return super().bulk_create(objs, *args, **kwargs)
+        objs = list(objs)
+        for obj in objs:
+            obj.refresh_search_keys()
+        if kwargs.get("update_fields"):
+            kwargs["update_fields"] = with_search_keys(kwargs["update_fields"])
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if not self._has_search_keys():
+            return super().bulk_update(objs, fields, *args, **kwargs)
+        objs = list(objs)
+        for obj in objs:
+            obj.refresh_search_keys()
+        return super().bulk_update(objs, with_search_keys(fields), *args, **kwargs)
+
+
+class TenantScopedQuerySet(ContactSearchQuerySet):
+    '''
+    テナント分離 + 論理削除を考慮した QuerySet
+    - 絞り込みは明示的に行う（ビューは for_request() / for_tenant() を必ず通す）
+      既定のマネージャーでは自動で絞り込まない: テナント削除・集計・シグナルなど、
+      リクエスト内でも他テナントの行を扱う処理があり、関連の参照（_base_manager）にも効かないため
+    '''
+
+    def alive(self):
+        return self.filter(is_deleted=False)
+
+    def for_tenant(self, tenant, *, include_deleted: bool = False):
+        qs = self.filter(tenant=tenant)
+        return qs if include_deleted else qs.alive()
+
+    def for_request(self, request, *, include_deleted: bool | None = None):
+        '''
+        リクエストのテナント（request.tenant）で絞り込む
+        - include_deleted 未指定時はクエリパラメータ include_deleted=1 のときだけ削除済みも含める
+        - DRF の Request / Django の HttpRequest（非同期ビュー）のどちらでもよい
+        '''
+        if include_deleted is None:
+            params = getattr(request, "query_params", request.GET)
+            include_deleted = params.get("include_deleted") == "1"
+        return self.for_tenant(request.tenant, include_deleted=include_deleted)
+
+
+class TenantScopedManager(models.Manager.from_queryset(TenantScopedQuerySet)):
+    pass
+
+
+def live_index(*fields: str, name: str) -> models.Index:
+    '''
+    未削除行だけを対象にした部分インデックス（WHERE is_deleted = false）
+    - 一覧・検索は未削除行しか見ないため、削除済みが増えてもインデックスが肥大化しない
+    '''
+    return models.Index(fields=list(fields), name=name, condition=Q(is_deleted=False))
+
+
+class DirtyFieldsMixin:
+    '''
+    読み込み後に変更された項目だけを保存する
+    - save() で update_fields を省略すると、読み込み時から値が変わった列だけを UPDATE する
+      （auto_now の更新日時は変更があるときだけ一緒に更新する）
+    - 変更がなければ UPDATE 自体を行わない（行・インデックスを書き換えず、更新日時も変わらない）
+    - 更新者（update_user）だけが変わった場合も変更なしとみなす
+    - 保存した列は last_saved_fields に残る（[] なら変更なしで保存しなかった）
+    - 新規登録・update_fields 指定・読み込みを経ていないインスタンスは通常どおり保存する
+    '''
+    # これだけが変わっても「変更あり」としない項目
+    dirty_ignored_fields = ("update_user",)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_loaded()
+        return instance
+
+    def _remember_loaded(self, fields=None):
+        loaded = self.__dict__
+        if not hasattr(self, "_loaded_values"):
+            self._loaded_values = {}
+        for f in self._meta.concrete_fields:
+            if (fields is None or f.name in fields or f.attname in fields) and f.attname in loaded:
+                self._loaded_values[f.attname] = loaded[f.attname]
+
+    def get_dirty_fields(self) -> list[str]:
+        '''
+        読み込み時から値が変わった項目名（読み込まなかった項目は、値が設定されていれば変更ありとする）
+        '''
+        loaded = getattr(self, "_loaded_values", None)
+        if loaded is None:
+            return [f.name for f in self._meta.concrete_fields if not f.primary_key]
+        current = self.__dict__
+        return [
+            f.name for f in self._meta.concrete_fields
+            if not f.primary_key and f.attname in current
+            and (f.attname not in loaded or loaded[f.attname] != current[f.attname])
+        ]
+
+    def save(self, *args, **kwargs):
+        tracked = (
+            not self._state.adding
+            and self.pk is not None
+            and hasattr(self, "_loaded_values")
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+            and not args
+        )
+        if tracked:
+            dirty = self.get_dirty_fields()
+            if not set(dirty) - set(self.dirty_ignored_fields):
+                dirty = []
+            elif dirty:
+                dirty += [f.name for f in self._meta.concrete_fields if getattr(f, "auto_now", False) and f.name not in dirty]
+            kwargs["update_fields"] = dirty
+
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        self.last_saved_fields = (
+            list(update_fields) if update_fields is not None
+            else [f.name for f in self._meta.concrete_fields if not f.primary_key]
+        )
+        self._remember_loaded(update_fields)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._remember_loaded(fields)
+
+
+class BaseModel(DirtyFieldsMixin, models.Model):
     '''
     モデルの基底クラス
     - 論理削除
     - 作成日時 / 更新日時
     - 作成者 / 更新者
+    - テナント分離（objects.for_tenant() / objects.for_request()）
     '''
     tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE, related_name="%(class)ss", null=False, blank=False, verbose_name='テナント')
     is_deleted = models.BooleanField(default=False, verbose_name='削除フラグ')
@@ -38,6 +315,8 @@ class BaseModel(models.Model):
         verbose_name='更新ユーザー'
     )
 
+    objects = TenantScopedManager()
+
     class Meta:
         abstract = True
 
@@ -58,6 +337,7 @@ class BaseCsvImporter(ABC):
     """
 
     csv_headers: list[str] = []
+    metrics_kind: str = "csv"  # メトリクスのラベル（取込対象の種類）
     error_col_name: str = "エラー内容"
     rowno_col_name: str = "行番号"
 
@@ -65,8 +345,29 @@ class BaseCsvImporter(ABC):
         self.request = request
         self.file = file
         self._fieldnames: list[str] = []  # DictReader.fieldnames を保持
+        self._serializers: dict[type, serializers.Serializer] = {}  # 検証用（クラスごとに1つ）
+        self.validated: dict[int, dict[str, Any]] = {}  # 行番号 -> 検証済みデータ
 
     def run(self) -> HttpResponse:
+        """
+        取込を実行し、件数・処理時間をメトリクス（api.metrics）に記録する
+        """
+        started = time.perf_counter()
+        self.outcome = "failed"
+        self.processed_count = self.saved_count = self.error_count = 0
+        try:
+            return self._run()
+        finally:
+            record_import(
+                self.metrics_kind,
+                outcome=self.outcome,
+                processed=self.processed_count,
+                saved=self.saved_count,
+                errors=self.error_count,
+                seconds=time.perf_counter() - started,
+            )
+
+    def _run(self) -> HttpResponse:
         rows = list(self._read_csv_dict_rows())
 
         # rowsではなく fieldnames で検証する（0件でも検証可）
@@ -74,8 +375,12 @@ class BaseCsvImporter(ABC):
 
         # ヘッダのみのCSVを許可する
         if not rows:
+            self.outcome = "saved"
             return self.success_response(0)
 
+        # 行ごとのDB問い合わせを避けるため、重複チェックなどに使う既存データをまとめて読む
+        self.prefetch(rows)
+
         ok_rows: list[Any] = []
         error_rows: list[RowError] = []
 
@@ -87,8 +392,11 @@ class BaseCsvImporter(ABC):
                 error_rows.append(RowError(rowno=idx, row=row, errors=errs))
                 continue
             ok_rows.append(self.build_ok_row(rowno=idx, row=row, seen=seen))
+        self.processed_count = len(rows)
 
         if error_rows:
+            self.outcome = "rejected"
+            self.error_count = len(error_rows)
             return self.error_csv_response(error_rows, filename=self.error_filename())
 
         try:
@@ -104,8 +412,12 @@ class BaseCsvImporter(ABC):
                         errors=["DB登録時に整合性エラーが発生しました。再度CSV取込を実行してください。"],
                     )
                 ]
+            self.outcome = "conflict"
+            self.error_count = len(conflict)
             return self.error_csv_response(conflict, filename=self.error_filename())
 
+        self.outcome = "saved"
+        self.saved_count = created
         return self.success_response(created)
 
     # -----------------------------
@@ -114,6 +426,12 @@ class BaseCsvImporter(ABC):
     def init_seen_state(self) -> Any:
         return None
 
+    def prefetch(self, rows: list[dict[str, Any]]) -> None:
+        """
+        検証前に1回だけ呼ばれる（全行を見て、既存データの一括取得などを行う）
+        """
+        return None
+
     @abstractmethod
     def validate_row(self, *, rowno: int, row: dict[str, Any], seen: Any) -> list[str]:
         raise NotImplementedError
@@ -132,11 +450,32 @@ class BaseCsvImporter(ABC):
     # -----------------------------
     # helpers
     # -----------------------------
-    def _read_csv_dict_rows(self) -> Iterable[dict[str, Any]]:
-        raw = self.file.read().decode("utf-8-sig")
-        sio = StringIO(raw)
+    def validate_serializer(self, serializer_class: type, *, rowno: int, data: dict[str, Any]) -> list[str]:
+        """
+        1行分をシリアライザで検証し、エラー文言を返す（検証済みデータは self.validated[rowno] に残る）
+        - シリアライザはクラスごとに1つだけ作って使い回す（fields の構築を行ごとに繰り返さない）
+        """
+        serializer = self._serializers.get(serializer_class)
+        if serializer is None:
+            serializer = self._serializers[serializer_class] = serializer_class(context={"request": self.request})
+        serializer.initial_data = data
+        try:
+            self.validated[rowno] = serializer.run_validation(data)
+        except serializers.ValidationError as e:
+            errs: list[str] = []
+            for k, v in e.detail.items():
+                if isinstance(v, list):
+                    errs.append(f"{k}: " + " / ".join([str(x) for x in v]))
+                else:
+                    errs.append(f"{k}: {v}")
+            return errs
+        return []
 
-        reader = csv.DictReader(sio)
+    def _read_csv_dict_rows(self) -> Iterable[dict[str, Any]]:
+        # ファイル全体を文字列にせず、行ごとに少しずつデコードしながら読む
+        # - codecs.getreader は str.splitlines() で行を分けるため、値の中の \x85 や \u2028 でも行が切れてしまう
+        #   アップロードファイルの反復（バイト列の CR / LF で分割）をデコードして csv に渡す
+        reader = csv.DictReader(codecs.iterdecode(self.file, "utf-8-sig"))
         self._fieldnames = [h.strip() for h in (reader.fieldnames or []) if h and h.strip()]
 
         for row in reader:
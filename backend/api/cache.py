@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import hashlib
+import time
+
+from django.core.cache import cache
+
+
+def _generation_key(tenant_id: int, namespace: str) -> str:
+    return f"tenant_gen:{namespace}:{tenant_id}"
+
+
+def tenant_generation(tenant_id: int, namespace: str) -> int:
+    '''
+    テナント単位のキャッシュ世代を返す
+    - 世代をキーに含めておけば、書き込み時に世代を上げるだけで古いキャッシュを無効化できる
+    - 世代キーが消えた場合に過去の世代と衝突しないよう、初期値は現在時刻（ミリ秒）にする
+    '''
+    key = _generation_key(tenant_id, namespace)
+    gen = cache.get(key)
+    if gen is None:
+        gen = int(time.time() * 1000)
+        cache.add(key, gen, timeout=None)
+        gen = cache.get(key, gen)
+    return gen
+
+
+def bump_tenant_generation(tenant_id: int, namespace: str) -> None:
+    '''
+    テナント単位のキャッシュ世代を上げる
+    '''
+    key = _generation_key(tenant_id, namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), timeout=None)
+
+
+def tenant_cache_key(prefix: str, tenant_id: int, namespace: str, *parts) -> str:
+    '''
+    世代付きのキャッシュキーを組み立てる
+    - 利用者入力を含むため、可変部分はハッシュ化してキー長・使用文字を安定させる
+    '''
+    digest = hashlib.sha1("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return f"{prefix}:{tenant_id}:{tenant_generation(tenant_id, namespace)}:{digest}"
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+from .cache import bump_tenant_generation
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    '''
+    変更イベント（クライアントへ送る最小限の情報）
+    - id / updated_at が分かればクライアントは該当行だけ再取得できる
+    - 一括取込などは id=None + count で通知する
+    '''
+    tenant_id: int
+    model: str
+    op: str
+    id: int | None = None
+    updated_at: str | None = None
+    count: int | None = None
+
+    def to_json(self) -> str:
+        data = {k: v for k, v in asdict(self).items() if v is not None and k != "tenant_id"}
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+    def to_payload(self) -> str:
+        return json.dumps(asdict(self), separators=(",", ":"))
+
+    @classmethod
+    def from_payload(cls, payload: str) -> ChangeEvent:
+        return cls(**json.loads(payload))
+
+
+class Subscription:
+    '''
+    1ストリーム分の購読
+    - asyncio.Queue は購読したイベントループに紐づくため、配信は call_soon_threadsafe で行う
+    - キューが溢れた場合は overflowed を立て、クライアントに全件再取得を促す
+    '''
+
+    def __init__(self, broker: ChangeBroker, tenant_id: int, maxsize: int):
+        self.broker = broker
+        self.tenant_id = tenant_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue[ChangeEvent] = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def _put(self, event: ChangeEvent) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def deliver(self, event: ChangeEvent) -> None:
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    async def get(self, timeout: float) -> ChangeEvent | None:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+
+class BaseChangeBackend(ABC):
+    '''
+    プロセス間の中継バックエンドの規定クラス
+    - publish(): コミット後のイベントを全プロセスへ送る
+    - start(): 他プロセス（自プロセス含む）からのイベントを broker.dispatch() へ渡し始める
+    '''
+
+    @abstractmethod
+    def publish(self, event: ChangeEvent) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def start(self, broker: ChangeBroker) -> None:
+        raise NotImplementedError
+
+
+class LocalBackend(BaseChangeBackend):
+    '''
+    単一プロセス用（テスト・runserver 用）
+    '''
+
+    def __init__(self):
+        self.broker: ChangeBroker | None = None
+
+    def publish(self, event: ChangeEvent) -> None:
+        if self.broker is not None:
+            self.broker.dispatch(event)
+
+    def start(self, broker: ChangeBroker) -> None:
+        self.broker = broker
+
+
+class PostgresNotifyBackend(BaseChangeBackend):
+    '''
+    PostgreSQL LISTEN/NOTIFY による中継
+    - publish はリクエスト処理中の接続で pg_notify() を発行する
+    - 受信は専用スレッドが専用接続で LISTEN し続ける（切断時は再接続）
+    '''
+
+    channel = "change_feed"
+    reconnect_seconds = 3.0
+
+    def __init__(self):
+        self._thread: threading.Thread | None = None
+
+    def publish(self, event: ChangeEvent) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [self.channel, event.to_payload()])
+
+    def start(self, broker: ChangeBroker) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._listen_forever, args=(broker,), name="change-feed-listener", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        import psycopg
+
+        db = settings.DATABASES["default"]
+        return psycopg.connect(
+            dbname=db.get("NAME"),
+            user=db.get("USER"),
+            password=db.get("PASSWORD"),
+            host=db.get("HOST"),
+            port=db.get("PORT") or None,
+            autocommit=True,
+        )
+
+    def _listen_forever(self, broker: ChangeBroker) -> None:
+        while True:
+            try:
+                with self._connect() as conn:
+                    conn.execute(f"LISTEN {self.channel}")
+                    for notify in conn.notifies():
+                        try:
+                            broker.dispatch(ChangeEvent.from_payload(notify.payload))
+                        except (TypeError, ValueError):
+                            logger.warning("invalid change feed payload: %r", notify.payload)
+            except Exception:
+                logger.exception("change feed listener disconnected")
+            time.sleep(self.reconnect_seconds)
+
+
+class ChangeBroker:
+    '''
+    プロセス内のファンアウト
+    - テナント単位で購読を管理する
+    - バックエンドの受信は最初の購読時に開始する（SSEを配信しないプロセスでは LISTEN しない）
+    '''
+
+    def __init__(self, backend: BaseChangeBackend, queue_size: int = 1000):
+        self.backend = backend
+        self.queue_size = queue_size
+        self._subs: dict[int, set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+    def subscribe(self, tenant_id: int) -> Subscription:
+        sub = Subscription(self, tenant_id, self.queue_size)
+        with self._lock:
+            self._subs.setdefault(tenant_id, set()).add(sub)
+            if not self._started:
+                self.backend.start(self)
+                self._started = True
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            subs = self._subs.get(sub.tenant_id)
+            if subs is None:
+                return
+            subs.discard(sub)
+            if not subs:
+                del self._subs[sub.tenant_id]
+
+    def publish(self, event: ChangeEvent) -> None:
+        self.backend.publish(event)
+
+    def dispatch(self, event: ChangeEvent) -> None:
+        with self._lock:
+            subs = list(self._subs.get(event.tenant_id, ()))
+        for sub in subs:
+            sub.deliver(event)
+
+
+_broker: ChangeBroker | None = None
+_broker_lock = threading.Lock()
+
+
+def get_broker() -> ChangeBroker:
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend_cls = import_string(settings.CHANGE_FEED_BACKEND)
+                _broker = ChangeBroker(backend_cls(), queue_size=settings.CHANGE_FEED_QUEUE_SIZE)
+    return _broker
+
+
+def publish_change(*, tenant_id: int, model: str, op: str, pk: int | None = None, updated_at: Any = None, count: int | None = None) -> None:
+    '''
+    変更イベントをコミット後に発行する
+    - ロールバックされた変更は通知しない
+    - 通知の失敗で書き込み処理自体を失敗させない（robust=True）
+    - 同時にテナント単位のキャッシュ世代（model 名ごと）を上げる
+    '''
+    event = ChangeEvent(
+        tenant_id=tenant_id,
+        model=model,
+        op=op,
+        id=pk,
+        updated_at=updated_at.isoformat() if updated_at is not None else None,
+        count=count,
+    )
+    transaction.on_commit(lambda: bump_tenant_generation(tenant_id, model), robust=True)
+    transaction.on_commit(lambda: get_broker().publish(event), robust=True)
+
+
+def publish_instance_change(instance, op: str, *, tenant_id: int | None = None) -> None:
+    '''
+    モデルインスタンスの変更イベントを発行する
+    - tenant_id 未指定時は instance.tenant_id（BaseModel 派生）を使う
+    '''
+    publish_change(
+        tenant_id=tenant_id if tenant_id is not None else instance.tenant_id,
+        model=instance._meta.model_name,
+        op=op,
+        pk=instance.pk,
+        updated_at=getattr(instance, "updated_at", None),
+    )
@@ -0,0 +1,43 @@
+from django.db import connections
+
+
+def connection_stats(alias: str) -> dict:
+    '''
+    接続の利用状況（このワーカープロセス分）を返す
+    - プール使用時: psycopg_pool の統計（累計値はプロセス起動からの合計）
+    - 永続接続時: 設定値と現在の接続有無のみ
+    '''
+    connection = connections[alias]
+    pool = connection.pool
+    if pool is None:
+        return {
+            "mode": "persistent",
+            "conn_max_age": connection.settings_dict["CONN_MAX_AGE"],
+            "health_checks": connection.settings_dict["CONN_HEALTH_CHECKS"],
+            "connected": connection.connection is not None,
+        }
+
+    stats = pool.get_stats()
+    size = stats.get("pool_size", 0)
+    available = stats.get("pool_available", 0)
+    queued = stats.get("requests_queued", 0)
+    wait_ms = stats.get("requests_wait_ms", 0)
+    return {
+        "mode": "pool",
+        "min_size": pool.min_size,
+        "max_size": pool.max_size,
+        "timeout": pool.timeout,
+        "size": size,
+        "in_use": size - available,
+        "available": available,
+        "waiting": stats.get("requests_waiting", 0),
+        "requests": stats.get("requests_num", 0),
+        "requests_queued": queued,
+        "requests_timeouts": stats.get("requests_errors", 0),
+        "wait_ms_total": wait_ms,
+        "wait_ms_avg": round(wait_ms / queued, 1) if queued else 0,
+        "connections_opened": stats.get("connections_num", 0),
+        "connections_errors": stats.get("connections_errors", 0),
+        "connections_lost": stats.get("connections_lost", 0),
+        "raw": stats,
+    }
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# 現在のリクエストで読み取りに使う接続
+# - None    : プライマリ（管理コマンド・シェル・テストなどリクエスト外の既定）
+# - "replica": リードレプリカ（ReplicaRoutingMiddleware が安全なメソッドのときに設定）
+# - "pinned" : このリクエスト内で書き込みがあったためプライマリに固定
+_read_mode: ContextVar[str | None] = ContextVar("db_read_mode", default=None)
+
+REPLICA = "replica"
+PINNED = "pinned"
+
+
+def replica_alias() -> str | None:
+    '''
+    設定されているリードレプリカの接続名（未設定なら None）
+    '''
+    return getattr(settings, "DATABASE_REPLICA_ALIAS", None)
+
+
+@contextmanager
+def read_from_replica():
+    '''
+    ブロック内の読み取りをリードレプリカへ振り分ける（書き込みがあった時点でプライマリに固定される）
+    '''
+    token = _read_mode.set(REPLICA)
+    try:
+        yield
+    finally:
+        _read_mode.reset(token)
+
+
+def pin_to_primary() -> None:
+    '''
+    以降の読み取りをプライマリに固定する（自分の書き込みを直後に読めるようにする）
+    '''
+    if _read_mode.get() == REPLICA:
+        _read_mode.set(PINNED)
+
+
+def is_pinned() -> bool:
+    return _read_mode.get() == PINNED
+
+
+class PrimaryReplicaRouter:
+    '''
+    読み取りはリードレプリカ、書き込みはプライマリへ振り分けるルーター
+    - レプリカを使うのは read_from_replica() の中だけ（リクエスト外は常にプライマリ）
+    - 一度書き込んだら、そのリクエストの残りの読み取りはプライマリへ
+    - プライマリでトランザクション中の読み取りはプライマリへ（同じトランザクションの結果を読むため）
+    - マイグレーションはプライマリのみ（レプリカは複製で追従する）
+    '''
+
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        if not alias or _read_mode.get() != REPLICA:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # プライマリとレプリカは同じデータなので、どちらから読んだオブジェクト同士でも関連付けてよい
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,48 @@
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.archive import archivable_models, archive_batch, get_archive_model
+
+
+class Command(BaseCommand):
+    help = "Move rows soft-deleted longer than the retention window into their archive tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.ARCHIVE_RETENTION_DAYS, help="Retention window in days")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows moved per transaction")
+        parser.add_argument("--sleep", type=float, default=0.1, help="Seconds to sleep between batches")
+        parser.add_argument("--max-batches", type=int, default=0, help="Stop after N batches per model (0 = no limit)")
+        parser.add_argument("--model", action="append", default=[], help="app_label.ModelName (repeatable, default: all archivable models)")
+
+    def handle(self, *args, **options):
+        if options["model"]:
+            models = [apps.get_model(label) for label in options["model"]]
+            for m in models:
+                if get_archive_model(m) is None:
+                    raise CommandError(f"{m._meta.label} にはアーカイブモデルがありません")
+        else:
+            models = archivable_models()
+
+        cutoff = timezone.now() - timedelta(days=options["days"])
+
+        for model in models:
+            total = 0
+            batches = 0
+            while True:
+                moved = archive_batch(model, cutoff=cutoff, batch_size=options["batch_size"])
+                if not moved:
+                    break
+                total += moved
+                batches += 1
+                self.stdout.write(f"{model._meta.label}: batch {batches} moved {moved} rows")
+                if options["max_batches"] and batches >= options["max_batches"]:
+                    break
+                # 他のリクエストへの影響を抑えるため少し待つ
+                time.sleep(options["sleep"])
+
+            self.stdout.write(self.style.SUCCESS(f"{model._meta.label}: archived {total} rows (deleted before {cutoff:%Y-%m-%d})"))
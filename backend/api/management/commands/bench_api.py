@@ -0,0 +1,280 @@
+import io
+import json
+import logging
+import math
+import os
+import platform
+import re
+import statistics
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+
+from partners.models import Partner
+from partners.services.partner_csv_importer import CSV_HEADERS
+from tenants.models import Tenant
+from tenants.stats import reconcile
+
+# API ベンチマーク（回帰検知用）
+# - config/urls.py の URL をテストクライアント経由で叩く（ミドルウェア・認証・シリアライズまで含めて計測）
+# - データは seed_dataset で作る固定データ（シード固定のため、どの環境でも同じ内容になる）
+# - SQL 件数は環境によらず決まるため、基準値より増えたら必ず失敗にする
+#   応答時間は環境差があるため、基準値に対する許容幅（--tolerance）を超えたときだけ失敗にする
+
+BENCH_SEED = 4040
+BENCH_DOMAIN = f"seed{BENCH_SEED}.example.com"
+BENCH_PASSWORD = "seed-password"
+IMPORT_DOMAIN = "bench-import.example.com"
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / "benchmarks" / "api_baseline.json"
+
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+class Command(BaseCommand):
+    help = "Benchmark the main API endpoints in-process and compare latency / query counts against a baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--partners", type=int, default=5_000, help="Partners in the benchmark tenant")
+        parser.add_argument("--iterations", type=int, default=30, help="Measured calls per scenario")
+        parser.add_argument("--warmup", type=int, default=3, help="Unmeasured calls per scenario")
+        parser.add_argument("--scenario", action="append", default=[], help="Run only these scenarios (repeatable)")
+        parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="Baseline JSON file")
+        parser.add_argument(
+            "--tolerance", type=float, default=0.5,
+            help="Allowed p95 slowdown against the baseline (0.5 = 50%%, plus --slack-ms)",
+        )
+        parser.add_argument("--slack-ms", type=float, default=2.0, help="Absolute p95 slack in ms for very fast endpoints")
+        parser.add_argument("--update-baseline", action="store_true", help="Write this run's results as the new baseline")
+        parser.add_argument("--json", dest="json_path", help="Also write this run's results to a JSON file")
+        parser.add_argument("--list", action="store_true", help="List scenarios and exit")
+
+    def handle(self, *args, **options):
+        scenarios = SCENARIOS
+        if options["list"]:
+            for name, _ in scenarios:
+                self.stdout.write(name)
+            return
+        if options["scenario"]:
+            unknown = set(options["scenario"]) - {name for name, _ in scenarios}
+            if unknown:
+                raise CommandError(f"不明なシナリオです: {', '.join(sorted(unknown))}")
+            scenarios = [s for s in scenarios if s[0] in options["scenario"]]
+
+        results = {}
+        # 計測中は api.perf のリクエストログを止め、Server-Timing から SQL 件数を読む
+        perf_logger = logging.getLogger("api.perf")
+        level = perf_logger.level
+        perf_logger.setLevel(logging.WARNING)
+        bench = None
+        try:
+            bench = self._prepare(options["partners"])
+            with override_settings(PERF_SERVER_TIMING_HEADER=True):
+                for name, scenario in scenarios:
+                    results[name] = self._measure(bench, scenario, options["iterations"], options["warmup"])
+                    self._report(name, results[name])
+        finally:
+            perf_logger.setLevel(level)
+            if bench is not None:
+                Partner.objects.filter(tenant=bench.tenant, email__endswith=f"@{IMPORT_DOMAIN}").delete()
+                reconcile([bench.tenant.pk])
+
+        run = {"environment": environment(options), "results": results}
+        if options["json_path"]:
+            Path(options["json_path"]).write_text(json.dumps(run, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+        baseline_path = Path(options["baseline"])
+        if options["update_baseline"]:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(run, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {baseline_path}"))
+            return
+
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(f"No baseline at {baseline_path} (run with --update-baseline)"))
+            return
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+        regressions = compare(baseline["results"], results, options["tolerance"], options["slack_ms"])
+        for line in regressions:
+            self.stdout.write(self.style.ERROR(line))
+        if regressions:
+            raise CommandError(f"{len(regressions)} 件の性能劣化を検出しました（基準値: {baseline_path}）")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {baseline_path}"))
+
+    # -----------------------------
+    # 準備
+    # -----------------------------
+    def _prepare(self, n_partners):
+        '''
+        ベンチマーク用テナントを用意し（件数が違えば作り直す）、ログイン済みのクライアントを返す
+        '''
+        tenant = Tenant.objects.filter(email=f"tenant1@{BENCH_DOMAIN}").first()
+        if tenant is None or Partner.objects.filter(tenant=tenant).count() != n_partners:
+            self.stdout.write(f"Seeding benchmark tenant with {n_partners:,} partners ...")
+            call_command(
+                "seed_dataset", tenants=1, users_per_tenant=1, partners_per_tenant=n_partners,
+                seed=BENCH_SEED, password=BENCH_PASSWORD, reset=tenant is not None, stdout=io.StringIO(),
+            )
+            tenant = Tenant.objects.get(email=f"tenant1@{BENCH_DOMAIN}")
+
+        client = Client()
+        email = f"user1.t1@{BENCH_DOMAIN}"
+        response = client.post("/api/auth/login/", {"email": email, "password": BENCH_PASSWORD}, content_type="application/json")
+        if response.status_code != 200:
+            raise CommandError(f"ベンチマーク用ユーザーでログインできません: {response.status_code}")
+
+        live = Partner.objects.for_tenant(tenant).order_by("pk")
+        n_live = live.count()
+        return Bench(
+            client=client,
+            tenant=tenant,
+            email=email,
+            headers={"Authorization": f"Bearer {response.json()['access']}"},
+            partner_pk=live.values_list("pk", flat=True)[n_live // 2],
+            last_page=max(1, math.ceil(n_live / settings.REST_FRAMEWORK["PAGE_SIZE"])),
+        )
+
+    # -----------------------------
+    # 計測
+    # -----------------------------
+    def _measure(self, bench, scenario, iterations, warmup):
+        latencies, queries, statuses = [], [], set()
+        for i in range(warmup + iterations):
+            started = time.perf_counter()
+            response = scenario(bench, i)
+            elapsed = (time.perf_counter() - started) * 1000
+            if response.status_code >= 400:
+                raise CommandError(f"{response.status_code} が返りました: {response.content[:200]!r}")
+            if i < warmup:
+                continue
+            latencies.append(elapsed)
+            statuses.add(response.status_code)
+            match = SERVER_TIMING_QUERIES.search(response.get("Server-Timing", ""))
+            queries.append(int(match.group(1)) if match else None)
+
+        latencies.sort()
+        counted = [q for q in queries if q is not None]
+        return {
+            "calls": iterations,
+            "status": sorted(statuses),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "mean_ms": round(statistics.fmean(latencies), 2),
+            "queries": max(counted) if counted else None,
+        }
+
+    def _report(self, name, r):
+        self.stdout.write(
+            f"{name:<36} p50={r['p50_ms']:>8.2f}ms p95={r['p95_ms']:>8.2f}ms p99={r['p99_ms']:>8.2f}ms "
+            f"queries/call={r['queries'] if r['queries'] is not None else '-'}"
+        )
+
+
+class Bench:
+    def __init__(self, *, client, tenant, email, headers, partner_pk, last_page):
+        self.client = client
+        self.tenant = tenant
+        self.email = email
+        self.headers = headers
+        self.partner_pk = partner_pk
+        self.last_page = last_page
+
+    def get(self, path, params=None):
+        return self.client.get(path, params or {}, headers=self.headers)
+
+
+def import_csv(bench, i):
+    '''
+    毎回別の取引先名で20件取り込む（取り込んだ行は計測後に削除する）
+    '''
+    rows = [",".join(CSV_HEADERS)]
+    rows += [
+        f"ベンチ取込{i:04d}-{n:02d},ベンチトリコミ,顧客,担当 太郎,03-0000-0000,p{i}-{n}@{IMPORT_DOMAIN},100-0001,東京都,千代田区,千代田1-1,,"
+        for n in range(20)
+    ]
+    file = SimpleUploadedFile("partners.csv", ("\n".join(rows) + "\n").encode("utf-8"), content_type="text/csv")
+    return bench.client.post("/api/partners/import/", {"file": file}, headers=bench.headers)
+
+
+# (シナリオ名, 1回分の呼び出し)
+SCENARIOS = [
+    (
+        "login",
+        lambda b, i: b.client.post(
+            "/api/auth/login/", {"email": b.email, "password": BENCH_PASSWORD}, content_type="application/json"
+        ),
+    ),
+    ("me", lambda b, i: b.get("/api/me/")),
+    ("partner_list", lambda b, i: b.get("/api/partners/")),
+    ("partner_list_type", lambda b, i: b.get("/api/partners/", {"partner_type": "supplier"})),
+    ("partner_list_include_deleted", lambda b, i: b.get("/api/partners/", {"include_deleted": "1"})),
+    *[
+        (f"partner_list_order_{field.lstrip('-')}{'_desc' if field.startswith('-') else ''}",
+         lambda b, i, field=field: b.get("/api/partners/", {"ordering": field}))
+        for field in ("partner_name", "-updated_at", "created_at", "email", "tel_number", "partner_type")
+    ],
+    ("partner_list_deep_page", lambda b, i: b.get("/api/partners/", {"page": b.last_page})),
+    ("partner_search", lambda b, i: b.get("/api/partners/", {"q": "山田"})),
+    ("partner_search_type", lambda b, i: b.get("/api/partners/", {"q": "商事", "partner_type": "customer"})),
+    ("partner_suggest", lambda b, i: b.get("/api/partners/suggest/", {"prefix": "株式会社サ"})),
+    ("partner_retrieve", lambda b, i: b.get(f"/api/partners/{b.partner_pk}/")),
+    (
+        "partner_update",
+        lambda b, i: b.client.patch(
+            f"/api/partners/{b.partner_pk}/", {"contact_name": f"ベンチ 更新{i}"},
+            content_type="application/json", headers=b.headers,
+        ),
+    ),
+    ("partner_export", lambda b, i: b.get("/api/partners/export/")),
+    ("partner_import", import_csv),
+]
+
+
+def percentile(sorted_values, p):
+    '''
+    最近傍順位法のパーセンタイル（sorted_values は昇順）
+    '''
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def compare(baseline, results, tolerance, slack_ms):
+    '''
+    基準値との比較結果（劣化のみ）を返す
+    - SQL 件数: 1件でも増えたら劣化
+    - p95: 基準値 * (1 + tolerance) + slack_ms を超えたら劣化
+    '''
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if r["queries"] is not None and base["queries"] is not None and r["queries"] > base["queries"]:
+            regressions.append(f"{name}: queries/call {base['queries']} -> {r['queries']}")
+        limit = base["p95_ms"] * (1 + tolerance) + slack_ms
+        if r["p95_ms"] > limit:
+            regressions.append(f"{name}: p95 {base['p95_ms']:.2f}ms -> {r['p95_ms']:.2f}ms (limit {limit:.2f}ms)")
+    return regressions
+
+
+def environment(options):
+    '''
+    計測環境（基準値と比べるときの参考情報）
+    '''
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT version()" if connection.vendor == "postgresql" else "SELECT 1")
+        db_version = str(cursor.fetchone()[0])
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "database": db_version.split(",")[0],
+        "partners": options["partners"],
+        "iterations": options["iterations"],
+    }
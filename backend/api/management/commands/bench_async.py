@@ -0,0 +1,263 @@
+import asyncio
+import io
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from config.asgi import application as asgi_application
+from config.wsgi import application as wsgi_application
+from partners.models import Partner
+from tenants.models import Tenant
+from tenants.stats import reconcile
+
+User = get_user_model()
+
+BENCH_DOMAIN = "async-bench.example.com"
+
+# 計測対象: (同期版のパス, 非同期版のパス)
+ENDPOINTS = {
+    "list": ("/api/partners/?ordering=-updated_at", "/api/async/partners/?ordering=-updated_at"),
+    "search": ("/api/partners/?q=ベンチ", "/api/async/partners/?q=ベンチ"),
+    "detail": ("/api/partners/{pk}/", "/api/async/partners/{pk}/"),
+    "export": ("/api/partners/export/", "/api/async/partners/export/"),
+    "health": ("/api/health/", "/api/async/health/"),
+}
+
+
+class Command(BaseCommand):
+    help = "Compare sync (WSGI, thread pool) and async (ASGI, single event loop) throughput of the read endpoints"
+
+    # テストクライアントではなく config.wsgi / config.asgi のアプリケーションを直接呼ぶ
+    # （AsyncClient はリクエストごとのスレッド分離を行わず、非同期ORMが1スレッドに直列化されるため）
+
+    def add_arguments(self, parser):
+        parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="list", help="Endpoint to benchmark")
+        parser.add_argument("--partners", type=int, default=2_000, help="Number of benchmark partners to ensure")
+        parser.add_argument("--requests", type=int, default=500, help="Number of requests per mode")
+        parser.add_argument("--threads", type=int, default=8, help="Worker threads for the sync (WSGI) run")
+        parser.add_argument("--concurrency", type=int, default=64, help="In-flight requests for the async (ASGI) run")
+        parser.add_argument(
+            "--db-latency-ms", type=float, default=0,
+            help="Artificial latency added to every SQL query (simulates a slow or remote database)",
+        )
+        parser.add_argument("--cleanup", action="store_true", help="Delete benchmark data after the run")
+
+    def handle(self, *args, **options):
+        # ============
+        # 前提データ作成
+        # ============
+        tenant, _ = Tenant.objects.get_or_create(
+            email=f"tenant@{BENCH_DOMAIN}",
+            defaults={"tenant_name": "非同期ベンチマーク", "representative_name": "ベンチマーク"},
+        )
+        user, _ = User.objects.get_or_create(email=f"user@{BENCH_DOMAIN}", defaults={"tenant": tenant})
+        self._ensure_partners(tenant, options["partners"])
+
+        token = str(RefreshToken.for_user(user).access_token)
+        headers = {"authorization": f"Bearer {token}"}
+        pk = Partner.objects.for_tenant(tenant).values_list("pk", flat=True).first()
+        sync_path, async_path = (p.format(pk=pk) for p in ENDPOINTS[options["endpoint"]])
+
+        if options["db_latency_ms"]:
+            self._install_db_latency(options["db_latency_ms"] / 1000)
+
+        # 同期版と非同期版で同じ内容を返すことを確認する
+        _, sync_body = wsgi_get(sync_path, headers)
+        _, async_body = asyncio.run(asgi_get(async_path, headers))
+        async_body = async_body.replace(b"/api/async/", b"/api/")
+        if sync_body != async_body:
+            self.stdout.write(self.style.WARNING("Sync and async responses differ"))
+
+        # ============
+        # 計測
+        # ============
+        n = options["requests"]
+        self.stdout.write(
+            f"endpoint={options['endpoint']} requests={n} db_latency_ms={options['db_latency_ms']:g}"
+        )
+        sync_results, sync_elapsed = self._run_sync(sync_path, headers, n, max(1, options["threads"]))
+        self._report(f"sync  (WSGI, {options['threads']} threads)", sync_results, sync_elapsed)
+        self._use_asgi_connection_settings()
+        async_results, async_elapsed = asyncio.run(
+            self._run_async(async_path, headers, n, max(1, options["concurrency"]))
+        )
+        self._report(f"async (ASGI, {options['concurrency']} in flight)", async_results, async_elapsed)
+
+        if sync_elapsed and async_elapsed:
+            ratio = (len(async_results) / async_elapsed) / (len(sync_results) / sync_elapsed)
+            self.stdout.write(self.style.SUCCESS(f"async/sync throughput ratio: {ratio:.2f}x"))
+
+        if options["cleanup"]:
+            deleted, _ = Tenant.objects.filter(email=f"tenant@{BENCH_DOMAIN}").delete()
+            self.stdout.write(f"Cleanup: deleted {deleted} rows")
+
+    def _run_sync(self, path, headers, n, threads):
+        def run(count):
+            try:
+                results = []
+                for _ in range(count):
+                    t0 = time.perf_counter()
+                    status, _ = wsgi_get(path, headers)
+                    results.append((status, time.perf_counter() - t0))
+                return results
+            finally:
+                connections.close_all()
+
+        counts = [n // threads + (1 if i < n % threads else 0) for i in range(threads)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = [r for rs in pool.map(run, counts) for r in rs]
+        return results, time.perf_counter() - started
+
+    async def _run_async(self, path, headers, n, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                t0 = time.perf_counter()
+                status, _ = await asgi_get(path, headers)
+                return status, time.perf_counter() - t0
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(n)))
+        return results, time.perf_counter() - started
+
+    def _report(self, label, results, elapsed):
+        latencies = sorted(r[1] * 1000 for r in results)
+        ok = sum(1 for status, _ in results if status == 200)
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+        self.stdout.write(
+            f"{label}: ok={ok}/{len(results)} throughput={len(results) / elapsed:.1f} req/s "
+            f"latency ms: mean={statistics.fmean(latencies):.1f} p50={pct(0.50):.1f} "
+            f"p95={pct(0.95):.1f} p99={pct(0.99):.1f}"
+        )
+
+    def _use_asgi_connection_settings(self):
+        '''
+        config.asgi と同じく、プールを使わない場合は永続接続を無効にする
+        （設定は manage.py 起動時に読み込み済みのため、ここで接続設定を上書きする）
+        '''
+        connections.close_all()
+        for connection in connections.all():
+            if connection.pool is None:
+                connection.settings_dict["CONN_MAX_AGE"] = 0
+
+    def _install_db_latency(self, seconds):
+        '''
+        以降に作られる接続で、全クエリの前に待ち時間を入れる
+        '''
+        def slow(execute, sql, params, many, context):
+            time.sleep(seconds)
+            return execute(sql, params, many, context)
+
+        def install(sender, connection, **kwargs):
+            if slow not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow)
+
+        connection_created.connect(install, weak=False)
+        connections.close_all()
+
+    def _ensure_partners(self, tenant, n_partners):
+        existing = Partner.objects.filter(tenant=tenant).count()
+        if existing >= n_partners:
+            return
+
+        Partner.objects.bulk_create(
+            (
+                Partner(
+                    tenant=tenant,
+                    partner_name=f"ベンチ取引先{i:06d}",
+                    partner_name_kana=f"ベンチトリヒキサキ{i:06d}",
+                    partner_type=("customer", "supplier", "both")[i % 3],
+                    email=f"partner{i}@{BENCH_DOMAIN}",
+                    is_deleted=(i % 10 == 0),
+                )
+                for i in range(existing, n_partners)
+            ),
+            batch_size=5_000,
+        )
+        reconcile([tenant.pk])
+        self.stdout.write(f"Seeded benchmark partners: {n_partners}")
+
+
+def _split(path):
+    path, _, query = path.partition("?")
+    return path, quote(query, safe="=&")
+
+
+def wsgi_get(path, headers):
+    '''
+    WSGI アプリケーションへ GET を1回送り、(ステータス, 本文) を返す
+    '''
+    path, query = _split(path)
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "SERVER_NAME": "testserver",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "REMOTE_ADDR": "127.0.0.1",
+        "wsgi.input": io.BytesIO(b""),
+        "wsgi.url_scheme": "http",
+        **{f"HTTP_{k.upper().replace('-', '_')}": v for k, v in headers.items()},
+    }
+    status = []
+    result = wsgi_application(environ, lambda s, h, exc_info=None: status.append(int(s.split()[0])))
+    try:
+        body = b"".join(result)
+    finally:
+        result.close()
+    return status[0], body
+
+
+async def asgi_get(path, headers):
+    '''
+    ASGI アプリケーションへ GET を1回送り、(ステータス, 本文) を返す
+    '''
+    path, query = _split(path)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"testserver"), *((k.encode(), v.encode()) for k, v in headers.items())],
+        "client": ("127.0.0.1", 0),
+        "server": ("testserver", 80),
+    }
+    received = False
+    status = 0
+    body = []
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # 切断は通知しない（応答完了後にキャンセルされる）
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    await asgi_application(scope, receive, send)
+    return status, b"".join(body)
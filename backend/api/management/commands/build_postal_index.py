@@ -0,0 +1,45 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.postal import PostalIndex, build_index, read_ken_all
+
+
+class Command(BaseCommand):
+    help = "Compile Japan Post's KEN_ALL.CSV (or ken_all.zip) into the memory-mapped postal code index"
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Path to KEN_ALL.CSV or ken_all.zip")
+        parser.add_argument("--output", default="", help="Index file to write (default: settings.POSTAL_INDEX_PATH)")
+        parser.add_argument("--encoding", default="cp932", help="Source file encoding")
+
+    def handle(self, *args, **options):
+        source = options["source"]
+        output = options["output"] or settings.POSTAL_INDEX_PATH
+        if not os.path.exists(source):
+            raise CommandError(f"{source} not found")
+
+        # ============
+        # 作成
+        # ============
+        started = time.perf_counter()
+        try:
+            count = build_index(read_ken_all(source, encoding=options["encoding"]), output)
+        except (UnicodeDecodeError, ValueError) as e:
+            raise CommandError(f"Failed to read {source}: {e}")
+        elapsed = time.perf_counter() - started
+
+        # ============
+        # 確認
+        # ============
+        # 作成したファイルを開き直して件数を確かめる（稼働中のプロセスは次回の確認時に開き直す）
+        index = PostalIndex(output)
+        if len(index) != count:
+            raise CommandError(f"{output}: wrote {count} entries but read back {len(index)}")
+
+        size_kb = os.path.getsize(output) / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {count} entries to {output} ({size_kb:.0f} KiB) in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api.partitioning import list_partitioned_tables, provision_tenant_partitions
+from tenants.models import Tenant
+
+
+class Command(BaseCommand):
+    help = "Create missing per-tenant list partitions (tenants whose partition creation timed out or was skipped)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("tenant_ids", nargs="*", type=int, help="Tenant ids (default: all tenants)")
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        if not list_partitioned_tables(connections[using]):
+            self.stdout.write("list パーティション化されたテーブルはありません")
+            return
+
+        # テナントごとに短いトランザクションで作る（既にあるパーティションは飛ばす）
+        tenant_ids = options["tenant_ids"] or list(Tenant.objects.using(using).order_by("id").values_list("id", flat=True))
+        failed = provision_tenant_partitions(tenant_ids, using=using)
+        if failed:
+            raise CommandError(f"パーティションを作成できなかったテナント: {', '.join(map(str, failed))}")
+        self.stdout.write(self.style.SUCCESS(f"{len(tenant_ids)} テナントのパーティションを確認しました"))
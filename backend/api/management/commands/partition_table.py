@@ -0,0 +1,39 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from api.partitioning import PartitionSpec, convert_to_partitioned, get_partition_spec, is_partitioned
+
+
+class Command(BaseCommand):
+    help = "Convert a tenant-owned table into a declaratively partitioned table (by tenant_id)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", help="app_label.ModelName (e.g. partners.Partner)")
+        parser.add_argument("--method", choices=["hash", "list"], help="Partitioning method (default: PARTITIONED_MODELS)")
+        parser.add_argument("--partitions", type=int, default=8, help="Number of hash partitions")
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        model = apps.get_model(options["model"])
+        if options["method"]:
+            spec = PartitionSpec(method=options["method"], partitions=options["partitions"])
+        else:
+            spec = get_partition_spec(model._meta.label)
+        if spec is None:
+            raise CommandError("--method を指定するか、settings.PARTITIONED_MODELS で有効化してください")
+
+        connection = connections[options["database"]]
+        table = model._meta.db_table
+        if is_partitioned(connection, table):
+            self.stdout.write(f"{table} は既にパーティション化されています")
+            return
+
+        # テーブル全体を書き換えるため、メンテナンス時間帯に実行すること
+        with transaction.atomic(using=options["database"]):
+            try:
+                convert_to_partitioned(connection, model, spec)
+            except ValueError as e:
+                raise CommandError(str(e)) from e
+
+        self.stdout.write(self.style.SUCCESS(f"{table} を {spec.method} パーティションに変換しました"))
@@ -0,0 +1,105 @@
+import io
+import pstats
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from api.profiling import load_profiles, profile_dir
+
+
+class Command(BaseCommand):
+    help = "List captured request profiles, or show one profile's hot functions, SQL and query plans"
+
+    def add_arguments(self, parser):
+        parser.add_argument("profile_id", nargs="?", help="Profile to show (omit to list)")
+        parser.add_argument("--limit", type=int, default=20, help="Number of profiles to list")
+        parser.add_argument("--path", default="", help="Only list profiles whose path contains this string")
+        parser.add_argument("--sort", default="cumulative", help="pstats sort key when showing a profile (cumulative, tottime, calls, ...)")
+        parser.add_argument("--lines", type=int, default=25, help="Number of functions to show")
+        parser.add_argument("--queries", type=int, default=10, help="Number of slowest SQL statements to show")
+        parser.add_argument("--delete-older-than", type=int, metavar="DAYS", help="Delete profiles older than DAYS")
+
+    def handle(self, *args, **options):
+        if options["delete_older_than"] is not None:
+            self._delete_older_than(options["delete_older_than"])
+            return
+        if options["profile_id"]:
+            self._show(options["profile_id"], options)
+            return
+
+        profiles = [p for p in load_profiles() if options["path"] in p["path"]][: options["limit"]]
+        if not profiles:
+            self.stdout.write(f"No profiles in {profile_dir()}")
+            return
+
+        self.stdout.write(f"{'id':<25} {'method':<6} {'status':>6} {'total':>9} {'db':>9} {'queries':>7} {'tenant':>6}  path")
+        for p in profiles:
+            self.stdout.write(
+                f"{p['id']:<25} {p['method']:<6} {p['status']:>6} {p['total_ms']:>7.1f}ms {p['db_ms']:>7.1f}ms "
+                f"{p['db_queries']:>7} {p['tenant'] or '-':>6}  {p['path']}{'?' + p['query'] if p['query'] else ''}"
+            )
+
+    def _show(self, profile_id, options):
+        profile = next((p for p in load_profiles() if p["id"] == profile_id), None)
+        if profile is None:
+            raise CommandError(f"プロファイル {profile_id} が見つかりません")
+
+        self.stdout.write(
+            f"{profile['method']} {profile['path']}{'?' + profile['query'] if profile['query'] else ''} "
+            f"-> {profile['status']} ({profile['view'] or '-'})"
+        )
+        self.stdout.write(
+            f"captured {profile['captured_at']} user={profile['user']} tenant={profile['tenant']} "
+            f"requested_by={profile['requested_by']}"
+        )
+        db_share = profile["db_ms"] / profile["total_ms"] * 100 if profile["total_ms"] else 0
+        self.stdout.write(
+            f"total {profile['total_ms']:.1f}ms, SQL {profile['db_ms']:.1f}ms ({db_share:.0f}%) "
+            f"in {profile['db_queries']} queries"
+        )
+
+        # ============
+        # 関数プロファイル
+        # ============
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\nTop functions by {options['sort']}"))
+        out = io.StringIO()
+        stats = pstats.Stats(str(profile_dir() / f"{profile_id}.prof"), stream=out)
+        stats.strip_dirs().sort_stats(options["sort"]).print_stats(options["lines"])
+        self.stdout.write(out.getvalue().strip())
+
+        # ============
+        # SQL
+        # ============
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\nSlowest queries (of {profile['db_queries']})"))
+        for q in sorted(profile["queries"], key=lambda q: q["ms"], reverse=True)[: options["queries"]]:
+            self.stdout.write(f"{q['ms']:>8.2f}ms [{q['alias']}] {q['sql']}")
+
+        # 同じSQLの繰り返し（N+1 の手がかり）
+        counts = {}
+        for q in profile["queries"]:
+            counts[q["sql"]] = counts.get(q["sql"], 0) + 1
+        repeated = sorted(((n, sql) for sql, n in counts.items() if n > 1), reverse=True)
+        if repeated:
+            self.stdout.write(self.style.MIGRATE_HEADING("\nRepeated statements"))
+            for n, sql in repeated[: options["queries"]]:
+                self.stdout.write(f"{n:>5}x {sql}")
+
+        for e in profile["explain"]:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\nEXPLAIN ANALYZE ({e['ms']:.2f}ms in request)"))
+            self.stdout.write(e["sql"])
+            self.stdout.write(e["plan"])
+
+    def _delete_older_than(self, days):
+        cutoff = timezone.now() - timedelta(days=days)
+        deleted = 0
+        for p in load_profiles():
+            if parse_datetime(p["captured_at"]) >= cutoff:
+                continue
+            for suffix in (".json", ".prof"):
+                path = profile_dir() / f"{p['id']}{suffix}"
+                if path.exists():
+                    path.unlink()
+            deleted += 1
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} profiles captured before {cutoff:%Y-%m-%d %H:%M}"))
@@ -0,0 +1,300 @@
+import json
+import logging
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.management.commands.bench_api import percentile
+from api.traffic import LARGEST_BUCKET, SIZE_BUCKETS, TEXT_PARAMS, size_bucket, text_kind
+from partners.models import Partner
+from tenants.models import Tenant
+
+User = get_user_model()
+
+BUCKETS = [name for _, name in SIZE_BUCKETS] + [LARGEST_BUCKET]
+REPLAY_METHODS = {"GET", "HEAD"}
+TOKEN_REFRESH_SECONDS = 60
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a traffic capture (api.traffic) against this instance and report per-route latency "
+        "against the capture or a previous replay"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "capture", nargs="*",
+            help="Capture files (default: TRAFFIC_CAPTURE_FILE; rotated .1, .2, ... siblings are included)",
+        )
+        parser.add_argument("--speed", type=float, default=1.0, help="Speed-up factor (2 = twice as fast, 0 = no pauses)")
+        parser.add_argument("--concurrency", type=int, default=8, help="Maximum requests in flight")
+        parser.add_argument("--base-url", help="Replay over HTTP against a running server instead of in-process")
+        parser.add_argument("--route", default="", help="Only replay routes containing this string")
+        parser.add_argument("--limit", type=int, default=0, help="Replay at most N requests (0 = all)")
+        parser.add_argument("--seed", type=int, default=1, help="Random seed for picking ids and search terms")
+        parser.add_argument("--save", help="Write per-route replay results to this JSON file")
+        parser.add_argument("--against", help="Compare with a previous replay saved with --save instead of the capture")
+
+    def handle(self, *args, **options):
+        records = [
+            r for r in read_capture(options["capture"] or [settings.TRAFFIC_CAPTURE_FILE])
+            if options["route"] in r["route"]
+        ]
+        skipped = sum(1 for r in records if r["method"] not in REPLAY_METHODS)
+        records = [r for r in records if r["method"] in REPLAY_METHODS]
+        if options["limit"]:
+            records = records[: options["limit"]]
+        if not records:
+            raise CommandError("再生できるリクエストがありません（GET / HEAD のみ再生します）")
+
+        rng = random.Random(options["seed"])
+        targets = self._targets()
+        self.stdout.write(
+            f"Replaying {len(records):,} requests ({skipped:,} writes skipped) at {options['speed']:g}x; tenants: "
+            + ", ".join(f"{b}={t.tenant.pk}" for b, t in targets.items())
+        )
+
+        requests = []
+        for r in records:
+            target = targets[nearest_bucket(r.get("tenant_size"), targets)]
+            path = target.fill_path(r["path"], rng)
+            if path is None:
+                continue
+            requests.append((r, path, target.fill_params(r["params"], rng), target))
+        if not requests:
+            raise CommandError("再生できるリクエストがありません（記録されたパスの ID を再生先のテナントで用意できません）")
+
+        send = self._http_sender(options["base_url"]) if options["base_url"] else self._client_sender()
+        results = self._replay(requests, send, options["speed"], max(1, options["concurrency"]))
+
+        replayed = summarize((route, ms, status) for route, ms, status in results)
+        if options["save"]:
+            Path(options["save"]).write_text(json.dumps(replayed, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+        if options["against"]:
+            reference = json.loads(Path(options["against"]).read_text(encoding="utf-8"))
+            label = "previous replay"
+        else:
+            reference = summarize((route_key(r), r["duration_ms"], r["status"]) for r, _, _, _ in requests)
+            label = "capture"
+        self._report(reference, replayed, label)
+
+    # -----------------------------
+    # 再生先の準備
+    # -----------------------------
+    def _targets(self):
+        '''
+        テナント規模の区分ごとに、再生に使うローカルのテナントを1件選ぶ（区分内で最も件数の多いテナント）
+        '''
+        counts = dict(Partner.objects.values("tenant_id").annotate(n=Count("id")).values_list("tenant_id", "n"))
+        best: dict[str, tuple[int, int]] = {}
+        for tenant_id in User.objects.filter(is_active=True).values_list("tenant_id", flat=True).distinct():
+            n = counts.get(tenant_id, 0)
+            bucket = size_bucket(n)
+            if bucket not in best or n > best[bucket][1]:
+                best[bucket] = (tenant_id, n)
+        if not best:
+            raise CommandError("再生に使えるテナント（有効なユーザーがいるテナント）がありません")
+        return {bucket: Target(Tenant.objects.get(pk=tenant_id)) for bucket, (tenant_id, _) in best.items()}
+
+    # -----------------------------
+    # 再生
+    # -----------------------------
+    def _replay(self, requests, send, speed, concurrency):
+        '''
+        記録時の間隔を speed で割った間隔で送る（詰まった場合は送れる時点で送る）
+        '''
+        t0 = requests[0][0]["ts"]
+        started = time.perf_counter()
+        results = []
+        lock = threading.Lock()
+
+        def run(record, path, params, target):
+            t = time.perf_counter()
+            try:
+                status = send(path, params, target)
+            except Exception as e:  # 再生は続ける（エラーとして数える）
+                self.stderr.write(f"{path}: {e}")
+                status = 0
+            ms = (time.perf_counter() - t) * 1000
+            with lock:
+                results.append((route_key(record), ms, status))
+
+        logging.getLogger("api.perf").setLevel(logging.WARNING)
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for record, path, params, target in requests:
+                if speed > 0:
+                    wait = (record["ts"] - t0) / speed - (time.perf_counter() - started)
+                    if wait > 0:
+                        time.sleep(wait)
+                pool.submit(run, record, path, params, target)
+        return results
+
+    def _client_sender(self):
+        local = threading.local()
+
+        def send(path, params, target):
+            if not hasattr(local, "client"):
+                local.client = Client()
+            return local.client.get(path, params, headers=target.headers()).status_code
+
+        return send
+
+    def _http_sender(self, base_url):
+        def send(path, params, target):
+            url = base_url.rstrip("/") + path
+            if params:
+                url += "?" + urllib.parse.urlencode(params)
+            req = urllib.request.Request(url, headers=target.headers())
+            try:
+                with urllib.request.urlopen(req, timeout=60) as res:
+                    res.read()
+                    return res.status
+            except urllib.error.HTTPError as e:
+                return e.code
+
+        return send
+
+    # -----------------------------
+    # 結果
+    # -----------------------------
+    def _report(self, reference, replayed, label):
+        self.stdout.write(
+            f"{'route':<40} {'calls':>6} {label + ' p50/p95 ms':>26} {'replay p50/p95 ms':>18} "
+            f"{'Δp50':>6} {'Δp95':>6} {'errors':>6}"
+        )
+        for key in sorted(replayed, key=lambda k: -replayed[k]["count"]):
+            r = replayed[key]
+            ref = reference.get(key)
+            before = f"{ref['p50_ms']:.1f} / {ref['p95_ms']:.1f}" if ref else "-"
+            after = f"{r['p50_ms']:.1f} / {r['p95_ms']:.1f}"
+            d50 = change(ref["p50_ms"], r["p50_ms"]) if ref else "-"
+            d95 = change(ref["p95_ms"], r["p95_ms"]) if ref else "-"
+            self.stdout.write(f"{key:<40} {r['count']:>6} {before:>26} {after:>18} {d50:>6} {d95:>6} {r['errors']:>6}")
+
+
+class Target:
+    '''
+    再生に使うテナント（ユーザーのトークン、取引先ID、検索語の候補）
+    '''
+
+    def __init__(self, tenant):
+        self.tenant = tenant
+        self.user = User.objects.filter(tenant=tenant, is_active=True).order_by("pk").first()
+        live = Partner.objects.for_tenant(tenant).order_by("pk")
+        self.pks = list(live.values_list("pk", flat=True)[:1000])
+        self.words = [
+            w for row in live.values_list("partner_name", "partner_name_kana", "email")[:500] for w in row if w
+        ]
+        self._token = None
+        self._token_at = 0.0
+        self._lock = threading.Lock()
+
+    def headers(self):
+        # アクセストークンは有効期限が短いため、一定間隔で作り直す（毎回作ると認証キャッシュが効かなくなる）
+        with self._lock:
+            if self._token is None or time.monotonic() - self._token_at > TOKEN_REFRESH_SECONDS:
+                self._token = str(RefreshToken.for_user(self.user).access_token)
+                self._token_at = time.monotonic()
+            return {"Authorization": f"Bearer {self._token}"}
+
+    def fill_path(self, path, rng):
+        if "{pk}" in path:
+            if not self.pks:
+                return None
+            path = path.replace("{pk}", str(rng.choice(self.pks)))
+        return None if "{" in path else path
+
+    def fill_params(self, params, rng):
+        filled = {}
+        for key, value in params.items():
+            if key in TEXT_PARAMS and isinstance(value, dict):
+                filled[key] = self.term(value["kind"], value["len"], prefix=key == "prefix", rng=rng)
+            else:
+                filled[key] = value
+        return filled
+
+    def term(self, kind, length, *, prefix, rng):
+        '''
+        記録された文字種・文字数に合う検索語を、このテナントの取引先データから作る
+        '''
+        candidates = []
+        for word in self.words:
+            starts = [0] if prefix else range(max(1, len(word) - length + 1))
+            for i in starts:
+                part = word[i:i + length]
+                if len(part) == length and text_kind(part) == kind:
+                    candidates.append(part)
+            if len(candidates) >= 200:
+                break
+        if candidates:
+            return rng.choice(candidates)
+        word = rng.choice(self.words) if self.words else "a"
+        return word[:length]
+
+
+def read_capture(paths):
+    '''
+    記録ファイル（ローテーション済みの .1, .2 ... を含む）を古い順に読む
+    '''
+    records = []
+    for path in map(Path, paths):
+        rotated = sorted(path.parent.glob(path.name + ".*"), key=lambda p: -int(p.suffix[1:]) if p.suffix[1:].isdigit() else 0)
+        for p in [*rotated, path]:
+            if not p.exists():
+                continue
+            with p.open(encoding="utf-8") as f:
+                records.extend(json.loads(line) for line in f if line.strip())
+    if not records:
+        raise CommandError(f"記録がありません: {', '.join(map(str, paths))}")
+    return sorted(records, key=lambda r: r["ts"])
+
+
+def route_key(record):
+    return f"{record['method']} {record['route']}"
+
+
+def nearest_bucket(bucket, targets):
+    if bucket in targets:
+        return bucket
+    index = BUCKETS.index(bucket) if bucket in BUCKETS else 0
+    return min(targets, key=lambda b: abs(BUCKETS.index(b) - index))
+
+
+def summarize(rows):
+    by_route = defaultdict(list)
+    errors = defaultdict(int)
+    for route, ms, status in rows:
+        by_route[route].append(ms)
+        if status == 0 or status >= 500:
+            errors[route] += 1
+    summary = {}
+    for route, values in by_route.items():
+        values.sort()
+        summary[route] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "errors": errors[route],
+        }
+    return summary
+
+
+def change(before, after):
+    if not before:
+        return "-"
+    return f"{(after - before) / before * 100:+.0f}%"
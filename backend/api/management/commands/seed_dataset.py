@@ -0,0 +1,365 @@
+import multiprocessing
+import random
+import time
+from bisect import bisect
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+
+from api.base import contact_search_keys
+from api.partitioning import provision_tenant_partitions
+from partners.models import Partner, PartnerArchive
+from tenants.models import Tenant
+from tenants.stats import reconcile
+
+User = get_user_model()
+
+# 負荷試験用データの生成
+# - 乱数はシード + テナント番号（取引先はチャンク番号も）から作るため、同じ引数なら何度実行しても同じデータになる
+# - 作成日時も固定の基準日からの相対値にする（実行日で変わらないように）
+
+BASE_TIME = datetime(2023, 1, 1, tzinfo=dt_timezone.utc)
+SPAN_SECONDS = 3 * 365 * 24 * 3600
+
+# 取引先は (テナント, 先頭からの位置) ごとに CHUNK_ROWS 件ずつ生成・投入する
+# - チャンクごとに乱数を作るため、--workers の数に関係なく同じデータになる
+CHUNK_ROWS = 50_000
+
+# (漢字, カナ, ローマ字)
+SURNAMES = [
+    ("佐藤", "サトウ", "sato"), ("鈴木", "スズキ", "suzuki"), ("高橋", "タカハシ", "takahashi"),
+    ("田中", "タナカ", "tanaka"), ("伊藤", "イトウ", "ito"), ("渡辺", "ワタナベ", "watanabe"),
+    ("山本", "ヤマモト", "yamamoto"), ("中村", "ナカムラ", "nakamura"), ("小林", "コバヤシ", "kobayashi"),
+    ("加藤", "カトウ", "kato"), ("吉田", "ヨシダ", "yoshida"), ("山田", "ヤマダ", "yamada"),
+    ("佐々木", "ササキ", "sasaki"), ("山口", "ヤマグチ", "yamaguchi"), ("松本", "マツモト", "matsumoto"),
+    ("井上", "イノウエ", "inoue"), ("木村", "キムラ", "kimura"), ("林", "ハヤシ", "hayashi"),
+    ("斎藤", "サイトウ", "saito"), ("清水", "シミズ", "shimizu"), ("山崎", "ヤマザキ", "yamazaki"),
+    ("森", "モリ", "mori"), ("池田", "イケダ", "ikeda"), ("橋本", "ハシモト", "hashimoto"),
+    ("阿部", "アベ", "abe"), ("石川", "イシカワ", "ishikawa"), ("山下", "ヤマシタ", "yamashita"),
+    ("中島", "ナカジマ", "nakajima"), ("石井", "イシイ", "ishii"), ("小川", "オガワ", "ogawa"),
+    ("前田", "マエダ", "maeda"), ("岡田", "オカダ", "okada"), ("長谷川", "ハセガワ", "hasegawa"),
+    ("藤田", "フジタ", "fujita"), ("後藤", "ゴトウ", "goto"), ("近藤", "コンドウ", "kondo"),
+    ("村上", "ムラカミ", "murakami"), ("遠藤", "エンドウ", "endo"), ("青木", "アオキ", "aoki"),
+    ("坂本", "サカモト", "sakamoto"),
+]
+
+GIVEN_NAMES = [
+    "翔太", "大輔", "健一", "直樹", "拓也", "誠", "浩二", "達也", "隆", "亮",
+    "美咲", "陽子", "恵美", "裕子", "真由美", "愛", "彩", "直美", "由美", "麻衣",
+]
+
+# 社名の後半 (漢字, カナ, ローマ字)
+BUSINESSES = [
+    ("商事", "ショウジ", "shoji"), ("物産", "ブッサン", "bussan"), ("工業", "コウギョウ", "kogyo"),
+    ("製作所", "セイサクショ", "seisakusho"), ("建設", "ケンセツ", "kensetsu"), ("電機", "デンキ", "denki"),
+    ("運輸", "ウンユ", "unyu"), ("食品", "ショクヒン", "shokuhin"), ("化学", "カガク", "kagaku"),
+    ("不動産", "フドウサン", "fudosan"), ("印刷", "インサツ", "insatsu"), ("産業", "サンギョウ", "sangyo"),
+    ("システム", "システム", "system"), ("精機", "セイキ", "seiki"), ("興産", "コウサン", "kosan"),
+    ("設備", "セツビ", "setsubi"), ("技研", "ギケン", "giken"), ("通商", "ツウショウ", "tsusho"),
+]
+
+LEGAL_FORMS = [("株式会社", "カブシキガイシャ", 0.8), ("有限会社", "ユウゲンガイシャ", 0.12), ("合同会社", "ゴウドウガイシャ", 0.08)]
+
+# (都道府県, 市区町村, 郵便番号の先頭2桁, 市外局番, 重み)
+PREFECTURES = [
+    ("北海道", ["札幌市中央区", "旭川市", "函館市"], "06", "011", 5),
+    ("宮城県", ["仙台市青葉区", "石巻市"], "98", "022", 2),
+    ("福島県", ["福島市", "郡山市"], "96", "024", 1.5),
+    ("茨城県", ["水戸市", "つくば市"], "31", "029", 2),
+    ("栃木県", ["宇都宮市"], "32", "028", 1.5),
+    ("群馬県", ["前橋市", "高崎市"], "37", "027", 1.5),
+    ("埼玉県", ["さいたま市大宮区", "川越市", "川口市"], "33", "048", 6),
+    ("千葉県", ["千葉市中央区", "船橋市", "柏市"], "26", "043", 5),
+    ("東京都", ["千代田区", "中央区", "港区", "新宿区", "渋谷区", "品川区", "八王子市"], "10", "03", 20),
+    ("神奈川県", ["横浜市西区", "川崎市川崎区", "相模原市中央区", "藤沢市"], "22", "045", 8),
+    ("新潟県", ["新潟市中央区", "長岡市"], "95", "025", 1.5),
+    ("石川県", ["金沢市"], "92", "076", 1),
+    ("長野県", ["長野市", "松本市"], "38", "026", 1.5),
+    ("静岡県", ["静岡市葵区", "浜松市中央区"], "42", "054", 3),
+    ("愛知県", ["名古屋市中区", "名古屋市中村区", "豊田市", "岡崎市"], "46", "052", 7),
+    ("京都府", ["京都市中京区", "京都市下京区"], "60", "075", 2.5),
+    ("大阪府", ["大阪市北区", "大阪市中央区", "堺市堺区", "東大阪市"], "53", "06", 10),
+    ("兵庫県", ["神戸市中央区", "姫路市", "西宮市"], "65", "078", 4),
+    ("岡山県", ["岡山市北区", "倉敷市"], "70", "086", 1.5),
+    ("広島県", ["広島市中区", "福山市"], "73", "082", 2.5),
+    ("香川県", ["高松市"], "76", "087", 1),
+    ("福岡県", ["福岡市博多区", "福岡市中央区", "北九州市小倉北区"], "81", "092", 5),
+    ("熊本県", ["熊本市中央区"], "86", "096", 1.5),
+    ("鹿児島県", ["鹿児島市"], "89", "099", 1.5),
+    ("沖縄県", ["那覇市"], "90", "098", 1.5),
+]
+
+TOWNS = ["本町", "中央", "栄町", "緑町", "旭町", "宮町", "新町", "桜町", "港町", "若葉", "東町", "西町"]
+BUILDINGS = ["第一ビル", "センタービル", "ビジネスプラザ", "タワー", "駅前ビル", "会館"]
+MAIL_DOMAINS = ["co.jp", "jp", "com", "ne.jp"]
+
+PARTNER_TYPES = [("customer", 0.6), ("supplier", 0.25), ("both", 0.15)]
+
+PARTNER_COLUMNS = [
+    "tenant_id", "is_deleted", "created_at", "create_user_id", "updated_at", "update_user_id",
+    "partner_name", "partner_name_kana", "partner_type", "contact_name", "tel_number", "email",
+    "postal_code", "state", "city", "address", "address2",
+    # 検索用の列（COPY ではモデルの保存処理を通らないため、ここで作る）
+    "tel_digits", "email_lower", "email_domain",
+]
+
+
+class Command(BaseCommand):
+    help = "Generate a deterministic, skewed load-test dataset (tenants, users, partners) using COPY"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenants", type=int, default=100, help="Number of tenants")
+        parser.add_argument("--users-per-tenant", type=int, default=3, help="Users per tenant")
+        parser.add_argument("--partners-per-tenant", type=int, default=1000, help="Average partners per tenant")
+        parser.add_argument(
+            "--skew", type=float, default=1.0,
+            help="Zipf exponent for partners per tenant (0 = uniform, 1 = a few huge tenants and a long tail)",
+        )
+        parser.add_argument("--deleted-ratio", type=float, default=0.05, help="Share of soft-deleted partners")
+        parser.add_argument("--seed", type=int, default=1, help="Random seed (same seed and options = same data)")
+        parser.add_argument("--workers", type=int, default=1, help="Processes generating and loading partners in parallel")
+        parser.add_argument("--password", default="seed-password", help="Password for every generated user")
+        parser.add_argument("--reset", action="store_true", help="Delete data generated earlier with the same seed first")
+
+    def handle(self, *args, **options):
+        n_tenants = options["tenants"]
+        if n_tenants < 1 or options["partners_per_tenant"] < 0 or not 0 <= options["deleted_ratio"] <= 1:
+            raise CommandError("--tenants は1以上、--partners-per-tenant は0以上、--deleted-ratio は0〜1で指定してください")
+
+        seed = options["seed"]
+        domain = f"seed{seed}.example.com"
+        existing = Tenant.objects.filter(email__endswith=f"@{domain}")
+        if existing.exists():
+            if not options["reset"]:
+                raise CommandError(f"シード {seed} のデータが既にあります（--reset で削除してから作り直します）")
+            self._reset(existing)
+
+        started = time.perf_counter()
+
+        # ============
+        # テナント / ユーザー
+        # ============
+        tenants = Tenant.objects.bulk_create(
+            [self._tenant(random.Random(f"{seed}:tenant:{i}"), i, domain) for i in range(n_tenants)],
+            batch_size=1000,
+        )
+        # bulk_create ではシグナルが飛ばないため、list パーティションはここで作る
+        provision_tenant_partitions([tenant.pk for tenant in tenants])
+
+        password = make_password(options["password"])
+        users = User.objects.bulk_create(
+            [
+                self._user(random.Random(f"{seed}:user:{i}:{j}"), tenant, i, j, domain, password)
+                for i, tenant in enumerate(tenants)
+                for j in range(max(1, options["users_per_tenant"]))
+            ],
+            batch_size=5000,
+        )
+        user_ids: dict[int, list[int]] = {}
+        for user in users:
+            user_ids.setdefault(user.tenant_id, []).append(user.pk)
+        self.stdout.write(f"Created {len(tenants)} tenants and {len(users)} users")
+
+        # ============
+        # 取引先
+        # ============
+        counts = skewed_counts(n_tenants * options["partners_per_tenant"], n_tenants, options["skew"])
+        total = sum(counts)
+        chunks = [
+            (seed, i, tenant.pk, offset, min(CHUNK_ROWS, count - offset), user_ids[tenant.pk], options["deleted_ratio"])
+            for i, (tenant, count) in enumerate(zip(tenants, counts))
+            for offset in range(0, count, CHUNK_ROWS)
+        ]
+
+        inserted = 0
+        copy_started = time.perf_counter()
+        workers = max(1, options["workers"])
+        if workers == 1:
+            results = map(copy_chunk, chunks)
+        else:
+            # 子プロセスが親の接続を引き継がないように閉じてから fork する
+            connections.close_all()
+            pool = multiprocessing.get_context("fork").Pool(workers)
+            results = pool.imap_unordered(copy_chunk, chunks)
+        try:
+            for done in results:
+                inserted += done
+                rate = inserted / (time.perf_counter() - copy_started)
+                self.stdout.write(f"Partners: {inserted:,}/{total:,} ({rate:,.0f} rows/s)")
+        finally:
+            if workers > 1:
+                pool.close()
+                pool.join()
+
+        # COPY ではシグナルが飛ばないため、テナント集計は投入後にまとめて数える
+        tenant_ids = [tenant.pk for tenant in tenants]
+        for start in range(0, len(tenant_ids), 100):
+            reconcile(tenant_ids[start:start + 100])
+
+        if connection.vendor == "postgresql":
+            # 大量投入直後の実行計画が古い統計で作られないように
+            with connection.cursor() as cursor:
+                for model in (Tenant, User, Partner):
+                    cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seed {seed}: {len(tenants)} tenants, {len(users)} users, {inserted:,} partners "
+                f"(largest tenant {max(counts):,}, smallest {min(counts):,}) in {time.perf_counter() - started:.1f}s. "
+                f"Users log in as user1.t1@{domain} ... with password '{options['password']}'"
+            )
+        )
+
+    def _reset(self, tenants):
+        '''
+        シードで作ったテナントのデータを削除する（取引先は件数が多いため SQL で直接消す）
+        '''
+        ids = list(tenants.values_list("pk", flat=True))
+        deleted = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            for model in (Partner, PartnerArchive):
+                table = connection.ops.quote_name(model._meta.db_table)
+                cursor.execute(f"DELETE FROM {table} WHERE tenant_id IN ({', '.join(['%s'] * len(ids))})", ids)
+                deleted += cursor.rowcount
+            tenants.delete()
+        self.stdout.write(f"Reset: deleted {len(ids)} tenants and {deleted:,} partners")
+
+    def _tenant(self, rng, i, domain):
+        surname, _, _ = rng.choice(SURNAMES)
+        business, _, _ = rng.choice(BUSINESSES)
+        legal = weighted(rng, [(name, w) for name, _, w in LEGAL_FORMS])
+        state, cities, postal, area, _ = weighted(rng, [(p, p[4]) for p in PREFECTURES])
+        return Tenant(
+            tenant_name=f"{legal}{surname}{business}",
+            representative_name=f"{rng.choice(SURNAMES)[0]} {rng.choice(GIVEN_NAMES)}",
+            email=f"tenant{i + 1}@{domain}",
+            tel_number=tel(rng.random, area),
+            postal_code=f"{postal}{rng.randint(0, 9)}-{rng.randint(0, 9999):04d}",
+            state=state,
+            city=rng.choice(cities),
+            address=f"{rng.choice(TOWNS)}{rng.randint(1, 5)}-{rng.randint(1, 30)}-{rng.randint(1, 20)}",
+        )
+
+    def _user(self, rng, tenant, i, j, domain, password):
+        surname, _, _ = rng.choice(SURNAMES)
+        return User(
+            tenant=tenant,
+            email=f"user{j + 1}.t{i + 1}@{domain}",
+            password=password,
+            last_name=surname,
+            first_name=rng.choice(GIVEN_NAMES),
+            is_active=True,
+        )
+
+
+def weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights=weights)[0]
+
+
+def skewed_counts(total, n, skew):
+    '''
+    total 件を n テナントに Zipf 分布（順位 k の重み 1 / k^skew）で割り振る（0件のテナントもできる）
+    - 1番目のテナントが最大。合計は total に合わせる
+    '''
+    if total <= 0:
+        return [0] * n
+    weights = [1 / (k ** skew) for k in range(1, n + 1)]
+    scale = total / sum(weights)
+    counts = [int(w * scale) for w in weights]
+    # 端数は上位テナントへ
+    counts[0] += total - sum(counts)
+    return counts
+
+
+def copy_chunk(chunk) -> int:
+    '''
+    取引先1チャンク分を生成して投入する（PostgreSQL は COPY、それ以外は bulk_create）
+    - --workers 指定時は子プロセスで実行される
+    '''
+    seed, index, tenant_id, offset, count, user_ids, deleted_ratio = chunk
+    rows = partner_rows(random.Random(f"{seed}:partners:{index}:{offset}"), tenant_id, offset, count, user_ids, deleted_ratio)
+    with transaction.atomic():
+        if connection.vendor != "postgresql":
+            Partner.objects.bulk_create((Partner(**dict(zip(PARTNER_COLUMNS, r))) for r in rows), batch_size=5000)
+            return count
+        table = connection.ops.quote_name(Partner._meta.db_table)
+        columns = ", ".join(connection.ops.quote_name(c) for c in PARTNER_COLUMNS)
+        with connection.cursor() as cursor:
+            with cursor.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+    return count
+
+
+def partner_rows(rng, tenant_id, offset, count, user_ids, deleted_ratio):
+    '''
+    取引先行（PARTNER_COLUMNS の順のタプル）
+    - 取引先名称 + Email はテナント内で一意（Email にテナント内の連番を含める）
+    - 行数が多いため、rng.choice / randint ではなく random() 1回で1項目を決める
+    '''
+    r = rng.random
+    pick = weighted_picker(r)
+    surnames, businesses, given = SURNAMES, BUSINESSES, GIVEN_NAMES
+    legal_form = pick(LEGAL_FORMS, [w for _, _, w in LEGAL_FORMS])
+    prefecture = pick(PREFECTURES, [p[4] for p in PREFECTURES])
+    partner_type = pick([t for t, _ in PARTNER_TYPES], [w for _, w in PARTNER_TYPES])
+    towns, buildings, mail_domains = TOWNS, BUILDINGS, MAIL_DOMAINS
+
+    for n in range(offset + 1, offset + count + 1):
+        surname, surname_kana, surname_roma = surnames[int(r() * len(surnames))]
+        business, business_kana, business_roma = businesses[int(r() * len(businesses))]
+        legal, legal_kana, _ = legal_form()
+        if r() < 0.7:
+            name, kana = f"{legal}{surname}{business}", f"{legal_kana}{surname_kana}{business_kana}"
+        else:
+            name, kana = f"{surname}{business}{legal}", f"{surname_kana}{business_kana}{legal_kana}"
+        state, cities, postal, area, _ = prefecture()
+
+        created_at = BASE_TIME + timedelta(seconds=int(r() * SPAN_SECONDS))
+        updated_at = created_at + timedelta(seconds=int(r() * SPAN_SECONDS / 10))
+        user_id = user_ids[int(r() * len(user_ids))]
+
+        row = (
+            tenant_id,
+            r() < deleted_ratio,
+            created_at,
+            user_id,
+            updated_at,
+            user_id,
+            name,
+            kana if r() < 0.95 else None,
+            partner_type(),
+            f"{surnames[int(r() * len(surnames))][0]} {given[int(r() * len(given))]}" if r() < 0.8 else None,
+            tel(r, area) if r() < 0.9 else None,
+            f"info{n}@{surname_roma}-{business_roma}.{mail_domains[int(r() * len(mail_domains))]}",
+            f"{postal}{int(r() * 10)}-{int(r() * 10000):04d}" if r() < 0.9 else None,
+            state,
+            cities[int(r() * len(cities))],
+            f"{towns[int(r() * len(towns))]}{1 + int(r() * 5)}-{1 + int(r() * 30)}-{1 + int(r() * 20)}",
+            f"{buildings[int(r() * len(buildings))]}{1 + int(r() * 12)}F" if r() < 0.5 else None,
+        )
+        yield row + tuple(contact_search_keys(row[10], row[11]).values())
+
+
+def weighted_picker(r):
+    '''
+    重み付き抽選（累積重みを前計算し、random() 1回と二分探索で選ぶ）
+    '''
+    def pick(values, weights):
+        cum = list(accumulate(weights))
+        total = cum[-1]
+        return lambda: values[bisect(cum, r() * total)]
+    return pick
+
+
+def tel(r, area):
+    if r() < 0.3:
+        return f"0{7 + int(r() * 3)}0-{1000 + int(r() * 9000)}-{int(r() * 10000):04d}"
+    local = 10 - len(area)
+    number = f"{int(r() * 10 ** local):0{local}d}"
+    return f"{area}-{number[:-4]}-{number[-4:]}"
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import os
+import re
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from .perf import current_timings
+
+# Prometheus メトリクス
+# - 複数ワーカープロセスで動かす場合は、起動前に環境変数 PROMETHEUS_MULTIPROC_DIR に
+#   全ワーカー共通の空ディレクトリを指定する（各プロセスが値をファイルに書き、/api/metrics/ で合算する）
+# - ディレクトリはサーバー起動ごとに空にし、gunicorn では child_exit フックで
+#   prometheus_client.multiprocess.mark_process_dead(worker.pid) を呼ぶ
+
+HTTP_METHODS = {"GET", "HEAD", "OPTIONS", "POST", "PUT", "PATCH", "DELETE"}
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "リクエストの処理時間", ["method", "route"], buckets=LATENCY_BUCKETS
+)
+REQUESTS = Counter("http_requests", "リクエスト数（ステータスコード別）", ["method", "route", "status"])
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "1リクエストあたりのSQL件数", ["method", "route"], buckets=QUERY_BUCKETS
+)
+IN_FLIGHT = Gauge("http_requests_in_flight", "処理中のリクエスト数", multiprocess_mode="livesum")
+
+CSV_IMPORT_RUNS = Counter("csv_import_runs", "CSV取込の実行回数（結果別）", ["kind", "outcome"])
+CSV_IMPORT_ROWS = Counter("csv_import_rows", "CSV取込の行数（processed / saved / error）", ["kind", "result"])
+CSV_IMPORT_DURATION = Histogram("csv_import_duration_seconds", "CSV取込の処理時間", ["kind"], buckets=LATENCY_BUCKETS)
+CSV_IMPORT_RATE = Gauge(
+    "csv_import_rows_per_second", "直近のCSV取込の処理速度（行/秒）", ["kind"], multiprocess_mode="mostrecent"
+)
+
+CSV_EXPORT_ROWS = Counter("csv_export_rows", "CSV出力の行数", ["kind"])
+CSV_EXPORT_BYTES = Counter("csv_export_bytes", "CSV出力のバイト数", ["kind"])
+CSV_EXPORT_DURATION = Histogram("csv_export_duration_seconds", "CSV出力の処理時間", ["kind"], buckets=LATENCY_BUCKETS)
+CSV_EXPORT_RATE = Gauge(
+    "csv_export_rows_per_second", "直近のCSV出力の処理速度（行/秒）", ["kind"], multiprocess_mode="mostrecent"
+)
+
+
+def route_label(match) -> str:
+    '''
+    集計用のルート名（URLパターン）
+    - DRF のルーターは正規表現のルート（api/^partners/(?P<pk>[^/.]+)/$）になるため、先頭/末尾のアンカーは除く
+    '''
+    return re.sub(r"(^|/)\^", r"\1", match.route).removesuffix("$")
+
+
+def record_import(kind: str, *, outcome: str, processed: int, saved: int, errors: int, seconds: float) -> None:
+    '''
+    CSV取込1回分を記録する（outcome: saved / rejected / conflict / failed）
+    '''
+    CSV_IMPORT_RUNS.labels(kind, outcome).inc()
+    CSV_IMPORT_ROWS.labels(kind, "processed").inc(processed)
+    CSV_IMPORT_ROWS.labels(kind, "saved").inc(saved)
+    CSV_IMPORT_ROWS.labels(kind, "error").inc(errors)
+    CSV_IMPORT_DURATION.labels(kind).observe(seconds)
+    if processed and seconds > 0:
+        CSV_IMPORT_RATE.labels(kind).set(processed / seconds)
+
+
+def record_export(kind: str, *, rows: int, nbytes: int, seconds: float) -> None:
+    '''
+    CSV出力1回分を記録する
+    '''
+    CSV_EXPORT_ROWS.labels(kind).inc(rows)
+    CSV_EXPORT_BYTES.labels(kind).inc(nbytes)
+    CSV_EXPORT_DURATION.labels(kind).observe(seconds)
+    if rows and seconds > 0:
+        CSV_EXPORT_RATE.labels(kind).set(rows / seconds)
+
+
+def render_latest() -> tuple[bytes, str]:
+    '''
+    Prometheus テキスト形式の出力（マルチプロセス時は全ワーカー分を合算）
+    '''
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    '''
+    リクエスト数・処理時間・SQL件数・処理中件数を記録する
+    - ルートはURLパターン（api/partners/<pk>/ など）で集計する（パスそのままだと系列が増え続けるため）
+    - SQL件数は ServerTimingMiddleware の計測値を使う（このミドルウェアはその内側に置く）
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        IN_FLIGHT.inc()
+        try:
+            response = self.get_response(request)
+        finally:
+            IN_FLIGHT.dec()
+        self.observe(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        IN_FLIGHT.inc()
+        try:
+            response = await self.get_response(request)
+        finally:
+            IN_FLIGHT.dec()
+        self.observe(request, response, time.perf_counter() - started)
+        return response
+
+    def observe(self, request, response, seconds: float) -> None:
+        match = getattr(request, "resolver_match", None)
+        route = route_label(match) if match else "unmatched"
+        method = request.method if request.method in HTTP_METHODS else "other"
+        REQUEST_LATENCY.labels(method, route).observe(seconds)
+        REQUESTS.labels(method, route, str(response.status_code)).inc()
+        timings = current_timings()
+        if timings is not None:
+            REQUEST_QUERIES.labels(method, route).observe(timings.db_count)
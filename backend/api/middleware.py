@@ -0,0 +1,65 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .db_router import is_pinned, read_from_replica, replica_alias
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class ReplicaRoutingMiddleware:
+    '''
+    安全なメソッド（一覧・詳細・エクスポート・サジェストなど）の読み取りをリードレプリカへ振り分ける
+    - 書き込みリクエストが成功したら固定用 Cookie を発行し、DATABASE_PIN_SECONDS 秒間は
+      そのブラウザからの読み取りもプライマリへ送る（レプリカ遅延で自分の変更が見えない問題を防ぐ）
+    - レプリカ未設定（DATABASE_REPLICA_ALIAS = None）なら何もしない
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.use_replica(request):
+            response = self.get_response(request)
+        else:
+            with read_from_replica():
+                response = self.get_response(request)
+                pinned = is_pinned()
+            request._db_pinned = pinned
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        if not self.use_replica(request):
+            response = await self.get_response(request)
+        else:
+            with read_from_replica():
+                response = await self.get_response(request)
+                pinned = is_pinned()
+            request._db_pinned = pinned
+        return self.process_response(request, response)
+
+    def use_replica(self, request) -> bool:
+        if not replica_alias() or request.method not in SAFE_METHODS:
+            return False
+        return settings.DATABASE_PIN_COOKIE not in request.COOKIES
+
+    def process_response(self, request, response):
+        if not replica_alias() or response.status_code >= 400:
+            return response
+        wrote = request.method not in SAFE_METHODS or getattr(request, "_db_pinned", False)
+        if wrote:
+            response.set_cookie(
+                settings.DATABASE_PIN_COOKIE,
+                "1",
+                max_age=settings.DATABASE_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+                secure=settings.SESSION_COOKIE_SECURE,
+            )
+        return response
@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import logging
+import re
+import time
+from dataclasses import dataclass
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently as AddIndexConcurrentlyBase
+from django.db import DatabaseError, OperationalError, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+PARTITION_KEY = "tenant_id"
+
+# lock_timeout を超えたときの SQLSTATE（lock_not_available）
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+@dataclass(frozen=True)
+class PartitionSpec:
+    '''
+    パーティション定義
+    - method="hash": tenant_id のハッシュで partitions 個に分散する
+    - method="list": テナントごとに1パーティション（未作成のテナントは DEFAULT パーティションへ）
+    '''
+    method: str
+    partitions: int = 8
+
+    def __post_init__(self):
+        if self.method not in ("hash", "list"):
+            raise ValueError(f"未対応のパーティション方式です: {self.method}")
+        if self.method == "hash" and self.partitions < 1:
+            raise ValueError("partitions は1以上を指定してください")
+
+
+def get_partition_spec(label: str) -> PartitionSpec | None:
+    '''
+    settings.PARTITIONED_MODELS からモデル（"app_label.ModelName"）の定義を返す
+    '''
+    conf = settings.PARTITIONED_MODELS.get(label)
+    if not conf or not conf.get("method"):
+        return None
+    return PartitionSpec(method=conf["method"], partitions=int(conf.get("partitions", 8)))
+
+
+def is_partitioned(connection, table: str) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid))",
+            [table],
+        )
+        return cursor.fetchone()[0]
+
+
+def list_partition_name(table: str, tenant_id: int) -> str:
+    return f"{table}_t{tenant_id}"
+
+
+def ensure_list_partition(connection, table: str, tenant_id: int) -> None:
+    '''
+    list パーティションのテナント用パーティションを作成する（既にあれば何もしない）
+    '''
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {qn(list_partition_name(table, tenant_id))} "
+            f"PARTITION OF {qn(table)} FOR VALUES IN ({int(tenant_id)})"
+        )
+
+
+def list_partitioned_tables(connection) -> list[str]:
+    '''
+    PARTITIONED_MODELS で list パーティションが有効で、実際にパーティション化されているテーブル
+    '''
+    tables = []
+    for label in settings.PARTITIONED_MODELS:
+        spec = get_partition_spec(label)
+        if spec is None or spec.method != "list":
+            continue
+        table = apps.get_model(label)._meta.db_table
+        if is_partitioned(connection, table):
+            tables.append(table)
+    return tables
+
+
+def provision_tenant_partitions(tenant_ids, *, using: str = "default") -> list[int]:
+    '''
+    list パーティション化されたテーブルに、テナント用のパーティションを作成する（戻り値: 作成できなかったテナント ID）
+    - CREATE TABLE ... PARTITION OF は親テーブルと DEFAULT パーティションに AccessExclusiveLock を取り、
+      DEFAULT パーティションの走査が終わるまで全テナントの読み書きを止める
+      → テナントの登録・取込のトランザクションの外（コミット後）で、テナントごとの短いトランザクションで作る
+    - ロック待ちは PARTITION_LOCK_TIMEOUT_MS で打ち切り、間隔を空けて PARTITION_CREATE_RETRIES 回までやり直す
+      （取引先の長いトランザクションの後ろに並んで、後続の読み書きまで止めてしまわないように）
+    - 作成できなかったテナントの行は DEFAULT パーティションに入る（create_tenant_partitions コマンドで後から作れる）
+    '''
+    connection = connections[using]
+    tables = list_partitioned_tables(connection)
+    if not tables:
+        return []
+
+    qn = connection.ops.quote_name
+    failed = []
+    for tenant_id in tenant_ids:
+        for table in tables:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT to_regclass(%s)", [qn(list_partition_name(table, tenant_id))])
+                if cursor.fetchone()[0] is not None:
+                    continue
+            if not _create_list_partition(connection, table, tenant_id, using=using):
+                failed.append(tenant_id)
+                break
+    return failed
+
+
+def _create_list_partition(connection, table: str, tenant_id: int, *, using: str) -> bool:
+    retries = settings.PARTITION_CREATE_RETRIES
+    for attempt in range(retries + 1):
+        try:
+            with transaction.atomic(using=using), connection.cursor() as cursor:
+                cursor.execute("SELECT set_config('lock_timeout', %s, true)", [f"{settings.PARTITION_LOCK_TIMEOUT_MS}ms"])
+                ensure_list_partition(connection, table, tenant_id)
+            return True
+        except OperationalError as e:
+            if getattr(e.__cause__, "sqlstate", None) != LOCK_NOT_AVAILABLE:
+                raise
+            if attempt < retries:
+                time.sleep(0.2 * (attempt + 1))
+        except DatabaseError as e:
+            # DEFAULT パーティションに既にテナントの行がある場合など
+            logger.warning("could not create partition of %s for tenant %s: %s", table, tenant_id, e)
+            return False
+    logger.warning("could not create partition of %s for tenant %s: lock timeout", table, tenant_id)
+    return False
+
+
+def drop_list_partition(connection, table: str, tenant_id: int) -> bool:
+    '''
+    テナント用の list パーティションを切り離して削除する（テナント削除用）
+    - 行単位の DELETE と違い、件数に関係なく一瞬で終わり WAL もほとんど出ない
+    - 戻り値: パーティションがあれば True
+    '''
+    qn = connection.ops.quote_name
+    name = list_partition_name(table, tenant_id)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [qn(name)])
+        if cursor.fetchone()[0] is None:
+            return False
+        cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}")
+        cursor.execute(f"DROP TABLE {qn(name)}")
+    return True
+
+
+def convert_to_partitioned(connection, model, spec: PartitionSpec) -> None:
+    '''
+    既存テーブルを tenant_id で宣言的パーティション化する（データ・制約・インデックスは引き継ぐ）
+    - 主キーは (id, tenant_id) になる（パーティションキーを含む必要があるため）
+    - tenant_id を含まない一意制約/一意インデックスがある場合は変換できない
+    - id は IDENTITY ではなくシーケンス + DEFAULT nextval() で採番する
+    - 呼び出し側のトランザクション内で実行する（マイグレーションは atomic）
+    '''
+    qn = connection.ops.quote_name
+    table = model._meta.db_table
+    old = f"{table}_unpartitioned"
+    pk = model._meta.pk.column
+    seq = f"{table}_{pk}_seq"
+
+    with connection.cursor() as cursor:
+        # 1. 既存の制約・インデックス定義を控える
+        cursor.execute(
+            "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f') ORDER BY contype DESC, conname",
+            [table],
+        )
+        constraints = cursor.fetchall()
+        cursor.execute(
+            "SELECT pg_get_indexdef(i.indexrelid), i.indisunique FROM pg_index i "
+            "WHERE i.indrelid = %s::regclass "
+            "AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)",
+            [table],
+        )
+        indexes = cursor.fetchall()
+
+        for name, contype, definition in constraints:
+            if contype == "u" and PARTITION_KEY not in definition:
+                raise ValueError(f"{table}.{name} は {PARTITION_KEY} を含まないためパーティション化できません")
+        for definition, unique in indexes:
+            if unique and PARTITION_KEY not in definition:
+                raise ValueError(f"{table} の一意インデックスが {PARTITION_KEY} を含まないためパーティション化できません: {definition}")
+
+        # 2. 旧テーブルを退避し、同じ列構成のパーティション親テーブルを作る
+        cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(old)}")
+        method = "HASH" if spec.method == "hash" else "LIST"
+        cursor.execute(
+            f"CREATE TABLE {qn(table)} (LIKE {qn(old)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY {method} ({qn(PARTITION_KEY)})"
+        )
+
+        # 3. パーティションを作成・アタッチする
+        if spec.method == "hash":
+            for i in range(spec.partitions):
+                cursor.execute(
+                    f"CREATE TABLE {qn(f'{table}_p{i}')} PARTITION OF {qn(table)} "
+                    f"FOR VALUES WITH (MODULUS {spec.partitions}, REMAINDER {i})"
+                )
+        else:
+            cursor.execute(f"CREATE TABLE {qn(f'{table}_default')} PARTITION OF {qn(table)} DEFAULT")
+            cursor.execute(f"SELECT DISTINCT {qn(PARTITION_KEY)} FROM {qn(old)}")
+            for (tenant_id,) in cursor.fetchall():
+                ensure_list_partition(connection, table, tenant_id)
+            tenant_table = model._meta.get_field("tenant").related_model._meta.db_table
+            cursor.execute(f"SELECT id FROM {qn(tenant_table)}")
+            for (tenant_id,) in cursor.fetchall():
+                ensure_list_partition(connection, table, tenant_id)
+
+        # 4. データを移し、採番を引き継ぐ
+        cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(old)}")
+        cursor.execute(f"SELECT COALESCE(MAX({qn(pk)}), 0) FROM {qn(old)}")
+        max_id = cursor.fetchone()[0]
+        cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", [old, pk])
+        old_seq = cursor.fetchone()[0]
+        if old_seq:
+            cursor.execute(f"SELECT last_value, is_called FROM {old_seq}")
+            last_value, is_called = cursor.fetchone()
+            max_id = max(max_id, last_value if is_called else last_value - 1)
+        cursor.execute(f"DROP TABLE {qn(old)}")
+
+        cursor.execute(f"CREATE SEQUENCE {qn(seq)} START WITH {max_id + 1}")
+        cursor.execute(f"ALTER SEQUENCE {qn(seq)} OWNED BY {qn(table)}.{qn(pk)}")
+        cursor.execute(f"ALTER TABLE {qn(table)} ALTER COLUMN {qn(pk)} SET DEFAULT nextval('{seq}')")
+
+        # 5. 制約・インデックスを元の名前で作り直す（親に作れば全パーティションへ伝播する）
+        for name, contype, definition in constraints:
+            if contype == "p":
+                definition = f"PRIMARY KEY ({qn(pk)}, {qn(PARTITION_KEY)})"
+            cursor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}")
+        for definition, _ in indexes:
+            definition = re.sub(rf" ON (?:\S+\.)?{re.escape(old)} ", f" ON {qn(table)} ", definition, count=1)
+            cursor.execute(definition)
+
+
+class AddIndexConcurrently(AddIndexConcurrentlyBase):
+    '''
+    CREATE INDEX CONCURRENTLY でインデックスを作る（書き込みを止めない。マイグレーションは atomic = False にする）
+    - パーティション化されたテーブルの親には CONCURRENTLY で作れないため、親には ON ONLY で作り、
+      各パーティションに CONCURRENTLY で作ってからアタッチする（全パーティションがそろうと親のインデックスが有効になる）
+    - 途中で失敗した場合はそのまま migrate をやり直せる（作成途中で無効になったインデックスは作り直す）
+    '''
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        self._ensure_not_in_transaction(schema_editor)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        connection = schema_editor.connection
+        if not self.allow_migrate_model(connection.alias, model):
+            return
+        table = model._meta.db_table
+        if not is_partitioned(connection, table):
+            self._create(schema_editor, model, table, self.index.name)
+            return
+
+        qn = connection.ops.quote_name
+        parent = self.index.create_sql(model, schema_editor)
+        parent.parts["table"] = f"ONLY {qn(table)}"
+        parent.parts["name"] = f"IF NOT EXISTS {qn(self.index.name)}"
+        schema_editor.execute(parent)
+        with connection.cursor() as cursor:
+            # インデックスがまだアタッチされていないパーティション
+            cursor.execute(
+                "SELECT c.relname FROM pg_inherits p JOIN pg_class c ON c.oid = p.inhrelid "
+                "WHERE p.inhparent = %s::regclass AND NOT EXISTS ("
+                " SELECT 1 FROM pg_inherits ip JOIN pg_index i ON i.indexrelid = ip.inhrelid"
+                " WHERE ip.inhparent = to_regclass(%s) AND i.indrelid = c.oid"
+                ") ORDER BY c.relname",
+                [table, qn(self.index.name)],
+            )
+            partitions = [row[0] for row in cursor.fetchall()]
+        for partition in partitions:
+            name = f"{self.index.name}_{partition.removeprefix(table).lstrip('_')}"
+            self._create(schema_editor, model, partition, name)
+            schema_editor.execute(f"ALTER INDEX {qn(self.index.name)} ATTACH PARTITION {qn(name)}")
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        connection = schema_editor.connection
+        if self.allow_migrate_model(connection.alias, model) and is_partitioned(connection, model._meta.db_table):
+            # パーティション化されたテーブルのインデックスは CONCURRENTLY で削除できない
+            schema_editor.remove_index(model, self.index)
+            return
+        super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+    def _create(self, schema_editor, model, table: str, name: str) -> None:
+        qn = schema_editor.connection.ops.quote_name
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT NOT i.indisvalid FROM pg_index i WHERE i.indexrelid = to_regclass(%s)", [qn(name)]
+            )
+            row = cursor.fetchone()
+        if row and row[0]:
+            schema_editor.execute(f"DROP INDEX CONCURRENTLY {qn(name)}")
+        statement = self.index.create_sql(model, schema_editor, concurrently=True)
+        statement.rename_table_references(model._meta.db_table, table)
+        statement.parts["name"] = f"IF NOT EXISTS {qn(name)}"
+        schema_editor.execute(statement)
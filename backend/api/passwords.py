@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PasswordHashBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "ログイン処理が混み合っています。しばらくしてから再度お試しください。"
+    default_code = "password_hash_busy"
+
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    '''
+    パスワードハッシュ専用のスレッドプール
+    - 同時に実行するハッシュ計算を PASSWORD_HASH_WORKERS 本に制限し、他のリクエストのCPUを奪わないようにする
+    '''
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+    return _executor
+
+
+def _run(fn, *args):
+    future = _get_executor().submit(fn, *args)
+    try:
+        return future.result(timeout=settings.PASSWORD_HASH_TIMEOUT_SECONDS)
+    except FutureTimeoutError as e:
+        future.cancel()
+        raise PasswordHashBusy() from e
+
+
+def _verify(password: str, encoded: str | None) -> tuple[bool, bool]:
+    if encoded is None:
+        # ユーザーが存在しない場合も同じだけ計算する（ModelBackend と同じ扱い）
+        make_password(password)
+        return False, False
+    return verify_password(password, encoded)
+
+
+def check_password_bounded(password: str, encoded: str | None) -> tuple[bool, bool]:
+    '''
+    パスワードを検証する（ハッシュ計算はスレッドプールで実行）
+    - encoded=None（ユーザーが存在しない）場合もハッシュを1回計算し、応答時間の差を小さくする
+    - 戻り値: (一致したか, 再ハッシュが必要か)
+    '''
+    return _run(_verify, password, encoded)
+
+
+def make_password_bounded(password: str) -> str:
+    '''
+    パスワードをハッシュ化する（ハッシュ計算はスレッドプールで実行）
+    '''
+    return _run(make_password, password)
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject, empty
+
+logger = logging.getLogger("api.perf")
+
+# 処理中のリクエストの計測値（リクエスト外では None）
+# - 非同期ビューの ORM は別スレッドで動くが、contextvars は sync_to_async で引き継がれる
+_current: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+
+
+@dataclass
+class RequestTimings:
+    '''
+    1リクエスト分の計測値（時間はすべてミリ秒）
+    - view: ビュー関数の実行時間（認証・SQL・シリアライズを含む）
+    - render: DRF の Response などテンプレート応答のレンダリング時間
+    '''
+    started: float = field(default_factory=time.perf_counter)
+    db_count: int = 0
+    db_ms: float = 0.0
+    auth_ms: float = 0.0
+    view_started: float | None = None
+    view_ms: float = 0.0
+    render_ms: float = 0.0
+    # SQL の記録先（プロファイル対象のリクエストだけ api.profiling がリストを入れる）
+    trace: list[dict] | None = None
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+
+def current_timings() -> RequestTimings | None:
+    return _current.get()
+
+
+@contextmanager
+def timer(name: str):
+    '''
+    ブロックの実行時間を現在のリクエストの <name>_ms に加算する（リクエスト外では何もしない）
+    '''
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(timings, f"{name}_ms", getattr(timings, f"{name}_ms") + (time.perf_counter() - started) * 1000)
+
+
+@contextmanager
+def untracked():
+    '''
+    ブロック内の SQL を現在のリクエストの計測から外す（プロファイラが実行する EXPLAIN など）
+    '''
+    token = _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    '''
+    connection.execute_wrapper 用: 現在のリクエストのクエリ件数と SQL 実行時間を集計する
+    '''
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        ms = (time.perf_counter() - started) * 1000
+        timings.db_count += 1
+        timings.db_ms += ms
+        if timings.trace is not None:
+            timings.trace.append(
+                {"alias": context["connection"].alias, "sql": sql, "params": params, "many": many, "ms": ms}
+            )
+
+
+def install_query_recorder(connection) -> None:
+    '''
+    接続に record_query を常設する（接続作成時に api.signals から呼ぶ）
+    - リクエストごとに execute_wrapper() で付け外しすると、非同期ビューで ORM が動く別スレッドの接続を拾えないため
+    '''
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def server_timing(timings: RequestTimings, total_ms: float) -> str:
+    '''
+    Server-Timing ヘッダー値（ブラウザの開発者ツールに表示される）
+    '''
+    return ", ".join(
+        [
+            f'db;dur={timings.db_ms:.1f};desc="{timings.db_count} queries"',
+            f"auth;dur={timings.auth_ms:.1f}",
+            f"view;dur={timings.view_ms:.1f}",
+            f"render;dur={timings.render_ms:.1f}",
+            f"total;dur={total_ms:.1f}",
+        ]
+    )
+
+
+def server_timing_enabled(request) -> bool:
+    '''
+    Server-Timing ヘッダーを付けるか（PERF_SERVER_TIMING_HEADER: True / False / "staff"）
+    '''
+    mode = settings.PERF_SERVER_TIMING_HEADER
+    if mode == "staff":
+        # 認証済みのユーザーだけを見る（未評価のセッションユーザーはここで DB を引かない。非同期でも呼ばれるため）
+        user = getattr(request, "user", None)
+        if user is None or (isinstance(user, SimpleLazyObject) and user._wrapped is empty):
+            return False
+        return user.is_staff
+    return bool(mode)
+
+
+class ServerTimingMiddleware:
+    '''
+    リクエストごとの処理時間を計測し、Server-Timing ヘッダーと構造化ログ（api.perf）に出力する
+    - SQL: 件数 / 合計時間、認証、ビュー、レンダリング、全体
+    - ログにはルート名とテナントIDを付ける（PERF_LOG_MIN_MS 未満のリクエストは出力しない）
+    - 計測は time.perf_counter の差分だけで、常時有効にしても負荷はほぼない
+    - ストリーミング応答は本文の送出前までを計測する
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # 非同期モードではフックも非同期にする（同期のままだとスレッド切り替えが挟まる）
+            self.process_view = self._aprocess_view
+            self.process_template_response = self._aprocess_template_response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.start_view()
+
+    def process_template_response(self, request, response):
+        return self.end_view(response)
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self.start_view()
+
+    async def _aprocess_template_response(self, request, response):
+        return self.end_view(response)
+
+    def start_view(self):
+        timings = _current.get()
+        if timings is not None:
+            timings.view_started = time.perf_counter()
+
+    def end_view(self, response):
+        '''
+        ビューがテンプレート応答（DRF の Response など）を返したとき: ここでビュー終了、レンダリング後に render を記録
+        '''
+        timings = _current.get()
+        if timings is None or timings.view_started is None:
+            return response
+        ended = time.perf_counter()
+        timings.view_ms = (ended - timings.view_started) * 1000
+        timings.view_started = None
+
+        def rendered(_response):
+            timings.render_ms = (time.perf_counter() - ended) * 1000
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, timings: RequestTimings):
+        total_ms = timings.elapsed_ms()
+        if timings.view_started is not None:
+            # テンプレート応答以外（JsonResponse / StreamingHttpResponse など）
+            timings.view_ms = (time.perf_counter() - timings.view_started) * 1000
+
+        if server_timing_enabled(request):
+            response["Server-Timing"] = server_timing(timings, total_ms)
+
+        if total_ms >= settings.PERF_LOG_MIN_MS and logger.isEnabledFor(logging.INFO):
+            match = getattr(request, "resolver_match", None)
+            tenant = getattr(request, "tenant", None)
+            logger.info(
+                json.dumps(
+                    {
+                        "method": request.method,
+                        "path": request.path,
+                        "route": match.route if match else None,
+                        "view": match.view_name if match else None,
+                        "status": response.status_code,
+                        "tenant": tenant.pk if tenant is not None else None,
+                        "total_ms": round(total_ms, 1),
+                        "db_ms": round(timings.db_ms, 1),
+                        "db_queries": timings.db_count,
+                        "auth_ms": round(timings.auth_ms, 1),
+                        "view_ms": round(timings.view_ms, 1),
+                        "render_ms": round(timings.render_ms, 1),
+                    },
+                    ensure_ascii=False,
+                )
+            )
+        return response
@@ -0,0 +1,26 @@
+import secrets
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+# 内部向けエンドポイントの共有トークンを載せるヘッダー
+INTERNAL_TOKEN_HEADER = "X-Internal-Token"
+
+
+class IsInternalRequest(BasePermission):
+    '''
+    内部向けエンドポイント用
+    - スタッフユーザーは常に許可する
+    - INTERNAL_API_TOKEN を設定した場合は、X-Internal-Token ヘッダーが一致するリクエストも許可する（監視からの取得用）
+    - INTERNAL_IPS を設定した場合だけ、その送信元IPからのリクエストも許可する
+      （同じホストのリバースプロキシ経由では全リクエストが 127.0.0.1 になるため、既定では送信元IPを信用しない）
+    '''
+
+    def has_permission(self, request, view):
+        user = request.user
+        if user and user.is_authenticated and user.is_staff:
+            return True
+        token = settings.INTERNAL_API_TOKEN
+        if token and secrets.compare_digest(request.headers.get(INTERNAL_TOKEN_HEADER, ""), token):
+            return True
+        return bool(settings.INTERNAL_IPS) and request.META.get("REMOTE_ADDR") in settings.INTERNAL_IPS
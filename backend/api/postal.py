@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import csv
+import io
+import logging
+import mmap
+import os
+import re
+import struct
+import time
+import unicodedata
+import zipfile
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Any, Iterable, Iterator
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# 郵便番号 → 住所（都道府県・市区町村・町域）の索引
+# - 日本郵便の KEN_ALL.CSV（読み仮名データ・cp932）から build_postal_index コマンドで作る
+# - 索引ファイルは mmap で開くだけで、プロセスごとの読み込み処理はない
+#   （ページキャッシュを全ワーカーで共有するため、プロセス数が増えてもメモリは増えない）
+# - ファイル構成（バイト順は作成したマシンのもの。BYTE_ORDER_MARK で確認する）
+#     ヘッダ | 郵便番号 uint32 × 件数（昇順）| (都道府県, 市区町村, 町域) の文字列位置 uint32 × 3 × 件数 | 文字列
+#   文字列は「長さ uint16 + UTF-8」で、同じ文字列は1回だけ格納する
+# - 1つの郵便番号に複数の町域がある場合は、同じ郵便番号が続けて並ぶ
+
+MAGIC = b"PSTL"
+VERSION = 1
+BYTE_ORDER_MARK = 0x01020304
+HEADER = struct.Struct("=4sIII")  # magic, version, byte order mark, 件数
+STRING_LENGTH = struct.Struct("=H")
+
+# 索引ファイルの差し替えを確認する間隔（秒）
+CHECK_INTERVAL_SECONDS = 60
+
+
+class PostalIndexError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class PostalAddress:
+    postal_code: str
+    state: str
+    city: str
+    town: str
+
+
+def normalize_postal_code(value: Any) -> str | None:
+    '''
+    郵便番号を7桁の数字にする（全角数字・ハイフンの揺れを吸収する。7桁にならなければ None）
+    '''
+    digits = re.sub(r"[\s\-‐－−ー]", "", unicodedata.normalize("NFKC", str(value or "")))
+    return digits if re.fullmatch(r"\d{7}", digits) else None
+
+
+def format_postal_code(digits: str) -> str:
+    return f"{digits[:3]}-{digits[3:]}"
+
+
+# -----------------------------
+# KEN_ALL.CSV の読み込み
+# -----------------------------
+def clean_town(town: str) -> str:
+    '''
+    町域名から住所入力に使わない部分を除く
+    - 「以下に掲載がない場合」「○○の次に番地がくる場合」「○○一円」は町域なしとする
+    - 「（１～１９丁目）」「（次のビルを除く）」などの括弧書きは除く
+    '''
+    if town == "以下に掲載がない場合" or town.endswith("の次に番地がくる場合"):
+        return ""
+    if town.endswith("一円") and town != "一円":
+        return ""
+    return town.split("（", 1)[0]
+
+
+def read_ken_all(path: str, *, encoding: str = "cp932") -> Iterator[tuple[int, str, str, str]]:
+    '''
+    KEN_ALL.CSV（または配布されている zip）から (郵便番号, 都道府県, 市区町村, 町域) を読む
+    - 町域名が長く複数行に分かれている行（括弧が閉じていない行）はつなげる
+    '''
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            name = next(n for n in zf.namelist() if n.lower().endswith(".csv"))
+            with zf.open(name) as raw:
+                yield from _read_rows(io.TextIOWrapper(raw, encoding=encoding, newline=""))
+        return
+    with open(path, encoding=encoding, newline="") as f:
+        yield from _read_rows(f)
+
+
+def _read_rows(f) -> Iterator[tuple[int, str, str, str]]:
+    pending = None
+    for row in csv.reader(f):
+        if len(row) < 9:
+            continue
+        code, state, city, town = row[2].strip(), row[6].strip(), row[7].strip(), row[8].strip()
+        if pending is not None:
+            if pending[0] == code:
+                pending[3] += town
+                if "）" in town:
+                    yield int(pending[0]), pending[1], pending[2], clean_town(pending[3])
+                    pending = None
+                continue
+            # 括弧が閉じないまま郵便番号が変わった場合は、そこまでを1件とする
+            yield int(pending[0]), pending[1], pending[2], clean_town(pending[3])
+            pending = None
+        if "（" in town and "）" not in town:
+            pending = [code, state, city, town]
+            continue
+        yield int(code), state, city, clean_town(town)
+    if pending is not None:
+        yield int(pending[0]), pending[1], pending[2], clean_town(pending[3])
+
+
+# -----------------------------
+# 索引ファイルの作成
+# -----------------------------
+def build_index(entries: Iterable[tuple[int, str, str, str]], path: str) -> int:
+    '''
+    (郵便番号, 都道府県, 市区町村, 町域) から索引ファイルを作る（戻り値: 件数）
+    - 一時ファイルに書いてから置き換えるため、作成中も既存の索引はそのまま使える
+    '''
+    rows = sorted(set(entries))
+
+    strings = bytearray()
+    offsets: dict[str, int] = {}
+
+    def intern(s: str) -> int:
+        if s not in offsets:
+            data = s.encode("utf-8")
+            offsets[s] = len(strings)
+            strings.extend(STRING_LENGTH.pack(len(data)))
+            strings.extend(data)
+        return offsets[s]
+
+    codes = array("I", (code for code, *_ in rows))
+    records = array("I")
+    for _, state, city, town in rows:
+        records.extend((intern(state), intern(city), intern(town)))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, BYTE_ORDER_MARK, len(rows)))
+        f.write(codes.tobytes())
+        f.write(records.tobytes())
+        f.write(strings)
+    os.replace(tmp, path)
+    return len(rows)
+
+
+# -----------------------------
+# 検索
+# -----------------------------
+class PostalIndex:
+    '''
+    mmap した索引ファイルを二分探索する
+    '''
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            try:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # 空のファイル
+                raise PostalIndexError(f"{path}: 索引ファイルが壊れています") from None
+        if len(self._mm) < HEADER.size:
+            raise PostalIndexError(f"{path}: 索引ファイルが壊れています")
+        magic, version, mark, count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or mark != BYTE_ORDER_MARK:
+            raise PostalIndexError(f"{path}: 索引ファイルの形式が違います（build_postal_index で作り直してください）")
+        if len(self._mm) < HEADER.size + 16 * count:
+            raise PostalIndexError(f"{path}: 索引ファイルが壊れています（途中で切れています）")
+
+        view = memoryview(self._mm)
+        start = HEADER.size
+        self._codes = view[start:start + 4 * count].cast("I")
+        self._records = view[start + 4 * count:start + 16 * count].cast("I")
+        self._strings = start + 16 * count
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _string(self, offset: int) -> str:
+        pos = self._strings + offset
+        (length,) = STRING_LENGTH.unpack_from(self._mm, pos)
+        return self._mm[pos + STRING_LENGTH.size:pos + STRING_LENGTH.size + length].decode("utf-8")
+
+    def lookup(self, postal_code: Any) -> list[PostalAddress]:
+        '''
+        郵便番号に該当する住所の一覧（該当なし・形式不正は []）
+        '''
+        digits = normalize_postal_code(postal_code)
+        if digits is None:
+            return []
+        code = int(digits)
+        i = bisect_left(self._codes, code)
+        results = []
+        while i < self.count and self._codes[i] == code:
+            state, city, town = self._records[3 * i:3 * i + 3]
+            results.append(PostalAddress(digits, self._string(state), self._string(city), self._string(town)))
+            i += 1
+        return results
+
+
+_index: PostalIndex | None = None
+_index_stat: tuple | None = None
+_checked_at = 0.0
+
+
+def get_postal_index() -> PostalIndex | None:
+    '''
+    プロセスで共有する索引（索引ファイルがない・壊れている場合は None）
+    - CHECK_INTERVAL_SECONDS ごとにファイルを確認し、作り直されていれば開き直す
+    - 壊れている場合は警告を出して「索引なし」として扱う（作り直されるまで開き直さない）
+    '''
+    global _index, _index_stat, _checked_at
+    now = time.monotonic()
+    if _index_stat is not None and now - _checked_at < CHECK_INTERVAL_SECONDS:
+        return _index
+    _checked_at = now
+
+    path = settings.POSTAL_INDEX_PATH
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        _index, _index_stat = None, ()
+        return None
+    stat = (path, st.st_ino, st.st_mtime_ns, st.st_size)
+    if stat != _index_stat:
+        try:
+            _index = PostalIndex(path)
+        except PostalIndexError as e:
+            logger.warning("postal index unavailable: %s", e)
+            _index = None
+        _index_stat = stat
+    return _index
+
+
+def reset_postal_index() -> None:
+    '''
+    次回の get_postal_index() でファイルを確認し直す（索引の作成直後・テスト用）
+    '''
+    global _index, _index_stat, _checked_at
+    _index, _index_stat, _checked_at = None, None, 0.0
+
+
+# -----------------------------
+# CSV取込での住所の正規化・確認
+# -----------------------------
+def apply_postal_lookup(data: dict[str, Any]) -> list[str]:
+    '''
+    取込データ（postal_code / state / city）を索引と突き合わせ、エラー文言を返す（索引がなければ何もしない）
+    - 郵便番号は「123-4567」の形にそろえる（7桁にならなければエラー）
+    - 都道府県・市区町村が空なら索引の値で補い、入力があれば一致するかを確認する
+      （市区町村は「横浜市」と「横浜市中区」のように前方が一致すればよい）
+    - 索引にない郵便番号（KEN_ALL に載らない事業所の個別番号・新設の番号など）はエラーにせず、確認しない
+    '''
+    index = get_postal_index()
+    raw = (data.get("postal_code") or "").strip()
+    if index is None or not raw:
+        return []
+
+    digits = normalize_postal_code(raw)
+    if digits is None:
+        return ["郵便番号は7桁で指定してください"]
+    data["postal_code"] = format_postal_code(digits)
+    candidates = index.lookup(digits)
+    if not candidates:
+        return []
+
+    errs: list[str] = []
+    state = (data.get("state") or "").strip()
+    states = sorted({c.state for c in candidates})
+    if not state:
+        if len(states) == 1:
+            data["state"] = states[0]
+    elif state not in states:
+        errs.append(f"都道府県が郵便番号の住所（{'・'.join(states)}）と一致しません")
+
+    city = (data.get("city") or "").strip()
+    cities = sorted({c.city for c in candidates if not state or c.state == state})
+    if not city:
+        if len(cities) == 1:
+            data["city"] = cities[0]
+    elif cities and not any(c.startswith(city) or city.startswith(c) for c in cities):
+        errs.append(f"市区町村が郵便番号の住所（{'・'.join(cities)}）と一致しません")
+    return errs
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import cProfile
+import io
+import json
+import pstats
+import secrets
+import time
+import uuid
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+
+from .perf import current_timings, untracked
+
+# 1リクエスト単位のプロファイラ
+# - スタッフが発行した署名付きトークンを X-Profile-Token ヘッダー（またはクエリ _profile=）に付けたリクエストだけを
+#   cProfile で計測し、SQL の全件トレースと、遅い SELECT の EXPLAIN ANALYZE を PROFILE_DIR に保存する
+# - トークンは PROFILE_TOKEN_SECONDS 秒で失効する（SECRET_KEY で署名するため改ざんできない）
+# - トークンは1回だけ使える（埋め込んだ乱数をキャッシュに記録する。複数ワーカーでは共有の CACHES が必要）
+# - 保存したプロファイルは manage.py profiles で一覧・表示する
+
+TOKEN_SALT = "api.profiling"
+TOKEN_HEADER = "X-Profile-Token"
+TOKEN_PARAM = "_profile"
+
+
+def issue_token(user) -> str:
+    '''
+    プロファイル用トークンを発行する（発行者のIDと、使用済みの判定に使う乱数を埋め込む）
+    '''
+    return signing.dumps({"by": user.pk, "nonce": secrets.token_urlsafe(16)}, salt=TOKEN_SALT)
+
+
+def _load_token(request) -> dict | None:
+    token = request.headers.get(TOKEN_HEADER) or request.GET.get(TOKEN_PARAM)
+    if not token:
+        return None
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT, max_age=settings.PROFILE_TOKEN_SECONDS)
+    except signing.BadSignature:
+        return None
+    return data if data.get("nonce") else None
+
+
+def _used_key(data: dict) -> str:
+    return f"profile-token:{data['nonce']}"
+
+
+def read_token(request) -> dict | None:
+    '''
+    リクエストに付いたトークンを検証して使用済みにする（無い・不正・期限切れ・使用済みは None）
+    '''
+    data = _load_token(request)
+    if data is None or not cache.add(_used_key(data), True, timeout=settings.PROFILE_TOKEN_SECONDS):
+        return None
+    return data
+
+
+async def aread_token(request) -> dict | None:
+    '''
+    read_token の非同期版
+    '''
+    data = _load_token(request)
+    if data is None or not await cache.aadd(_used_key(data), True, timeout=settings.PROFILE_TOKEN_SECONDS):
+        return None
+    return data
+
+
+def profile_dir() -> Path:
+    return Path(settings.PROFILE_DIR)
+
+
+def explain_slowest(trace: list[dict], limit: int) -> list[dict]:
+    '''
+    時間のかかった SELECT 上位 limit 件を EXPLAIN ANALYZE する
+    - EXPLAIN ANALYZE は実際にクエリを実行するため、SELECT だけを対象にし、念のためロールバックする
+    - PostgreSQL 以外の接続は対象外
+    '''
+    selects = [q for q in trace if not q["many"] and q["sql"].lstrip().upper().startswith(("SELECT", "WITH"))]
+    results = []
+    for q in sorted(selects, key=lambda q: q["ms"], reverse=True)[:limit]:
+        connection = connections[q["alias"]]
+        if connection.vendor != "postgresql":
+            continue
+        try:
+            with transaction.atomic(using=q["alias"]):
+                with connection.cursor() as cursor:
+                    cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + q["sql"], q["params"])
+                    plan = "\n".join(row[0] for row in cursor.fetchall())
+                transaction.set_rollback(True, using=q["alias"])
+        except DatabaseError as e:
+            plan = f"EXPLAIN に失敗しました: {e}"
+        results.append({"alias": q["alias"], "sql": q["sql"], "ms": round(q["ms"], 2), "plan": plan})
+    return results
+
+
+class Capture:
+    '''
+    プロファイル1件分（計測の開始/終了と保存）
+    - SQL は api.perf の計測（ServerTimingMiddleware）に記録させるため、ProfilerMiddleware はその内側に置く
+    '''
+
+    def __init__(self, request, token: dict):
+        self.request = request
+        self.token = token
+        self.profiler = cProfile.Profile()
+        self.timings = current_timings()
+        self.trace: list[dict] = []
+        self.elapsed_ms = 0.0
+
+    def start(self) -> bool:
+        try:
+            self.profiler.enable()
+        except ValueError:
+            # 同じスレッドで別のプロファイルが動いている
+            return False
+        if self.timings is not None:
+            self.timings.trace = self.trace
+        self.started = time.perf_counter()
+        return True
+
+    def stop(self) -> None:
+        self.profiler.disable()
+        self.elapsed_ms = (time.perf_counter() - self.started) * 1000
+        if self.timings is not None:
+            self.timings.trace = None
+
+    def save(self, response) -> str:
+        '''
+        .prof（pstats 形式）と .json（リクエスト情報・SQL トレース・実行計画・上位関数）を保存し、IDを返す
+        '''
+        with untracked():
+            explain = explain_slowest(self.trace, settings.PROFILE_EXPLAIN_TOP)
+
+        captured_at = timezone.now()
+        profile_id = f"{captured_at:%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        directory = profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        self.profiler.dump_stats(directory / f"{profile_id}.prof")
+
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats("cumulative").print_stats(30)
+
+        request = self.request
+        match = getattr(request, "resolver_match", None)
+        user = getattr(request, "user", None)
+        tenant = getattr(request, "tenant", None)
+        query = request.GET.copy()
+        query.pop(TOKEN_PARAM, None)
+        meta = {
+            "id": profile_id,
+            "captured_at": captured_at.isoformat(),
+            "requested_by": self.token.get("by"),
+            "method": request.method,
+            "path": request.path,
+            "query": query.urlencode(),
+            "route": match.route if match else None,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "user": user.pk if user is not None and user.is_authenticated else None,
+            "tenant": tenant.pk if tenant is not None else None,
+            "total_ms": round(self.elapsed_ms, 1),
+            "db_ms": round(sum(q["ms"] for q in self.trace), 1),
+            "db_queries": len(self.trace),
+            "queries": [
+                {"alias": q["alias"], "sql": q["sql"], "params": q["params"], "many": q["many"], "ms": round(q["ms"], 2)}
+                for q in self.trace
+            ],
+            "explain": explain,
+            "top": out.getvalue(),
+        }
+        (directory / f"{profile_id}.json").write_text(
+            json.dumps(meta, ensure_ascii=False, indent=2, default=str), encoding="utf-8"
+        )
+        return profile_id
+
+
+def load_profiles() -> list[dict]:
+    '''
+    保存済みプロファイルのメタ情報（新しい順）
+    '''
+    directory = profile_dir()
+    if not directory.is_dir():
+        return []
+    profiles = [json.loads(p.read_text(encoding="utf-8")) for p in directory.glob("*.json")]
+    return sorted(profiles, key=lambda p: p["captured_at"], reverse=True)
+
+
+class ProfilerMiddleware:
+    '''
+    有効なプロファイル用トークンが付いたリクエストだけを計測し、X-Profile-Id ヘッダーで保存先IDを返す
+    - トークンが無いリクエストはヘッダーの確認だけで、負荷はかからない
+    - 非同期ビューでは cProfile はイベントループのスレッドだけを計測する
+      （sync_to_async で動く ORM は SQL トレースには出るが、関数プロファイルには出ない）
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = read_token(request)
+        if token is None:
+            return self.get_response(request)
+        capture = Capture(request, token)
+        if not capture.start():
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            capture.stop()
+        response["X-Profile-Id"] = capture.save(response)
+        return response
+
+    async def __acall__(self, request):
+        token = await aread_token(request)
+        if token is None:
+            return await self.get_response(request)
+        capture = Capture(request, token)
+        if not capture.start():
+            return await self.get_response(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            capture.stop()
+        response["X-Profile-Id"] = await sync_to_async(capture.save)(response)
+        return response
@@ -1,4 +1,4 @@
-from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth import authenticate
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
@@ -8,19 +8,11 @@ class EmailTokenObtainSerializer(serializers.Serializer):
     password = serializers.CharField(write_only=True, trim_whitespace=False)
 
     def validate(self, attrs):
-        email = attrs.get("email")
-        password = attrs.get("password")
-
-        User = get_user_model()
-        try:
-            user = User.objects.get(email__iexact=email)
-        except User.DoesNotExist:
-            raise serializers.ValidationError(_("メールアドレスまたはパスワードが違います。"), code="authorization")
-
-        # username を使って Django の認証基盤に乗せる
-        user = authenticate(username=user.get_username(), password=password)
-        if not user:
+        # AUTHENTICATION_BACKENDS（accounts.backends.EmailBackend）で認証する
+        # - 失敗時は authenticate() が user_login_failed シグナルを送る
+        user = authenticate(self.context.get("request"), email=attrs.get("email"), password=attrs.get("password"))
+        if user is None:
             raise serializers.ValidationError(_("メールアドレスまたはパスワードが違います。"), code="authorization")
 
         attrs["user"] = user
-        return attrs
\ No newline at end of file
+        return attrs
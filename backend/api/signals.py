@@ -0,0 +1,40 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from tenants.stats import track_partner_save
+from .partitioning import provision_tenant_partitions
+from .perf import install_query_recorder
+
+
+@receiver(post_save, sender="tenants.Tenant")
+def create_tenant_partitions(sender, instance, created, using="default", **kwargs):
+    '''
+    list パーティション化されたテーブルに、新規テナント用のパーティションを作成する
+    - パーティションの作成は親テーブルを排他ロックするため、登録のトランザクションがコミットされてから行う
+      （api.partitioning.provision_tenant_partitions）
+    - bulk_create で作成したテナントはシグナルが飛ばないため、呼び出し側で provision_tenant_partitions を呼ぶ
+    '''
+    if not created:
+        return
+    transaction.on_commit(lambda: provision_tenant_partitions([instance.pk], using=using), using=using)
+
+
+@receiver(post_save, sender="partners.Partner")
+def update_tenant_stats(sender, instance, created, update_fields=None, using="default", **kwargs):
+    '''
+    取引先の登録・区分変更・論理削除・復元をテナント集計（TenantStats）に反映する
+    - 区分・削除フラグを含まない update_fields 指定の保存は対象外
+    '''
+    if not created and update_fields is not None and not {"partner_type", "is_deleted"} & set(update_fields):
+        return
+    track_partner_save(instance, created=created, using=using)
+
+
+@receiver(connection_created)
+def record_request_queries(sender, connection, **kwargs):
+    '''
+    DB接続ごとに、リクエスト単位のクエリ計測（api.perf）を組み込む
+    '''
+    install_query_recorder(connection)
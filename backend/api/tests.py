@@ -1,3 +1,582 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from prometheus_client import REGISTRY
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from partners.models import Partner
+from partners.services.partner_csv_importer import CSV_HEADERS
+from tenants.models import Tenant
+from . import changefeed, postal, traffic
+from .db_router import PrimaryReplicaRouter, read_from_replica
+from .management.commands.bench_api import compare
+from .middleware import ReplicaRoutingMiddleware
+from .profiling import aread_token, issue_token, load_profiles, read_token
+from .views import change_stream
+
+
+@override_settings(DATABASE_REPLICA_ALIAS="replica", DATABASE_PIN_COOKIE="db_pin", DATABASE_PIN_SECONDS=5)
+class PrimaryReplicaRoutingTests(SimpleTestCase):
+    '''
+    読み取りはレプリカ、書き込みはプライマリ、書き込み後はプライマリに固定されることを確認する
+    '''
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def run_view(self, request, *, write=False, status=200):
+        '''
+        ミドルウェア経由でビューを呼び、ビュー内で選ばれた読み取り先と応答を返す
+        '''
+        seen = {}
+
+        def view(req):
+            seen["before"] = self.router.db_for_read(Partner)
+            if write:
+                self.router.db_for_write(Partner)
+            seen["after"] = self.router.db_for_read(Partner)
+            return HttpResponse(status=status)
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return seen, response
+
+    def test_reads_use_primary_outside_request(self):
+        self.assertEqual(self.router.db_for_read(Partner), "default")
+
+    @override_settings(DATABASE_REPLICA_ALIAS=None)
+    def test_reads_use_primary_without_replica(self):
+        with read_from_replica():
+            self.assertEqual(self.router.db_for_read(Partner), "default")
+
+    def test_write_pins_remaining_reads(self):
+        with read_from_replica():
+            self.assertEqual(self.router.db_for_read(Partner), "replica")
+            self.assertEqual(self.router.db_for_write(Partner), "default")
+            self.assertEqual(self.router.db_for_read(Partner), "default")
+        self.assertEqual(self.router.db_for_read(Partner), "default")
+
+    def test_safe_request_reads_from_replica(self):
+        seen, response = self.run_view(self.factory.get("/api/partners/"))
+        self.assertEqual(seen, {"before": "replica", "after": "replica"})
+        self.assertNotIn("db_pin", response.cookies)
+
+    def test_write_request_sets_pin_cookie(self):
+        seen, response = self.run_view(self.factory.post("/api/partners/"), write=True, status=201)
+        self.assertEqual(seen, {"before": "default", "after": "default"})
+        self.assertEqual(response.cookies["db_pin"]["max-age"], 5)
+
+    def test_failed_write_does_not_pin(self):
+        _, response = self.run_view(self.factory.post("/api/partners/"), status=400)
+        self.assertNotIn("db_pin", response.cookies)
+
+    def test_pinned_client_reads_from_primary(self):
+        request = self.factory.get("/api/partners/")
+        request.COOKIES["db_pin"] = "1"
+        seen, _ = self.run_view(request)
+        self.assertEqual(seen, {"before": "default", "after": "default"})
+
+    def test_safe_request_that_writes_sets_pin_cookie(self):
+        seen, response = self.run_view(self.factory.get("/api/partners/"), write=True)
+        self.assertEqual(seen, {"before": "replica", "after": "default"})
+        self.assertIn("db_pin", response.cookies)
+
+
+@override_settings(PERF_SERVER_TIMING_HEADER=True, PERF_LOG_MIN_MS=0)
+class ServerTimingTests(TestCase):
+    '''
+    Server-Timing ヘッダーと api.perf ログに、SQL・認証・ビュー・レンダリングの計測値が出ることと、
+    既定ではヘッダーをスタッフにだけ付け、ログは遅いリクエストだけに絞ることを確認する
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(tenant_name="テナント", representative_name="代表者", email="t@example.com")
+        cls.user = User.objects.create_user(email="perf@example.com", password="pw-12345678", tenant=cls.tenant)
+        Partner.objects.create(tenant=cls.tenant, partner_name="取引先", email="p@example.com")
+
+    def parse(self, header: str) -> dict[str, dict[str, str]]:
+        metrics = {}
+        for item in header.split(","):
+            name, *params = item.strip().split(";")
+            metrics[name] = dict(p.split("=", 1) for p in params)
+        return metrics
+
+    def test_header_lists_all_phases(self):
+        with self.assertLogs("api.perf", "INFO"):
+            response = self.client.get("/api/health/")
+        metrics = self.parse(response["Server-Timing"])
+        self.assertEqual(set(metrics), {"db", "auth", "view", "render", "total"})
+        self.assertEqual(metrics["db"]["desc"], '"0 queries"')
+
+    def test_partner_list_is_logged_with_route_and_tenant(self):
+        token = RefreshToken.for_user(self.user).access_token
+        with self.assertLogs("api.perf", "INFO") as logs:
+            response = self.client.get("/api/partners/", headers={"Authorization": f"Bearer {token}"})
+        self.assertEqual(response.status_code, 200)
+
+        entry = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(entry["view"], "partner-list")
+        self.assertEqual(entry["tenant"], self.tenant.pk)
+        self.assertEqual(entry["status"], 200)
+        self.assertGreaterEqual(entry["db_queries"], 2)  # 件数 + 一覧
+
+        metrics = self.parse(response["Server-Timing"])
+        self.assertEqual(metrics["db"]["desc"], f'"{entry["db_queries"]} queries"')
+        self.assertGreater(float(metrics["total"]["dur"]), 0)
+
+    @override_settings(PERF_SERVER_TIMING_HEADER="staff")
+    def test_header_is_staff_only_by_default(self):
+        staff = User.objects.create_user(email="perf-staff@example.com", password="pw-12345678", tenant=self.tenant, is_staff=True)
+        with self.assertLogs("api.perf", "INFO"):
+            anonymous = self.client.get("/api/health/")
+            user = self.client.get("/api/me/", headers={"Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"})
+            staff = self.client.get("/api/me/", headers={"Authorization": f"Bearer {RefreshToken.for_user(staff).access_token}"})
+        self.assertNotIn("Server-Timing", anonymous)
+        self.assertNotIn("Server-Timing", user)
+        self.assertIn("Server-Timing", staff)
+
+    @override_settings(PERF_LOG_MIN_MS=60_000)
+    def test_fast_requests_are_not_logged(self):
+        with self.assertNoLogs("api.perf", "INFO"):
+            self.client.get("/api/health/")
+
+
+@override_settings(INTERNAL_API_TOKEN="secret")
+class MetricsTests(TestCase):
+    '''
+    /api/metrics/ にルート別のリクエスト数と、CSV取込・出力の件数が出ることを確認する
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(tenant_name="テナント", representative_name="代表者", email="t@example.com")
+        cls.user = User.objects.create_user(email="metrics@example.com", password="pw-12345678", tenant=cls.tenant)
+
+    def setUp(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_request_counted_by_route(self):
+        before = self.sample("http_requests_total", method="GET", route="api/health/", status="200")
+        self.client.get("/api/health/")
+        response = self.client.get("/api/metrics/", headers={"X-Internal-Token": "secret"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'http_requests_total{method="GET",route="api/health/",status="200"}', response.content)
+        self.assertEqual(self.sample("http_requests_total", method="GET", route="api/health/", status="200"), before + 1)
+
+    def test_import_and_export_throughput_counted(self):
+        saved = self.sample("csv_import_rows_total", kind="partner", result="saved")
+        runs = self.sample("csv_import_runs_total", kind="partner", outcome="saved")
+        exported = self.sample("csv_export_rows_total", kind="partner")
+
+        body = ",".join(CSV_HEADERS) + "\n"
+        body += "".join(f"取引先{i},トリヒキサキ,顧客,,,p{i}@example.com,,,,,,\n" for i in range(3))
+        file = SimpleUploadedFile("partners.csv", body.encode("utf-8"), content_type="text/csv")
+        response = self.client.post("/api/partners/import/", {"file": file}, headers=self.headers)
+        self.assertEqual(response.json(), {"count": 3})
+        self.client.get("/api/partners/export/", headers=self.headers)
+
+        self.assertEqual(self.sample("csv_import_rows_total", kind="partner", result="saved"), saved + 3)
+        self.assertEqual(self.sample("csv_import_runs_total", kind="partner", outcome="saved"), runs + 1)
+        self.assertEqual(self.sample("csv_export_rows_total", kind="partner"), exported + 3)
+
+
+class RequestProfilerTests(TestCase):
+    '''
+    スタッフが発行したトークン付きのリクエストだけが、SQL トレースと実行計画付きで保存されることを確認する
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(tenant_name="テナント", representative_name="代表者", email="t@example.com")
+        cls.user = User.objects.create_user(email="user@example.com", password="pw-12345678", tenant=cls.tenant)
+        cls.staff = User.objects.create_user(
+            email="staff@example.com", password="pw-12345678", tenant=cls.tenant, is_staff=True
+        )
+        Partner.objects.create(tenant=cls.tenant, partner_name="取引先", email="p@example.com")
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(PROFILE_DIR=directory.name))
+
+    def auth(self, user):
+        return {"Authorization": f"Bearer {RefreshToken.for_user(user).access_token}"}
+
+    def test_token_is_staff_only(self):
+        self.assertEqual(self.client.post("/api/internal/profile-token/", headers=self.auth(self.user)).status_code, 403)
+        response = self.client.post("/api/internal/profile-token/", headers=self.auth(self.staff))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["header"], "X-Profile-Token")
+
+    def test_profiled_request_saves_sql_trace_and_plan(self):
+        token = issue_token(self.staff)
+        plain = self.client.get("/api/partners/", headers=self.auth(self.user))
+        forged = self.client.get("/api/partners/", {"_profile": token + "x"}, headers=self.auth(self.user))
+        response = self.client.get("/api/partners/", headers={**self.auth(self.user), "X-Profile-Token": token})
+        self.assertNotIn("X-Profile-Id", plain)
+        self.assertNotIn("X-Profile-Id", forged)
+
+        [profile] = load_profiles()
+        self.assertEqual(response["X-Profile-Id"], profile["id"])
+        # トークンは1回だけ使える
+        reused = self.client.get("/api/partners/", headers={**self.auth(self.user), "X-Profile-Token": token})
+        self.assertNotIn("X-Profile-Id", reused)
+        self.assertEqual(len(load_profiles()), 1)
+        self.assertEqual(profile["requested_by"], self.staff.pk)
+        self.assertEqual(profile["tenant"], self.tenant.pk)
+        self.assertGreaterEqual(profile["db_queries"], 2)
+        self.assertEqual(len(profile["queries"]), profile["db_queries"])
+        self.assertIn("actual time", profile["explain"][0]["plan"])
+
+        out = io.StringIO()
+        call_command("profiles", profile["id"], stdout=out)
+        self.assertIn("EXPLAIN ANALYZE", out.getvalue())
+
+    async def test_token_is_single_use_across_sync_and_async(self):
+        request = RequestFactory().get("/api/partners/", headers={"X-Profile-Token": issue_token(self.staff)})
+        self.assertEqual((await aread_token(request))["by"], self.staff.pk)
+        self.assertIsNone(await aread_token(request))
+        self.assertIsNone(read_token(request))
+
+
+class SeedDatasetTests(TestCase):
+    '''
+    seed_dataset が同じシードで同じデータを作り、テナント間の件数に偏りを付けることを確認する
+    '''
+
+    def seed(self, *args):
+        call_command("seed_dataset", "--tenants", "4", "--partners-per-tenant", "25", "--seed", "99", *args, stdout=io.StringIO())
+        return list(
+            Partner.objects.filter(tenant__email__endswith="@seed99.example.com")
+            .order_by("tenant__email", "email")
+            .values_list("tenant__email", "partner_name", "partner_name_kana", "email", "is_deleted", "created_at")
+        )
+
+    def test_same_seed_gives_same_data(self):
+        first = self.seed()
+        self.assertEqual(len(first), 100)
+        self.assertEqual(self.seed("--reset"), first)
+        self.assertEqual(User.objects.filter(email__endswith="@seed99.example.com").count(), 12)
+
+    def test_partners_are_skewed_towards_first_tenant(self):
+        self.seed()
+        counts = [
+            Partner.objects.filter(tenant__email=f"tenant{i}@seed99.example.com").count() for i in range(1, 5)
+        ]
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        self.assertGreater(counts[0], counts[-1] * 3)
+
+
+class BenchBaselineCompareTests(SimpleTestCase):
+    '''
+    bench_api の基準値比較: SQL 件数の増加は常に劣化、応答時間は許容幅を超えたときだけ劣化とする
+    '''
+
+    baseline = {"partner_list": {"p95_ms": 10.0, "queries": 2}}
+
+    def test_within_tolerance_passes(self):
+        self.assertEqual(compare(self.baseline, {"partner_list": {"p95_ms": 16.9, "queries": 2}}, 0.5, 2.0), [])
+
+    def test_extra_query_or_slowdown_fails(self):
+        regressions = compare(self.baseline, {"partner_list": {"p95_ms": 17.5, "queries": 3}}, 0.5, 2.0)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn("queries/call 2 -> 3", regressions[0])
+
+
+class TrafficCaptureTests(TestCase):
+    '''
+    トラフィック記録: ルートとパラメータの形だけを残し、検索語・ID・未知のパラメータは残さない
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(tenant_name="テナント", representative_name="代表者", email="t@example.com")
+        cls.user = User.objects.create_user(email="traffic@example.com", password="pw-12345678", tenant=cls.tenant)
+        cls.partner = Partner.objects.create(tenant=cls.tenant, partner_name="取引先", email="p@example.com")
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f"{directory.name}/traffic.jsonl"
+        self.enterContext(override_settings(TRAFFIC_CAPTURE=True, TRAFFIC_CAPTURE_FILE=self.path))
+        self.addCleanup(self.remove_handler)
+
+    def remove_handler(self):
+        handler = traffic._handlers.pop(self.path, None)
+        if handler is not None:
+            traffic.logger.removeHandler(handler)
+            handler.close()
+
+    def test_request_shape_is_recorded_anonymized(self):
+        headers = {"Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+        self.client.get(
+            "/api/partners/", {"q": "山田商事", "ordering": "-updated_at", "secret": "x"}, headers=headers
+        )
+        self.client.get(f"/api/partners/{self.partner.pk}/", headers=headers)
+
+        with open(self.path, encoding="utf-8") as f:
+            listed, detail = [json.loads(line) for line in f]
+        self.assertEqual(listed["route"], "api/partners/")
+        self.assertEqual(listed["params"], {"q": {"kind": "kanji", "len": 4}, "ordering": "-updated_at"})
+        self.assertEqual(listed["tenant_size"], "xs")
+        self.assertEqual(detail["path"], "/api/partners/{pk}/")
+        self.assertEqual(detail["route"], "api/partners/(?P<pk>[^/.]+)/")
+        self.assertEqual(
+            set(listed), {"ts", "method", "route", "path", "params", "tenant_size", "status", "duration_ms"}
+        )
+
+    def test_replay_without_replayable_requests(self):
+        # 詳細ルートだけの記録を、取引先のないテナントで再生しようとした場合は CommandError
+        self.client.get(f"/api/partners/{self.partner.pk}/", headers={
+            "Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}",
+        })
+        Partner.objects.all().delete()
+        with self.assertRaisesMessage(CommandError, "再生できるリクエストがありません"):
+            call_command("replay_traffic", self.path, speed=0, stdout=io.StringIO())
+
+
+# KEN_ALL.CSV の形式（全国地方公共団体コード, 旧郵便番号, 郵便番号, カナ × 3, 都道府県, 市区町村, 町域, フラグ × 6）
+KEN_ALL_ROWS = [
+    ("1000001", "東京都", "千代田区", "千代田"),
+    ("1000000", "東京都", "千代田区", "以下に掲載がない場合"),
+    ("0600042", "北海道", "札幌市中央区", "大通西（１～１９丁目）"),
+    ("2310023", "神奈川県", "横浜市中区", "山下町"),
+    ("9960301", "山形県", "最上郡大蔵村", "南山（１９３０～１９４３、２０４７～２０４９、"),
+    ("9960301", "山形県", "最上郡大蔵村", "２０５１～２０５５）"),
+    ("9960301", "山形県", "最上郡大蔵村", "肘折"),
+]
+
+
+class PostalIndexTests(TestCase):
+    '''
+    KEN_ALL.CSV から作った索引で、郵便番号から住所を引き、CSV取込で郵便番号・住所を正規化・確認できることを確認する
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp = tempfile.TemporaryDirectory()
+        source = os.path.join(cls.tmp.name, "KEN_ALL.CSV")
+        with open(source, "w", encoding="cp932", newline="") as f:
+            for code, state, city, town in KEN_ALL_ROWS:
+                f.write(f'13101,"{code[:3]}  ","{code}","ｶﾅ","ｶﾅ","ｶﾅ","{state}","{city}","{town}",0,0,0,0,0,0\r\n')
+        cls.index_path = os.path.join(cls.tmp.name, "postal.idx")
+        call_command("build_postal_index", source, output=cls.index_path, stdout=io.StringIO())
+        cls.settings_override = override_settings(POSTAL_INDEX_PATH=cls.index_path)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        postal.reset_postal_index()
+        cls.tmp.cleanup()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(tenant_name="テナント", representative_name="代表者", email="t@example.com")
+        cls.user = User.objects.create_user(email="postal@example.com", password="pw-12345678", tenant=cls.tenant)
+
+    def setUp(self):
+        postal.reset_postal_index()
+        self.headers = {"Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    def test_lookup_cleans_towns_and_joins_split_rows(self):
+        index = postal.get_postal_index()
+        self.assertEqual(len(index), 6)
+        self.assertEqual([a.town for a in index.lookup("１００－０００１")], ["千代田"])
+        self.assertEqual([a.town for a in index.lookup("100-0000")], [""])
+        self.assertEqual([a.town for a in index.lookup("0600042")], ["大通西"])
+        self.assertEqual(sorted(a.town for a in index.lookup("9960301")), ["南山", "肘折"])
+        self.assertEqual(index.lookup("9999999"), [])
+
+    def test_api(self):
+        ok = self.client.get("/api/postal/231-0023/", headers=self.headers)
+        missing = self.client.get("/api/postal/2310024/", headers=self.headers)
+        invalid = self.client.get("/api/postal/231/", headers=self.headers)
+        self.assertEqual(ok.json(), {"postal_code": "231-0023", "results": [{"state": "神奈川県", "city": "横浜市中区", "town": "山下町"}]})
+        self.assertEqual((missing.status_code, invalid.status_code), (404, 400))
+
+    def test_csv_import_normalizes_and_validates_addresses(self):
+        body = ",".join(CSV_HEADERS) + "\n"
+        body += "補完,,顧客,,,a@example.com,２３１００２３,,,山下町1,,\n"
+        body += "一致,,顧客,,,b@example.com,231-0023,神奈川県,横浜市,,,\n"
+        file = SimpleUploadedFile("partners.csv", body.encode("utf-8"), content_type="text/csv")
+        response = self.client.post("/api/partners/import/", {"file": file}, headers=self.headers)
+        self.assertEqual(response.json(), {"count": 2})
+        partner = Partner.objects.get(email="a@example.com")
+        self.assertEqual((partner.postal_code, partner.state, partner.city), ("231-0023", "神奈川県", "横浜市中区"))
+
+        body = ",".join(CSV_HEADERS) + "\n"
+        body += "不一致,,顧客,,,c@example.com,231-0023,東京都,,,,\n"
+        body += "形式不正,,顧客,,,d@example.com,231-002,,,,,\n"
+        file = SimpleUploadedFile("partners.csv", body.encode("utf-8"), content_type="text/csv")
+        response = self.client.post("/api/partners/import/", {"file": file}, headers=self.headers)
+        errors = response.content.decode("utf-8-sig")
+        self.assertIn("都道府県が郵便番号の住所（神奈川県）と一致しません", errors)
+        self.assertIn("郵便番号は7桁で指定してください", errors)
+
+    def test_csv_import_accepts_codes_missing_from_index(self):
+        # KEN_ALL に載らない郵便番号（事業所の個別番号など）はエラーにせず、形だけそろえて取り込む
+        body = ",".join(CSV_HEADERS) + "\n" + "事業所,,顧客,,,e@example.com,９９９９９９９,東京都,千代田区,,,\n"
+        file = SimpleUploadedFile("partners.csv", body.encode("utf-8"), content_type="text/csv")
+        response = self.client.post("/api/partners/import/", {"file": file}, headers=self.headers)
+        self.assertEqual(response.json(), {"count": 1})
+        partner = Partner.objects.get(email="e@example.com")
+        self.assertEqual((partner.postal_code, partner.state, partner.city), ("999-9999", "東京都", "千代田区"))
+
+    def test_corrupt_index_is_treated_as_unavailable(self):
+        for content in (b"", b"PSTL", postal.HEADER.pack(postal.MAGIC, postal.VERSION, postal.BYTE_ORDER_MARK, 1000)):
+            path = os.path.join(self.tmp.name, "broken.idx")
+            with open(path, "wb") as f:
+                f.write(content)
+            postal.reset_postal_index()
+            with self.subTest(content=content), override_settings(POSTAL_INDEX_PATH=path):
+                with self.assertLogs("api.postal", "WARNING"):
+                    self.assertIsNone(postal.get_postal_index())
+                # 確認間隔が過ぎても、作り直されるまでは開き直さない（警告も繰り返さない）
+                postal._checked_at = 0.0
+                with self.assertNoLogs("api.postal", "WARNING"):
+                    self.assertIsNone(postal.get_postal_index())
+
+                response = self.client.get("/api/postal/231-0023/", headers=self.headers)
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(postal.apply_postal_lookup({"postal_code": "231-002"}), [])
+
+
+@override_settings(CHANGE_FEED_BACKEND="api.changefeed.LocalBackend", CHANGE_FEED_QUEUE_SIZE=2)
+class ChangeFeedTests(TestCase):
+    '''
+    変更イベントがコミット後にだけ同じテナントの購読者へ届き、取りこぼした購読者には reset を送ることを確認する
+    （プロセス内の LocalBackend を使う）
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(tenant_name="テナント", representative_name="代表者", email="t@example.com")
+        cls.other = Tenant.objects.create(tenant_name="他テナント", representative_name="代表者", email="o@example.com")
+        cls.user = User.objects.create_user(email="feed@example.com", password="pw-12345678", tenant=cls.tenant)
+
+    def setUp(self):
+        changefeed._broker = None
+        self.addCleanup(setattr, changefeed, "_broker", None)
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def subscribe(self, tenant_id):
+        async def subscribe():
+            return changefeed.get_broker().subscribe(tenant_id)
+        return self.loop.run_until_complete(subscribe())
+
+    def received(self, subscription) -> list:
+        async def drain():
+            events = []
+            while (event := await subscription.get(timeout=0.01)) is not None:
+                events.append(event)
+            return events
+        return self.loop.run_until_complete(drain())
+
+    def test_published_only_on_commit(self):
+        subscription = self.subscribe(self.tenant.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            changefeed.publish_change(tenant_id=self.tenant.pk, model="partner", op="update", pk=1)
+        self.assertEqual(self.received(subscription), [])  # コミット前は届かない
+        for callback in callbacks:
+            callback()
+        self.assertEqual([e.id for e in self.received(subscription)], [1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    changefeed.publish_change(tenant_id=self.tenant.pk, model="partner", op="update", pk=2)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(self.received(subscription), [])
+
+    def test_subscribers_isolated_per_tenant(self):
+        mine, others = self.subscribe(self.tenant.pk), self.subscribe(self.other.pk)
+        changefeed.get_broker().publish(changefeed.ChangeEvent(tenant_id=self.tenant.pk, model="partner", op="create", id=1))
+        self.assertEqual(len(self.received(mine)), 1)
+        self.assertEqual(self.received(others), [])
+
+        mine.close()
+        changefeed.get_broker().publish(changefeed.ChangeEvent(tenant_id=self.tenant.pk, model="partner", op="create", id=2))
+        self.assertEqual(self.received(mine), [])
+
+    def test_stream_requires_token(self):
+        response = self.client.get("/api/changes/")
+        self.assertEqual(response.status_code, 401)
+
+    async def test_slow_subscriber_gets_reset(self):
+        # async のテストはテストと同じスレッド（同じDB接続）で非同期 ORM が動く
+        token = RefreshToken.for_user(self.user).access_token
+        request = AsyncRequestFactory().get("/api/changes/", headers={"Authorization": f"Bearer {token}"})
+        response = await change_stream(request)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+        stream = aiter(response.streaming_content)
+        chunks = [await anext(stream)]
+        broker = changefeed.get_broker()
+        for pk in range(3):  # キュー（2件）を溢れさせる
+            broker.publish(changefeed.ChangeEvent(tenant_id=self.tenant.pk, model="partner", op="update", id=pk))
+        chunks += [await anext(stream) for _ in range(3)]
+        await stream.aclose()
+
+        self.assertEqual(
+            [c.decode() for c in chunks],
+            [
+                "retry: 3000\n\n",
+                "event: reset\ndata: {}\n\n",
+                'event: change\ndata: {"model":"partner","op":"update","id":0}\n\n',
+                'event: change\ndata: {"model":"partner","op":"update","id":1}\n\n',
+            ],
+        )
+
+
+class InternalEndpointAccessTests(TestCase):
+    '''
+    内部向けエンドポイント（接続プール統計）が、スタッフ・共有トークン・明示的に信用した送信元IPにだけ応答することを確認する
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(tenant_name="テナント", representative_name="代表者", email="t@example.com")
+        cls.staff = User.objects.create_user(email="staff@example.com", password="pw-12345678", tenant=cls.tenant, is_staff=True)
+        cls.member = User.objects.create_user(email="member@example.com", password="pw-12345678", tenant=cls.tenant)
+
+    def get(self, user=None, **headers):
+        if user is not None:
+            headers["Authorization"] = f"Bearer {RefreshToken.for_user(user).access_token}"
+        return self.client.get("/api/internal/db-pool/", headers=headers)
+
+    def test_staff_only_by_default(self):
+        # テストクライアントの送信元は 127.0.0.1（同じホストのリバースプロキシ経由と同じ）
+        self.assertIn(self.get().status_code, (401, 403))
+        self.assertEqual(self.get(self.member).status_code, 403)
+        response = self.get(self.staff)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(response.json()["default"]["mode"], ("pool", "persistent"))
+
+    @override_settings(INTERNAL_API_TOKEN="secret")
+    def test_shared_token(self):
+        self.assertEqual(self.get(**{"X-Internal-Token": "secret"}).status_code, 200)
+        self.assertIn(self.get(**{"X-Internal-Token": "wrong"}).status_code, (401, 403))
+
+    @override_settings(INTERNAL_IPS=["127.0.0.1"])
+    def test_trusted_ips_are_opt_in(self):
+        self.assertEqual(self.get().status_code, 200)
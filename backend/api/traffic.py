@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import json
+import logging
+import random
+import time
+import unicodedata
+from logging.handlers import RotatingFileHandler
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+
+from partners.models import Partner
+from .metrics import route_label
+
+# 本番トラフィックの記録（manage.py replay_traffic で再生する）
+# - TRAFFIC_CAPTURE=1 のときだけ有効（無効時はミドルウェア自体が外れる）
+# - 記録するのは「リクエストの形」だけ: ルート、並び順・区分・ページ番号などのパラメータ、テナント規模の区分、処理時間
+# - 検索語は文字種と文字数だけを残し、テナントID・ユーザー・IP・パスの値（pk）は残さない
+
+logger = logging.getLogger("api.traffic")
+
+# 値をそのまま残すパラメータ（利用者の入力値を含まないもの）
+SHAPE_PARAMS = {"ordering", "partner_type", "page", "page_size", "include_deleted", "limit", "facets", "state"}
+# 値は文字種と文字数だけを残すパラメータ（検索語）
+TEXT_PARAMS = {"q", "prefix"}
+
+# テナント規模（取引先件数）の区分
+SIZE_BUCKETS = [(100, "xs"), (1_000, "s"), (10_000, "m"), (100_000, "l")]
+LARGEST_BUCKET = "xl"
+
+
+def size_bucket(n: int) -> str:
+    for limit, name in SIZE_BUCKETS:
+        if n < limit:
+            return name
+    return LARGEST_BUCKET
+
+
+def text_kind(value: str) -> str:
+    '''
+    文字種（kana / kanji / digits / ascii / mixed）
+    '''
+    kinds = set()
+    for ch in value:
+        if ch.isdigit() or ch == "-":
+            kinds.add("digits")
+        elif ch.isascii():
+            kinds.add("ascii")
+        elif "KATAKANA" in unicodedata.name(ch, "") or "HIRAGANA" in unicodedata.name(ch, ""):
+            kinds.add("kana")
+        else:
+            kinds.add("kanji")
+    return kinds.pop() if len(kinds) == 1 else "mixed"
+
+
+def anonymize_params(params) -> dict:
+    '''
+    クエリパラメータを記録用に変換する（対象外のパラメータは捨てる）
+    '''
+    shaped = {}
+    for key in params:
+        value = params.get(key) or ""
+        if key in SHAPE_PARAMS:
+            shaped[key] = value
+        elif key in TEXT_PARAMS and value.strip():
+            value = value.strip()
+            shaped[key] = {"kind": text_kind(value), "len": len(value)}
+    return shaped
+
+
+def tenant_size_bucket(tenant) -> str | None:
+    '''
+    テナントの取引先件数の区分（件数は1時間キャッシュする）
+    '''
+    if tenant is None:
+        return None
+    key = f"traffic:tenant_size:{tenant.pk}"
+    n = cache.get(key)
+    if n is None:
+        n = Partner.objects.filter(tenant_id=tenant.pk).count()
+        cache.set(key, n, timeout=3600)
+    return size_bucket(n)
+
+
+def route_path(request, match) -> str:
+    '''
+    パスの値（pk など）を {名前} に置き換えたパス（例: /api/partners/{pk}/）
+    '''
+    path = request.path
+    for name, value in match.kwargs.items():
+        path = path.replace(f"/{value}/", f"/{{{name}}}/", 1)
+    return path
+
+
+_handlers: dict[str, RotatingFileHandler] = {}
+
+
+def _install_handler() -> None:
+    '''
+    記録先（ローテーションするファイル）を api.traffic ロガーに付ける（ファイルごとに1回だけ）
+    '''
+    path = str(settings.TRAFFIC_CAPTURE_FILE)
+    if path in _handlers:
+        return
+    handler = RotatingFileHandler(
+        path,
+        maxBytes=settings.TRAFFIC_CAPTURE_MAX_BYTES,
+        backupCount=settings.TRAFFIC_CAPTURE_BACKUPS,
+        encoding="utf-8",
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _handlers[path] = handler
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class TrafficCaptureMiddleware:
+    '''
+    リクエストの形と処理時間を1行1JSONで記録する
+    - 処理時間を他のミドルウェアも含めて測るため、MIDDLEWARE の先頭に置く
+    - TRAFFIC_CAPTURE_SAMPLE（0〜1）で記録する割合を絞れる
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.TRAFFIC_CAPTURE:
+            raise MiddlewareNotUsed
+        _install_handler()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        ts, started = time.time(), time.perf_counter()
+        response = self.get_response(request)
+        if self.sampled(request):
+            self.record(request, response, ts, (time.perf_counter() - started) * 1000)
+        return response
+
+    async def __acall__(self, request):
+        ts, started = time.time(), time.perf_counter()
+        response = await self.get_response(request)
+        if self.sampled(request):
+            await sync_to_async(self.record)(request, response, ts, (time.perf_counter() - started) * 1000)
+        return response
+
+    def sampled(self, request) -> bool:
+        if getattr(request, "resolver_match", None) is None:
+            return False
+        return random.random() < settings.TRAFFIC_CAPTURE_SAMPLE
+
+    def record(self, request, response, ts: float, duration_ms: float) -> None:
+        match = request.resolver_match
+        logger.info(
+            json.dumps(
+                {
+                    "ts": round(ts, 3),
+                    "method": request.method,
+                    "route": route_label(match),
+                    "path": route_path(request, match),
+                    "params": anonymize_params(request.GET),
+                    "tenant_size": tenant_size_bucket(getattr(request, "tenant", None)),
+                    "status": response.status_code,
+                    "duration_ms": round(duration_ms, 2),
+                },
+                ensure_ascii=False,
+            )
+        )
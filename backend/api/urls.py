@@ -1,6 +1,6 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView
-from .views import health, me, EmailTokenObtainPairView
+from .views import health, me, EmailTokenObtainPairView, change_stream, db_pool_stats, metrics, profile_token, postal_lookup
 
 urlpatterns = [
     path("health/", health),
@@ -11,4 +11,19 @@ urlpatterns = [
 
     # 認証確認用
     path("me/", me),
+
+    # 郵便番号から住所を引く
+    path("postal/<str:code>/", postal_lookup),
+
+    # 変更フィード（SSE）
+    path("changes/", change_stream),
+
+    # 内部向け: DB接続プールの統計
+    path("internal/db-pool/", db_pool_stats),
+
+    # 内部向け: Prometheus メトリクス
+    path("metrics/", metrics),
+
+    # 内部向け: リクエストプロファイル用トークンの発行
+    path("internal/profile-token/", profile_token),
 ]
\ No newline at end of file
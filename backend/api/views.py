@@ -1,9 +1,19 @@
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.views import APIView
 from rest_framework import status
+from .authentication import CachedJWTAuthentication
+from .changefeed import get_broker
+from .db_pool import connection_stats
+from .metrics import render_latest
+from .permissions import IsInternalRequest
+from .postal import format_postal_code, get_postal_index, normalize_postal_code
+from .profiling import TOKEN_HEADER, issue_token
 from .serializers import EmailTokenObtainSerializer
 
 @api_view(["GET"])
@@ -23,11 +33,73 @@ def me(request):
         }
     )
 
+
+@api_view(["GET"])
+@permission_classes([IsInternalRequest])
+def db_pool_stats(request):
+    """
+    DB接続（プール）の利用状況を返す（内部向け）
+    - 値は応答したワーカープロセスのもの
+    """
+    return Response({alias: connection_stats(alias) for alias in settings.DATABASES})
+
+
+@api_view(["GET"])
+@permission_classes([IsInternalRequest])
+def metrics(request):
+    """
+    Prometheus 形式のメトリクス（内部向け）
+    - リクエスト数・処理時間・SQL件数（ルート別）、CSV取込/出力の件数と処理速度
+    """
+    body, content_type = render_latest()
+    return HttpResponse(body, content_type=content_type)
+
+@api_view(["POST"])
+@permission_classes([IsAdminUser])
+def profile_token(request):
+    """
+    1リクエストをプロファイルするためのトークンを発行する（スタッフのみ）
+    - 返したトークンを X-Profile-Token ヘッダー（またはクエリ _profile=）に付けたリクエストが計測される（1回だけ）
+    """
+    return Response(
+        {
+            "token": issue_token(request.user),
+            "header": TOKEN_HEADER,
+            "expires_in": settings.PROFILE_TOKEN_SECONDS,
+        }
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def postal_lookup(request, code):
+    """
+    郵便番号から住所（都道府県・市区町村・町域）を引く
+    - 1つの郵便番号に複数の町域がある場合はすべて返す
+    - 索引（build_postal_index）が未作成なら 503
+    """
+    index = get_postal_index()
+    if index is None:
+        return Response({"detail": "郵便番号データが準備されていません"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    digits = normalize_postal_code(code)
+    if digits is None:
+        return Response({"detail": "郵便番号は7桁で指定してください"}, status=status.HTTP_400_BAD_REQUEST)
+    results = index.lookup(digits)
+    if not results:
+        return Response({"detail": "該当する住所がありません"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(
+        {
+            "postal_code": format_postal_code(digits),
+            "results": [{"state": r.state, "city": r.city, "town": r.town} for r in results],
+        }
+    )
+
 class EmailTokenObtainPairView(APIView):
     permission_classes = []
 
     def post(self, request):
-        serializer = EmailTokenObtainSerializer(data=request.data)
+        serializer = EmailTokenObtainSerializer(data=request.data, context={"request": request})
         serializer.is_valid(raise_exception=True)
 
         user = serializer.validated_data["user"]
@@ -39,4 +111,42 @@ class EmailTokenObtainPairView(APIView):
                 "access": str(refresh.access_token),
             },
             status=status.HTTP_200_OK,
-        )
\ No newline at end of file
+        )
+
+
+async def change_stream(request):
+    """
+    変更フィード（Server-Sent Events）
+    - ログインユーザーのテナントに属する変更だけを配信する
+    - ASGI での配信を前提とする（WSGI ではストリームを保持できない）
+    """
+    try:
+        result = await CachedJWTAuthentication().aauthenticate(request)
+    except AuthenticationFailed as e:
+        return JsonResponse({"detail": e.detail}, status=401)
+    if result is None:
+        return JsonResponse({"detail": "認証情報が含まれていません。"}, status=401)
+
+    user, _ = result
+    subscription = get_broker().subscribe(user.tenant_id)
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                event = await subscription.get(timeout=settings.CHANGE_FEED_HEARTBEAT_SECONDS)
+                if subscription.overflowed:
+                    # 取りこぼしが発生したので全件再取得を促す
+                    subscription.overflowed = False
+                    yield "event: reset\ndata: {}\n\n"
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: change\ndata: {event.to_json()}\n\n"
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
+# 本番は ASGI サーバー（uvicorn）で配信する
+#   uvicorn config.asgi:application --host 0.0.0.0 --port 8000 --workers 4
+# - 変更フィード（/api/changes/ の SSE）は接続中ずっとストリームを保持する
+#   ASGI ではイベントループ上で待つだけなので、開いているタブの数だけワーカースレッドを占有しない
+#   （runserver / gunicorn などの WSGI では1ストリームにつき1スレッドを占有し続ける）
+# - リバースプロキシではバッファリングを無効にする（応答に X-Accel-Buffering: no を付けている）
+
+# ASGI ではリクエストごとに別スレッドで ORM が動くため、永続接続は再利用されず接続が溜まる
+# 既定では永続接続を無効にする（接続を使い回す場合は DB_POOL=1 でプールを使う）
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
+
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -37,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'api',
     'accounts',
@@ -45,6 +47,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.traffic.TrafficCaptureMiddleware',
+    'api.perf.ServerTimingMiddleware',
+    'api.metrics.MetricsMiddleware',
+    'api.profiling.ProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +58,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -88,6 +95,52 @@ DATABASES = {
     }
 }
 
+# リードレプリカ（POSTGRES_REPLICA_HOST / POSTGRES_REPLICA_DB のどちらかを設定した場合のみ有効）
+# 未指定の項目はプライマリと同じ値を使う（同一サーバー上の別DBをレプリカ代わりにして検証できる）
+if os.environ.get('POSTGRES_REPLICA_HOST') or os.environ.get('POSTGRES_REPLICA_DB'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('POSTGRES_REPLICA_DB', DATABASES['default']['NAME']),
+        'USER': os.environ.get('POSTGRES_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get('POSTGRES_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.environ.get('POSTGRES_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.environ.get('POSTGRES_REPLICA_PORT', DATABASES['default']['PORT']),
+        # テストではプライマリのテストDBをそのまま使う
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# 接続管理（プライマリ / レプリカ共通）
+# - DB_POOL=1: psycopg 3 のコネクションプール（OPTIONS["pool"]）。ワーカープロセスごとにプールを持つ
+# - それ以外: 永続接続（DB_CONN_MAX_AGE 秒再利用）
+# - どちらも再利用前に接続の生存確認を行う（CONN_HEALTH_CHECKS / プールの check）
+# - プール使用時は CONN_MAX_AGE を 0 にする必要がある（Django の制約）
+DB_POOL = os.environ.get('DB_POOL', '').lower() in ('1', 'true', 'yes')
+
+for _db in DATABASES.values():
+    _db['CONN_HEALTH_CHECKS'] = True
+    if DB_POOL:
+        _db['CONN_MAX_AGE'] = 0
+        _db['OPTIONS'] = {
+            **_db.get('OPTIONS', {}),
+            'pool': {
+                'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+                # 空き接続を待つ最大秒数（超えると PoolTimeout）
+                'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+                # 使われていない接続を閉じるまでの秒数（min_size までは残す）
+                'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+            },
+        }
+    else:
+        _db['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+
+DATABASE_REPLICA_ALIAS = 'replica' if 'replica' in DATABASES else None
+DATABASE_ROUTERS = ['api.db_router.PrimaryReplicaRouter']
+
+# 書き込み後、読み取りをプライマリに固定する時間（秒）と Cookie 名
+DATABASE_PIN_SECONDS = int(os.environ.get('DATABASE_PIN_SECONDS', 5))
+DATABASE_PIN_COOKIE = 'db_pin'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -108,6 +161,11 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# パスワードハッシュ計算の同時実行数 / 待ち時間の上限（秒）
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 2))
+PASSWORD_HASH_TIMEOUT_SECONDS = 10
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -138,14 +196,133 @@ REST_FRAMEWORK = {
         "rest_framework.parsers.JSONParser",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "api.authentication.CachedJWTAuthentication",
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 20,
 }
 
+# キャッシュ
+# - 既定はプロセス内メモリ。複数ワーカー間で共有する場合は CACHES を差し替える
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
 # ログインユーザーモデルの指定
 AUTH_USER_MODEL = "accounts.User"
 
+# 認証バックエンド（メールアドレスの大文字小文字を区別せず、ハッシュ計算の同時実行数を制限する）
+AUTHENTICATION_BACKENDS = ["accounts.backends.EmailBackend"]
+
+# 認証時のユーザー + テナント解決結果のキャッシュ秒数
+# - 変更時はシグナルで破棄するが、プロセス内キャッシュの場合は他ワーカーへは伝わらないため短めにする
+AUTH_USER_CACHE_SECONDS = 30
+
 # 最大ダウンロード件数
-MAX_EXPORT_ROWS = 1000
\ No newline at end of file
+MAX_EXPORT_ROWS = 1000
+
+# 論理削除された行をアーカイブへ移動するまでの保持日数（archive_deleted コマンド）
+ARCHIVE_RETENTION_DAYS = 365
+
+# テナント単位の宣言的パーティショニング（PostgreSQL）
+# - method: "hash"（tenant_id のハッシュで partitions 個に分散） / "list"（テナントごとに1パーティション）
+# - 有効にした状態で migrate するとテーブルを変換する（適用済みの環境では partition_table コマンドを使う）
+PARTITIONED_MODELS = {
+    "partners.Partner": {
+        "method": os.environ.get("PARTNER_PARTITION_METHOD", ""),
+        "partitions": int(os.environ.get("PARTNER_PARTITIONS", "8")),
+    },
+}
+
+# テナント用の list パーティション作成時のロック待ち上限（ミリ秒）と、やり直し回数
+# - 作成中は取引先テーブル全体が排他ロックされるため、長く待たずに打ち切ってやり直す
+PARTITION_LOCK_TIMEOUT_MS = int(os.environ.get("PARTITION_LOCK_TIMEOUT_MS", "2000"))
+PARTITION_CREATE_RETRIES = int(os.environ.get("PARTITION_CREATE_RETRIES", "3"))
+
+# 取引先サジェスト（件数 / 最大件数 / メモキャッシュ秒数）
+PARTNER_SUGGEST_LIMIT = 10
+PARTNER_SUGGEST_MAX_LIMIT = 50
+PARTNER_SUGGEST_CACHE_SECONDS = 30
+
+# 取引先一覧の facet 件数（facets=partner_type,state）のキャッシュ秒数
+# - 書き込み時にテナントのキャッシュ世代が上がるため、古い件数は次の書き込みまでしか残らない
+PARTNER_FACETS_CACHE_SECONDS = int(os.environ.get('PARTNER_FACETS_CACHE_SECONDS', 300))
+
+# 取引先の一括登録（POST /api/partners/bulk/）で1リクエストに指定できる最大件数
+PARTNER_BULK_MAX_ITEMS = int(os.environ.get('PARTNER_BULK_MAX_ITEMS', 1000))
+
+# 取引先の重複候補（/api/partners/duplicates/）のキャッシュ秒数
+# - 書き込み時にテナントのキャッシュ世代が上がるため、取引先が変われば次回は数え直す
+PARTNER_DUPLICATES_CACHE_SECONDS = int(os.environ.get('PARTNER_DUPLICATES_CACHE_SECONDS', 600))
+# 未削除の取引先がこの件数を超えるテナントは、リクエスト内では比較せずバックグラウンドで比較する（比較中は 202 を返す）
+PARTNER_DUPLICATES_INLINE_MAX = int(os.environ.get('PARTNER_DUPLICATES_INLINE_MAX', 5000))
+# バックグラウンドでの比較の多重起動を防ぐロックの有効秒数（比較が異常終了した場合はこの秒数後に再実行できる）
+PARTNER_DUPLICATES_BUILD_TIMEOUT_SECONDS = 600
+
+# 郵便番号 → 住所の索引ファイル（build_postal_index コマンドで KEN_ALL.CSV から作る）
+# - ファイルがない・壊れている場合は /api/postal/<code>/ は 503 を返し、CSV取込での住所確認は行わない
+POSTAL_INDEX_PATH = os.environ.get('POSTAL_INDEX_PATH', str(BASE_DIR / 'data' / 'postal.idx'))
+
+# 変更フィード（SSE）のプロセス間中継バックエンド
+# - api.changefeed.PostgresNotifyBackend: PostgreSQL LISTEN/NOTIFY（複数ワーカー向け）
+# - api.changefeed.LocalBackend: 単一プロセス用（テスト・runserver）
+CHANGE_FEED_BACKEND = os.environ.get("CHANGE_FEED_BACKEND", "api.changefeed.PostgresNotifyBackend")
+CHANGE_FEED_HEARTBEAT_SECONDS = 15
+CHANGE_FEED_QUEUE_SIZE = 1000
+
+# 内部向けエンドポイント（接続プール統計、/api/metrics/ など）へのアクセス（api.permissions.IsInternalRequest）
+# - スタッフユーザーは常にアクセスできる
+# - INTERNAL_API_TOKEN: 設定すると X-Internal-Token ヘッダーにこの値を付けたリクエストもアクセスできる（監視用）
+# - INTERNAL_IPS: 設定した送信元IPからは認証なしでアクセスできる（既定は空）
+#   リバースプロキシ経由では送信元が 127.0.0.1 などになるため、プロキシを通らない経路がある場合だけ設定する
+INTERNAL_API_TOKEN = os.environ.get("INTERNAL_API_TOKEN", "")
+INTERNAL_IPS = [ip.strip() for ip in os.environ.get("INTERNAL_IPS", "").split(",") if ip.strip()]
+
+# リクエスト単位の性能計測（api.perf.ServerTimingMiddleware）
+# - PERF_SERVER_TIMING_HEADER: Server-Timing ヘッダーを付ける相手
+#     "staff"（既定）: スタッフユーザーのリクエストだけ / "1": すべて / "0": 付けない
+#   （SQL 件数や処理時間の内訳は内部の情報のため、一般の利用者には返さない）
+# - PERF_LOG_MIN_MS: この時間（ミリ秒）以上かかったリクエストだけ api.perf ロガーへ出力する
+#   （0 にすると全リクエストを出力する。常時の全件出力はログ量が多いため、既定は遅いリクエストだけ）
+PERF_SERVER_TIMING_HEADER = {"1": True, "0": False}.get(
+    os.environ.get("PERF_SERVER_TIMING_HEADER", "staff"), "staff"
+)
+PERF_LOG_MIN_MS = float(os.environ.get("PERF_LOG_MIN_MS", "200"))
+
+# リクエスト単位のプロファイラ（api.profiling.ProfilerMiddleware）
+# - PROFILE_DIR: プロファイル（.prof / .json）の保存先
+# - PROFILE_TOKEN_SECONDS: スタッフが発行するプロファイル用トークンの有効期間
+# - PROFILE_EXPLAIN_TOP: EXPLAIN ANALYZE を取る遅い SELECT の件数
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "api-profiles"))
+PROFILE_TOKEN_SECONDS = int(os.environ.get("PROFILE_TOKEN_SECONDS", "600"))
+PROFILE_EXPLAIN_TOP = int(os.environ.get("PROFILE_EXPLAIN_TOP", "5"))
+
+# 本番トラフィックの記録（api.traffic.TrafficCaptureMiddleware / manage.py replay_traffic）
+# - TRAFFIC_CAPTURE=1 のときだけ記録する（検索語・ID などは匿名化して残す）
+# - TRAFFIC_CAPTURE_FILE は TRAFFIC_CAPTURE_MAX_BYTES ごとにローテーションし、TRAFFIC_CAPTURE_BACKUPS 世代残す
+# - TRAFFIC_CAPTURE_SAMPLE: 記録する割合（0〜1）
+TRAFFIC_CAPTURE = os.environ.get("TRAFFIC_CAPTURE", "0") == "1"
+TRAFFIC_CAPTURE_FILE = os.environ.get("TRAFFIC_CAPTURE_FILE", os.path.join(tempfile.gettempdir(), "api-traffic.jsonl"))
+TRAFFIC_CAPTURE_MAX_BYTES = int(os.environ.get("TRAFFIC_CAPTURE_MAX_BYTES", str(50 * 1024 * 1024)))
+TRAFFIC_CAPTURE_BACKUPS = int(os.environ.get("TRAFFIC_CAPTURE_BACKUPS", "5"))
+TRAFFIC_CAPTURE_SAMPLE = float(os.environ.get("TRAFFIC_CAPTURE_SAMPLE", "1"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "perf": {"format": "%(asctime)s %(name)s %(message)s"},
+    },
+    "handlers": {
+        "perf_console": {"class": "logging.StreamHandler", "formatter": "perf"},
+    },
+    "loggers": {
+        "api.perf": {
+            "handlers": ["perf_console"],
+            "level": os.environ.get("PERF_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+    },
+}
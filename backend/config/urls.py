@@ -28,4 +28,9 @@ urlpatterns = [
     # マスタ系
     path("api/tenants/", include("tenants.urls")), # テナントマスタ
     path("api/partners/", include("partners.urls")), # 取引先マスタ
+
+    # 読み取り系の非同期版（ASGI で起動した場合に使う）
+    path("api/async/", include("api.async_urls")),
+    path("api/async/tenants/", include("tenants.async_urls")),
+    path("api/async/partners/", include("partners.async_urls")),
 ]
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from .async_views import partner_detail, partner_export, partner_list
+
+urlpatterns = [
+    path("", partner_list),
+    path("export/", partner_export),
+    path("<int:pk>/", partner_detail),
+]
@@ -0,0 +1,93 @@
+import csv
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404
+
+from api.async_views import apaginate, async_api_view, get_ordering, json_response
+from api.metrics import record_export
+from .filters import parse_facets, partner_facets, partner_queryset
+from .models import PartnerArchive
+from .serializers import Serializer
+from .services.partner_csv_exporter import partner_csv_row
+from .services.partner_csv_importer import CSV_HEADERS
+from .views import PartnerViewSet
+
+
+class _Echo:
+    '''
+    csv.writer の出力をそのまま返す（ストリーミング応答用）
+    '''
+
+    def write(self, value):
+        return value
+
+
+def _serialize(request, rows):
+    # 全行が request.tenant に属するため、テナントは行ごとに引かずに使い回す
+    for obj in rows:
+        obj.tenant = request.tenant
+    return Serializer(rows, many=True).data
+
+
+@async_api_view()
+async def partner_list(request):
+    """
+    取引先一覧（PartnerViewSet.list の非同期版）
+    """
+    qs = partner_queryset(request, include_archive=True)
+    qs = qs.order_by(*get_ordering(request, PartnerViewSet.ordering_fields, PartnerViewSet.ordering))
+    data = await apaginate(request, qs, lambda rows: _serialize(request, rows))
+    fields = parse_facets(request.GET)
+    if fields:
+        data["facets"] = await sync_to_async(partner_facets)(request, fields)
+    return json_response(data)
+
+
+@async_api_view()
+async def partner_detail(request, pk):
+    """
+    取引先詳細（PartnerViewSet.retrieve の非同期版）
+    - include_deleted=1 のときは、アーカイブ済みの行も返す（PartnerViewSet.get_object と同じ）
+    """
+    try:
+        obj = await aget_object_or_404(partner_queryset(request), pk=pk)
+    except Http404:
+        obj = None
+        if request.GET.get("include_deleted") == "1":
+            obj = await PartnerArchive.objects.for_tenant(request.tenant, include_deleted=True).filter(pk=pk).afirst()
+        if obj is None:
+            raise
+    return json_response(_serialize(request, [obj])[0])
+
+
+@async_api_view()
+async def partner_export(request):
+    """
+    CSV出力（PartnerViewSet.export_csv の非同期版）
+    - aiterator で少しずつ読みながら1行ずつ送る（全件をメモリに載せない）
+    """
+    qs = partner_queryset(request, include_archive=True)[:settings.MAX_EXPORT_ROWS]
+    writer = csv.writer(_Echo())
+
+    async def rows():
+        started = time.perf_counter()
+        count = nbytes = 0
+        try:
+            line = writer.writerow(CSV_HEADERS)
+            nbytes += len(line.encode())
+            yield line
+            async for p in qs.aiterator(chunk_size=500):
+                line = writer.writerow(partner_csv_row(p))
+                count += 1
+                nbytes += len(line.encode())
+                yield line
+        finally:
+            # 途中で切断された場合も、送った分を記録する
+            record_export("partner", rows=count, nbytes=nbytes, seconds=time.perf_counter() - started)
+
+    response = StreamingHttpResponse(rows(), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = 'attachment; filename="partners.csv"'
+    return response
@@ -0,0 +1,373 @@
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Any, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Sum
+
+from api.base import digits_only
+from api.cache import tenant_cache_key
+from tenants.models import TenantStats
+
+from .models import Partner
+
+logger = logging.getLogger(__name__)
+
+# 重複の可能性がある取引先の検出
+# - 名称・カナを正規化し（NFKC・法人格・記号・大文字小文字）、比較は同じブロックに入った取引先どうしだけで行う
+#   ブロック: 正規化した名称 / カナの先頭 BLOCK_PREFIX 文字、電話番号（数字のみ）、郵便番号、Email
+#   （全組み合わせの比較は 10 万件で 50 億組になるため）
+# - 件数が MAX_BLOCK_SIZE を超えるブロック（共通の電話番号・郵便番号など）は比較しない
+# - スコア（0〜1）: 名称・カナの類似度 × 0.6 + 電話番号一致 0.2 + 郵便番号一致 0.1 + Email 一致 0.1（ドメイン一致は 0.05）
+# - しきい値以上の組を union-find でまとめ、候補グループとして返す
+
+BLOCK_PREFIX = 4
+MAX_BLOCK_SIZE = 100
+DEFAULT_THRESHOLD = 0.6
+# 指定できるしきい値の下限（この値で1回だけ比較してキャッシュし、指定のしきい値では絞り込むだけにする）
+MIN_THRESHOLD = 0.2
+# しきい値の刻み（グループはこの刻みごとにキャッシュする。0.61 と 0.611 で別々に集計しない）
+THRESHOLD_STEP = 0.05
+
+# 法人格（名称の前後どちらに付いていても除く）
+LEGAL_FORMS = [
+    "特定非営利活動法人", "一般社団法人", "一般財団法人", "公益社団法人", "公益財団法人",
+    "社会福祉法人", "医療法人", "学校法人", "NPO法人",
+    "株式会社", "有限会社", "合同会社", "合名会社", "合資会社",
+    "(株)", "(有)", "(同)", "(名)", "(資)", "(社)", "(財)", "(医)", "(福)", "(学)",
+]
+LEGAL_FORMS_KANA = [
+    "カブシキガイシャ", "カブシキカイシャ", "ユウゲンガイシャ", "ユウゲンカイシャ", "ゴウドウガイシャ", "ゴウドウカイシャ",
+    "(カ)", "(ユ)", "(ド)", "カ)", "(カ", "ユ)", "(ユ",
+]
+LEGAL_FORMS_LATIN = re.compile(r"\b(CO\.?,?\s*LTD\.?|INC\.?|LTD\.?|CORP\.?|CORPORATION|K\.K\.)(?=\W|$)")
+PUNCTUATION = re.compile(r"[\s・･,、.。\-‐－−'\"&＆()/]")
+
+# フリーメールのドメイン（ドメインが同じでも同じ会社とはみなさない）
+FREE_MAIL_DOMAINS = {
+    "gmail.com", "yahoo.co.jp", "ymail.ne.jp", "icloud.com", "me.com", "outlook.com", "outlook.jp",
+    "hotmail.com", "hotmail.co.jp", "live.jp", "docomo.ne.jp", "ezweb.ne.jp", "au.com",
+    "softbank.ne.jp", "i.softbank.jp", "nifty.com", "biglobe.ne.jp",
+}
+
+
+def normalize_name(value: str | None) -> str:
+    '''
+    取引先名称の正規化（例: 「株式会社ＡＢＣ」「(株)abc」「ABC Co., Ltd.」→「ABC」）
+    '''
+    s = unicodedata.normalize("NFKC", value or "").upper()
+    s = LEGAL_FORMS_LATIN.sub("", s)
+    for form in LEGAL_FORMS:
+        s = s.replace(form.upper(), "")
+    return PUNCTUATION.sub("", s)
+
+
+def normalize_kana(value: str | None) -> str:
+    '''
+    取引先名称カナの正規化（半角カナ・ひらがなを全角カタカナにそろえ、法人格を除く）
+    '''
+    s = unicodedata.normalize("NFKC", value or "").upper()
+    s = "".join(chr(ord(c) + 0x60) if "ぁ" <= c <= "ゖ" else c for c in s)
+    for form in LEGAL_FORMS_KANA:
+        s = s.replace(form, "")
+    return PUNCTUATION.sub("", s)
+
+
+@dataclass
+class PartnerKey:
+    '''
+    比較用に正規化した取引先（ref は呼び出し側で使う識別子。取引先の id や CSV の行番号など）
+    '''
+    ref: Any
+    partner_name: str
+    name: str
+    kana: str
+    tel: str
+    postal: str
+    email: str
+    domain: str
+    data: dict = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_values(cls, ref: Any, values: dict) -> "PartnerKey":
+        email = (values.get("email") or "").strip().lower()
+        tel = digits_only(values.get("tel_number"))
+        return cls(
+            ref=ref,
+            partner_name=values.get("partner_name") or "",
+            name=normalize_name(values.get("partner_name")),
+            kana=normalize_kana(values.get("partner_name_kana")),
+            tel=tel if len(tel) >= 8 else "",
+            postal=digits_only(values.get("postal_code")),
+            email=email,
+            domain=email.rpartition("@")[2],
+            data=values,
+        )
+
+    def block_keys(self) -> list[str]:
+        keys = []
+        if len(self.name) >= 2:
+            keys.append("n:" + self.name[:BLOCK_PREFIX])
+        if len(self.kana) >= 2:
+            keys.append("k:" + self.kana[:BLOCK_PREFIX])
+        if self.tel:
+            keys.append("t:" + self.tel)
+        if len(self.postal) == 7:
+            keys.append("p:" + self.postal)
+        if self.email:
+            keys.append("e:" + self.email)
+        return keys
+
+
+@lru_cache(maxsize=65536)
+def similarity(a: str, b: str) -> float:
+    '''
+    正規化した名称どうしの類似度（0〜1）
+    - 同じ名称の組は何度も出てくるため結果を覚えておく。明らかに似ていない組は ratio() を計算しない
+    '''
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    if matcher.real_quick_ratio() < 0.5 or matcher.quick_ratio() < 0.5:
+        return 0.0
+    return matcher.ratio()
+
+
+def score_pair(a: PartnerKey, b: PartnerKey) -> tuple[float, list[str]]:
+    '''
+    2件の取引先が同じ会社である可能性（0〜1）と、その理由
+    '''
+    reasons = []
+    name = max(similarity(a.name, b.name), similarity(a.kana, b.kana))
+    if name >= 0.8:
+        reasons.append("name")
+    score = 0.6 * name
+    if a.tel and a.tel == b.tel:
+        score += 0.2
+        reasons.append("tel")
+    if a.postal and a.postal == b.postal:
+        score += 0.1
+        reasons.append("postal_code")
+    if a.email and a.email == b.email:
+        score += 0.1
+        reasons.append("email")
+    elif a.domain and a.domain == b.domain and a.domain not in FREE_MAIL_DOMAINS:
+        score += 0.05
+        reasons.append("email_domain")
+    return round(score, 3), reasons
+
+
+class DuplicateIndex:
+    '''
+    ブロックごとに取引先を持ち、同じブロックの取引先とだけ比較する
+    '''
+
+    def __init__(self, keys: Iterable[PartnerKey] = ()):
+        self.keys: list[PartnerKey] = []
+        self.blocks: dict[str, list[int]] = defaultdict(list)
+        for key in keys:
+            self.add(key)
+
+    def add(self, key: PartnerKey) -> int:
+        i = len(self.keys)
+        self.keys.append(key)
+        for block in key.block_keys():
+            self.blocks[block].append(i)
+        return i
+
+    def matches(self, key: PartnerKey, *, threshold: float = DEFAULT_THRESHOLD) -> list[tuple[PartnerKey, float, list[str]]]:
+        '''
+        登録済みの取引先のうち、key と重複の可能性があるもの（スコアの高い順）
+        '''
+        seen = set()
+        found = []
+        for block in key.block_keys():
+            members = self.blocks.get(block, ())
+            if len(members) > MAX_BLOCK_SIZE:
+                continue
+            for i in members:
+                if i in seen:
+                    continue
+                seen.add(i)
+                score, reasons = score_pair(key, self.keys[i])
+                if score >= threshold:
+                    found.append((self.keys[i], score, reasons))
+        found.sort(key=lambda m: -m[1])
+        return found
+
+    def pairs(self, *, threshold: float = DEFAULT_THRESHOLD) -> list[tuple[int, int, float, list[str]]]:
+        '''
+        しきい値以上の組 (i, j, スコア, 理由)（同じ組は複数のブロックに入っていても1回だけ比較する）
+        '''
+        compared = set()
+        found = []
+        for members in self.blocks.values():
+            if len(members) < 2 or len(members) > MAX_BLOCK_SIZE:
+                continue
+            for x, i in enumerate(members):
+                for j in members[x + 1:]:
+                    if (i, j) in compared:
+                        continue
+                    compared.add((i, j))
+                    score, reasons = score_pair(self.keys[i], self.keys[j])
+                    if score >= threshold:
+                        found.append((i, j, score, reasons))
+        return found
+
+    def clusters(self, *, threshold: float = DEFAULT_THRESHOLD) -> list[dict]:
+        '''
+        重複の可能性がある取引先のグループ（cluster_pairs を参照）
+        '''
+        return cluster_pairs([key.data for key in self.keys], self.pairs(threshold=threshold), threshold=threshold)
+
+
+def cluster_pairs(members: list[dict], pairs: list[tuple[int, int, float, list[str]]], *, threshold: float) -> list[dict]:
+    '''
+    しきい値以上の組を union-find でまとめたグループ。スコアの高い順・件数の多い順
+    - members: 比較した取引先の値（pairs の i, j の添字に対応。"id" を ref として使う）
+    - pairs: DuplicateIndex.pairs() の結果（しきい値より低い組が含まれていてもよい）
+    {"score": 最大スコア, "members": [取引先の値], "pairs": [{"refs": [ref, ref], "score", "reasons"}]}
+    '''
+    pairs = [p for p in pairs if p[2] >= threshold]
+    parent = list(range(len(members)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j, _, _ in pairs:
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+
+    groups: dict[int, dict] = {}
+    for i, j, score, reasons in pairs:
+        group = groups.setdefault(find(i), {"score": 0.0, "members": set(), "pairs": []})
+        group["score"] = max(group["score"], score)
+        group["members"].update((i, j))
+        group["pairs"].append({"refs": [members[i].get("id"), members[j].get("id")], "score": score, "reasons": reasons})
+
+    result = []
+    for group in groups.values():
+        result.append({
+            "score": group["score"],
+            "members": [members[i] for i in sorted(group["members"])],
+            "pairs": sorted(group["pairs"], key=lambda p: -p["score"]),
+        })
+    result.sort(key=lambda g: (-g["score"], -len(g["members"])))
+    return result
+
+
+# 比較・表示に使う項目
+PARTNER_FIELDS = ("id", "partner_name", "partner_name_kana", "tel_number", "email", "postal_code")
+
+
+def tenant_partner_keys(tenant) -> list[PartnerKey]:
+    '''
+    テナントの未削除の取引先を比較用に読む（必要な列だけを読む）
+    '''
+    rows = Partner.objects.for_tenant(tenant).order_by("id").values(*PARTNER_FIELDS)
+    return [PartnerKey.from_values(row["id"], row) for row in rows.iterator(chunk_size=5000)]
+
+
+def normalize_threshold(value: float) -> float:
+    '''
+    しきい値を MIN_THRESHOLD〜1 の THRESHOLD_STEP 刻みに丸める
+    '''
+    value = min(max(value, MIN_THRESHOLD), 1.0)
+    return round(round(value / THRESHOLD_STEP) * THRESHOLD_STEP, 2)
+
+
+def build_duplicate_pairs(tenant) -> dict:
+    '''
+    テナント内の取引先を MIN_THRESHOLD 以上の組まで比較した結果（キャッシュする形）
+    {"members": [取引先の値], "pairs": [(i, j, スコア, 理由)]}
+    '''
+    index = DuplicateIndex(tenant_partner_keys(tenant))
+    return {"members": [key.data for key in index.keys], "pairs": index.pairs(threshold=MIN_THRESHOLD)}
+
+
+def _pairs_key(tenant) -> str:
+    return tenant_cache_key("partner_duplicate_pairs", tenant.id, "partner")
+
+
+def _clusters_key(tenant, threshold: float) -> str:
+    return tenant_cache_key("partner_duplicates", tenant.id, "partner", threshold)
+
+
+def _cached_clusters(data: dict, threshold: float, key: str) -> list[dict]:
+    clusters = cluster_pairs(data["members"], data["pairs"], threshold=threshold)
+    cache.set(key, clusters, timeout=settings.PARTNER_DUPLICATES_CACHE_SECONDS)
+    return clusters
+
+
+def _build_in_background(tenant, pairs_key: str) -> None:
+    '''
+    比較をバックグラウンドのスレッドで行い、結果（比較した組と既定のしきい値のグループ）をキャッシュに置く
+    - キーは比較を始める前の世代で作る（比較中に取引先が更新されたら、結果は古い世代に置かれて使われない）
+    - 同じテナントの比較は同時に1つだけ（キャッシュのロック）
+    '''
+    clusters_key = _clusters_key(tenant, DEFAULT_THRESHOLD)
+    lock_key = f"{pairs_key}:building"
+    if not cache.add(lock_key, True, timeout=settings.PARTNER_DUPLICATES_BUILD_TIMEOUT_SECONDS):
+        return
+
+    def run():
+        try:
+            data = build_duplicate_pairs(tenant)
+            cache.set(pairs_key, data, timeout=settings.PARTNER_DUPLICATES_CACHE_SECONDS)
+            _cached_clusters(data, DEFAULT_THRESHOLD, clusters_key)
+        except Exception:
+            logger.exception("partner duplicate build failed: tenant=%s", tenant.pk)
+        finally:
+            cache.delete(lock_key)
+            connections.close_all()
+
+    threading.Thread(target=run, name=f"partner-duplicates-{tenant.pk}", daemon=True).start()
+
+
+def duplicate_clusters(tenant, *, threshold: float = DEFAULT_THRESHOLD) -> list[dict] | None:
+    '''
+    テナント内の重複候補グループ（比較中の場合は None）
+    - 比較は MIN_THRESHOLD で1回だけ行い、テナントのキャッシュ世代（取引先の書き込みで上がる）ごとにキャッシュする
+      しきい値ごとには比較し直さず、キャッシュした組を絞ってグループにする（グループも THRESHOLD_STEP 刻みでキャッシュ）
+    - キャッシュキーは読み込む前に作り、比較中に世代が上がっても古い結果を新しい世代に置かない
+    - 未削除の取引先が PARTNER_DUPLICATES_INLINE_MAX 件を超えるテナントは、バックグラウンドで比較して None を返す
+    '''
+    threshold = normalize_threshold(threshold)
+    pairs_key = _pairs_key(tenant)
+    clusters_key = _clusters_key(tenant, threshold)
+    clusters = cache.get(clusters_key)
+    if clusters is not None:
+        return clusters
+
+    data = cache.get(pairs_key)
+    if data is None:
+        if live_partner_count(tenant) > settings.PARTNER_DUPLICATES_INLINE_MAX:
+            _build_in_background(tenant, pairs_key)
+            return None
+        data = build_duplicate_pairs(tenant)
+        cache.set(pairs_key, data, timeout=settings.PARTNER_DUPLICATES_CACHE_SECONDS)
+    return _cached_clusters(data, threshold, clusters_key)
+
+
+def live_partner_count(tenant) -> int:
+    '''
+    未削除の取引先件数（テナント集計から。COUNT(*) はしない）
+    '''
+    rows = TenantStats.objects.filter(tenant=tenant, is_deleted=False).aggregate(n=Sum("partner_count"))
+    return rows["n"] or 0
@@ -0,0 +1,164 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Q
+
+from api.base import contact_search_q
+from api.cache import tenant_cache_key
+
+from .models import Partner, PartnerArchive
+
+PARTNER_TYPES = {"customer", "supplier", "both"}
+
+# 件数を返せる項目（facets=partner_type,state）
+FACET_FIELDS = ("partner_type", "state")
+
+
+def apply_partner_filters(qs, params):
+    '''
+    一覧の絞り込み条件（取引先マスタ / アーカイブ共通）
+    - params: クエリパラメータ（request.query_params / request.GET）
+    '''
+    # 取引先区分（partner_type）フィルタ
+    # 想定外の値は無視（400にはせず、単に絞り込みしない）
+    partner_type = (params.get("partner_type") or "").strip()
+    if partner_type in PARTNER_TYPES:
+        qs = qs.filter(partner_type=partner_type)
+
+    # 都道府県（state）フィルタ（完全一致）
+    state = (params.get("state") or "").strip()
+    if state:
+        qs = qs.filter(state=state)
+
+    # フリーワード検索
+    # - 電話番号・Email らしい入力は検索用の列（インデックスあり）の前方一致（api.base.contact_search_q）
+    # - それ以外は部分一致
+    q = (params.get("q") or "").strip()
+    contact_q = contact_search_q(q) if q else None
+    if contact_q is not None:
+        qs = qs.filter(contact_q)
+    elif q:
+        qs = qs.filter(
+            Q(partner_name__icontains=q)
+            | Q(partner_name_kana__icontains=q)
+            | Q(contact_name__icontains=q)
+            | Q(email__icontains=q)
+            | Q(tel_number__icontains=q)
+        )
+    return qs
+
+
+def partner_queryset(request, *, include_archive: bool = False):
+    '''
+    取引先の一覧用クエリセット（テナント分離 + 絞り込み）
+    - include_deleted=1 のときだけ削除済みも含める
+    - include_archive=True かつ include_deleted=1 のときは、アーカイブ済みの行も union で合わせて返す
+      （union 後は filter() できないため、詳細系では合成しない）
+    '''
+    params = getattr(request, "query_params", request.GET)
+    return tenant_partner_queryset(request.tenant, params, include_archive=include_archive)
+
+
+def tenant_partner_queryset(tenant, params, *, include_archive: bool = False):
+    '''
+    partner_queryset の本体（テナントとクエリパラメータから組み立てる）
+    '''
+    include_deleted = params.get("include_deleted") == "1"
+    qs = apply_partner_filters(Partner.objects.for_tenant(tenant, include_deleted=include_deleted), params)
+
+    if include_archive and include_deleted:
+        archived = apply_partner_filters(PartnerArchive.objects.for_tenant(tenant, include_deleted=True), params)
+        qs = qs.order_by().union(archived.order_by(), all=True).order_by(*Partner._meta.ordering)
+    return qs
+
+
+def facet_selection(params) -> dict[str, str]:
+    '''
+    絞り込み中の facet 項目の値（apply_partner_filters が実際に使う値だけ）
+    '''
+    selected = {}
+    partner_type = (params.get("partner_type") or "").strip()
+    if partner_type in PARTNER_TYPES:
+        selected["partner_type"] = partner_type
+    state = (params.get("state") or "").strip()
+    if state:
+        selected["state"] = state
+    return selected
+
+
+def parse_facets(params) -> list[str]:
+    '''
+    facets=partner_type,state を項目名のリストにする（未知の項目は無視）
+    '''
+    requested = {f.strip() for f in (params.get("facets") or "").split(",")}
+    return [f for f in FACET_FIELDS if f in requested]
+
+
+def partner_facets(request, fields: list[str]) -> dict:
+    '''
+    facet 項目ごとの「その値を選んだら何件になるか」を1クエリで数える
+    - q / include_deleted（アーカイブ含む）の絞り込みは効かせ、facet 項目の絞り込みは SQL の FILTER 句で扱う
+      （各項目の件数には「他の項目」の絞り込みだけを効かせる。自分自身の選択で他の値が0件にならないように）
+    - GROUPING SETS ((partner_type), (state)) で全項目を1回の走査で集計する
+    - テナントのキャッシュ世代（書き込みで上がる）ごとにキャッシュする
+    - 戻り値: {項目: [{"value": 値, "count": 件数}, ...]}（件数の多い順。partner_type は全区分を返す）
+    '''
+    params = getattr(request, "query_params", request.GET)
+    selected = facet_selection(params)
+    include_deleted = params.get("include_deleted") == "1"
+    q = (params.get("q") or "").strip()
+
+    key = tenant_cache_key(
+        "partner_facets", request.tenant.id, "partner",
+        ",".join(fields), q, include_deleted, *(f"{f}={v}" for f, v in sorted(selected.items())),
+    )
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    # facet 項目の絞り込みを外した一覧と同じ行（アーカイブを含む場合は union 済み）
+    base_params = {"q": q, "include_deleted": "1" if include_deleted else "0"}
+    rows = tenant_partner_queryset(request.tenant, base_params, include_archive=True).order_by().values_list(*FACET_FIELDS)
+    sub_sql, sub_params = rows.query.sql_with_params()
+    connection = connections[rows.db]
+    qn = connection.ops.quote_name
+
+    columns, sql_params = [], []
+    for field in fields:
+        others = [(f, v) for f, v in selected.items() if f != field]
+        if others:
+            where = " AND ".join(f"{qn(f)} = %s" for f, _ in others)
+            columns.append(f"COUNT(*) FILTER (WHERE {where})")
+            sql_params.extend(v for _, v in others)
+        else:
+            columns.append("COUNT(*)")
+    groupings = [f"GROUPING({qn(f)})" for f in fields]
+    sql = (
+        f"SELECT {', '.join(qn(f) for f in fields)}, {', '.join(groupings)}, {', '.join(columns)} "
+        f"FROM ({sub_sql}) AS facet_rows "
+        f"GROUP BY GROUPING SETS ({', '.join(f'({qn(f)})' for f in fields)})"
+    )
+
+    counts = {field: {} for field in fields}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, sql_params + list(sub_params))
+        n = len(fields)
+        for row in cursor.fetchall():
+            values, grouping, totals = row[:n], row[n:2 * n], row[2 * n:]
+            # GROUPING(f) = 0 の項目がその行の集計対象
+            i = grouping.index(0)
+            if totals[i]:
+                counts[fields[i]][values[i]] = totals[i]
+
+    if "partner_type" in counts:
+        for partner_type in sorted(PARTNER_TYPES):
+            counts["partner_type"].setdefault(partner_type, 0)
+    data = {
+        field: [
+            {"value": value, "count": n}
+            for value, n in sorted(values.items(), key=lambda kv: (-kv[1], kv[0] is None, kv[0] or ""))
+        ]
+        for field, values in counts.items()
+    }
+    cache.set(key, data, timeout=settings.PARTNER_FACETS_CACHE_SECONDS)
+    return data
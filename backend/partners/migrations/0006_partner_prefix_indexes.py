@@ -0,0 +1,26 @@
+# Generated by Django 5.2.10 on 2026-10-19 02:50
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partners', '0005_alter_partner_partner_type'),
+        ('tenants', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='partner',
+            index=models.Index(models.F('tenant'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('partner_name'), name='text_pattern_ops'), condition=models.Q(('is_deleted', False)), name='partner_name_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='partner',
+            index=models.Index(models.F('tenant'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('partner_name_kana'), name='text_pattern_ops'), condition=models.Q(('is_deleted', False)), name='partner_kana_prefix_idx'),
+        ),
+    ]
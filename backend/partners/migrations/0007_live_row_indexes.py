@@ -0,0 +1,24 @@
+# Generated by Django 5.2.10 on 2026-10-19 02:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partners', '0006_partner_prefix_indexes'),
+        ('tenants', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='partner',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['tenant', 'partner_name'], name='partner_live_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='partner',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['tenant', 'partner_type', 'partner_name'], name='partner_live_type_idx'),
+        ),
+    ]
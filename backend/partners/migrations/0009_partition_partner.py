@@ -0,0 +1,28 @@
+from django.db import migrations
+
+from api.partitioning import convert_to_partitioned, get_partition_spec, is_partitioned
+
+
+def partition_partner(apps, schema_editor):
+    '''
+    PARTITIONED_MODELS で有効化されている場合のみ、取引先マスタを tenant_id でパーティション化する
+    '''
+    spec = get_partition_spec("partners.Partner")
+    connection = schema_editor.connection
+    if spec is None or connection.vendor != "postgresql":
+        return
+    Partner = apps.get_model("partners", "Partner")
+    if is_partitioned(connection, Partner._meta.db_table):
+        return
+    convert_to_partitioned(connection, Partner, spec)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('partners', '0008_partner_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_partner, migrations.RunPython.noop),
+    ]
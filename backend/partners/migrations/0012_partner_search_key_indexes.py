@@ -0,0 +1,30 @@
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+from api.partitioning import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY はトランザクション内で実行できない
+    # （取引先マスタがパーティション化されている場合はパーティションごとに作ってアタッチする）
+    atomic = False
+
+    dependencies = [
+        ('partners', '0011_backfill_partner_search_keys'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='partner',
+            index=models.Index(models.F('tenant'), django.contrib.postgres.indexes.OpClass(models.F('tel_digits'), name='text_pattern_ops'), condition=models.Q(('is_deleted', False)), name='partner_tel_digits_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='partner',
+            index=models.Index(models.F('tenant'), django.contrib.postgres.indexes.OpClass(models.F('email_lower'), name='text_pattern_ops'), condition=models.Q(('is_deleted', False)), name='partner_email_lower_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='partner',
+            index=models.Index(models.F('tenant'), django.contrib.postgres.indexes.OpClass(models.F('email_domain'), name='text_pattern_ops'), condition=models.Q(('is_deleted', False)), name='partner_email_domain_idx'),
+        ),
+    ]
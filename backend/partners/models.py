@@ -1,11 +1,13 @@
 from django.db import models
-from api.base import BaseModel
+from django.db.models import F, Q
+from django.db.models.functions import Upper
+from django.contrib.postgres.indexes import OpClass
+from api.base import BaseModel, ContactSearchFields, live_index, search_key_index
 from django.core.validators import RegexValidator
 
-class Partner(BaseModel):
+class PartnerFields(ContactSearchFields, BaseModel):
     '''
-    取引先マスタ
-    - 顧客・仕入先などを管理
+    取引先の項目定義（取引先マスタ / アーカイブで共通）
     '''
     PARTNER_TYPE_CHOICES = [
         ('customer', '顧客'),
@@ -111,6 +113,31 @@ class Partner(BaseModel):
         help_text='建物名・部屋番号などを150文字以内で入力してください。（任意）'
     )
 
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        display_type = dict(self.PARTNER_TYPE_CHOICES).get(self.partner_type, '')
+        return f'{self.partner_name}'
+
+
+class Partner(PartnerFields):
+    '''
+    取引先マスタ
+    - 顧客・仕入先などを管理
+    - 論理削除から一定期間経過した行は PartnerArchive へ移動する（archive_deleted コマンド）
+    '''
+    ARCHIVE_MODEL = 'partners.PartnerArchive'
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # テナント集計（tenants.stats）の増減を判定するため、読み込み時の区分・削除フラグを覚えておく
+        loaded = instance.__dict__
+        if 'partner_type' in loaded and 'is_deleted' in loaded:
+            instance._loaded_stats_key = (instance.tenant_id, loaded['partner_type'], loaded['is_deleted'])
+        return instance
+
     class Meta:
         verbose_name = '取引先'
         verbose_name_plural = '取引先マスタ'
@@ -121,7 +148,41 @@ class Partner(BaseModel):
                 name='unique_tenant_partner_email'
             )
         ]
+        indexes = [
+            # 未削除行の一覧（既定の並び順 / 区分での絞り込み）
+            live_index('tenant', 'partner_name', name='partner_live_name_idx'),
+            live_index('tenant', 'partner_type', 'partner_name', name='partner_live_type_idx'),
+            # 前方一致検索（サジェスト）用: UPPER(col) LIKE 'ABC%' に効く
+            models.Index(
+                F('tenant'), OpClass(Upper('partner_name'), name='text_pattern_ops'),
+                name='partner_name_prefix_idx',
+                condition=Q(is_deleted=False),
+            ),
+            models.Index(
+                F('tenant'), OpClass(Upper('partner_name_kana'), name='text_pattern_ops'),
+                name='partner_kana_prefix_idx',
+                condition=Q(is_deleted=False),
+            ),
+            # 電話番号・Email での検索（q=）用: 数字のみの電話番号 / 小文字の Email / ドメインの完全一致・前方一致に効く
+            search_key_index('tel_digits', name='partner_tel_digits_idx'),
+            search_key_index('email_lower', name='partner_email_lower_idx'),
+            search_key_index('email_domain', name='partner_email_domain_idx'),
+            # アーカイブ対象（削除済み + 更新日時が保持期間より前）の抽出用
+            models.Index(fields=['updated_at'], name='partner_deleted_updated_idx', condition=Q(is_deleted=True)),
+        ]
 
-    def __str__(self):
-        display_type = dict(self.PARTNER_TYPE_CHOICES).get(self.partner_type, '')
-        return f'{self.partner_name}'
\ No newline at end of file
+
+class PartnerArchive(PartnerFields):
+    '''
+    取引先マスタ（アーカイブ）
+    - 論理削除から保持期間を過ぎた取引先の退避先
+    - id は取引先マスタの id をそのまま引き継ぐ（復元時に元の id へ戻すため）
+    '''
+
+    class Meta:
+        verbose_name = '取引先（アーカイブ）'
+        verbose_name_plural = '取引先マスタ（アーカイブ）'
+        ordering = ['partner_name']
+        indexes = [
+            models.Index(fields=['tenant', 'partner_name'], name='partner_archive_name_idx'),
+        ]
\ No newline at end of file
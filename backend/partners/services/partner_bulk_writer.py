@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any
+
+from django.db import IntegrityError, transaction
+from rest_framework import serializers, status
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from api.changefeed import publish_change
+from api.metrics import record_import
+from partners.models import Partner
+from partners.serializers import Serializer
+from tenants.stats import apply_deltas, partner_stats_key
+
+# エラーがあった場合の扱い
+# - all_or_nothing: 1件でもエラーがあれば保存しない（CSV取込と同じ）
+# - partial: エラーの項目を除いて保存する
+POLICIES = ("all_or_nothing", "partial")
+
+UNIQUE_FIELDS = ["tenant", "partner_name", "email"]
+
+# upsert で既存の取引先に上書きする項目（一意キー・作成者・削除フラグは変えない）
+UPDATE_FIELDS = [
+    "partner_name_kana",
+    "partner_type",
+    "contact_name",
+    "tel_number",
+    "postal_code",
+    "state",
+    "city",
+    "address",
+    "address2",
+    "update_user",
+    "updated_at",
+]
+
+
+@dataclass
+class BulkItem:
+    index: int
+    validated: dict[str, Any] | None = None
+    errors: dict[str, Any] | None = None
+    existing: tuple[int, str] | None = None  # upsert で更新する既存行の (id, 区分)
+    obj: Partner | None = None
+
+
+class PartnerBulkWriter:
+    '''
+    取引先の一括登録・更新（POST /api/partners/bulk/）
+    - 全件を1つの ListSerializer で検証する（子シリアライザの fields は1回だけ作られる）
+    - 取引先名称+Email の重複は、リクエスト内の重複と登録済みの行をまとめて確認する（1クエリ）
+    - 書き込みは bulk_create 1回（upsert=True なら ON CONFLICT DO UPDATE）
+    - upsert は指定のない項目を既定値に戻す（PUT と同じく全項目の置き換え）
+    - 結果は items と同じ順・同じ件数の配列で返す
+    '''
+
+    def __init__(self, *, request, items: list[Any], policy: str = "all_or_nothing", upsert: bool = False):
+        self.request = request
+        self.items = items
+        self.policy = policy
+        self.upsert = upsert
+
+    def run(self) -> Response:
+        '''
+        一括登録を実行し、件数・処理時間をメトリクス（api.metrics）に記録する
+        '''
+        started = time.perf_counter()
+        self.outcome = "failed"
+        self.saved_count = self.error_count = 0
+        try:
+            return self._run()
+        finally:
+            record_import(
+                "partner_bulk",
+                outcome=self.outcome,
+                processed=len(self.items),
+                saved=self.saved_count,
+                errors=self.error_count,
+                seconds=time.perf_counter() - started,
+            )
+
+    def _run(self) -> Response:
+        items = self.validate()
+        self.check_duplicates(items)
+
+        ok = [item for item in items if not item.errors]
+        self.error_count = len(items) - len(ok)
+        if self.error_count and self.policy == "all_or_nothing":
+            self.outcome = "rejected"
+            return self.response(items, status.HTTP_400_BAD_REQUEST)
+
+        if ok:
+            try:
+                with transaction.atomic():
+                    self.save(ok)
+            except IntegrityError:
+                # 検証後に他のリクエストで同じ取引先名称+Email が登録された
+                for item in ok:
+                    item.obj = None
+                self.mark_conflicts(ok)
+                self.outcome = "conflict"
+                self.error_count = sum(1 for item in items if item.errors)
+                return self.response(items, status.HTTP_409_CONFLICT)
+
+        self.outcome = "saved"
+        self.saved_count = len(ok)
+        return self.response(items, status.HTTP_207_MULTI_STATUS if self.error_count else status.HTTP_200_OK)
+
+    def validate(self) -> list[BulkItem]:
+        list_serializer = Serializer(many=True, context={"request": self.request})
+        items = []
+        for index, data in enumerate(self.items):
+            item = BulkItem(index=index)
+            try:
+                item.validated = list_serializer.run_child_validation(data)
+            except serializers.ValidationError as e:
+                item.errors = e.detail
+            items.append(item)
+        return items
+
+    def existing_rows(self, items: list[BulkItem]) -> dict[tuple[str, str], tuple[int, str, bool]]:
+        emails = {item.validated["email"] for item in items if item.validated}
+        rows = (
+            Partner.objects.for_tenant(self.request.tenant, include_deleted=True)
+            .filter(email__in=emails)
+            .order_by()
+            .values_list("partner_name", "email", "id", "partner_type", "is_deleted")
+        )
+        return {(pn, em): (pk, pt, deleted) for pn, em, pk, pt, deleted in rows}
+
+    def check_duplicates(self, items: list[BulkItem]) -> None:
+        existing = self.existing_rows(items)
+        seen = set()
+        for item in items:
+            if item.errors:
+                continue
+            key = (item.validated["partner_name"], item.validated["email"])
+            found = existing.get(key)
+            if key in seen:
+                item.errors = self.key_error("リクエスト内で同じ取引先名称+Emailが重複しています")
+            elif found and not self.upsert:
+                item.errors = self.key_error("既に同じ取引先名称+Emailが登録されています")
+            elif found and found[2]:
+                item.errors = self.key_error("削除済みの取引先と同じ取引先名称+Emailです（復元してから更新してください）")
+            elif found:
+                item.existing = (found[0], found[1])
+            seen.add(key)
+
+    def mark_conflicts(self, items: list[BulkItem]) -> None:
+        existing = self.existing_rows(items)
+        conflicts = [
+            item for item in items
+            if item.existing is None and (item.validated["partner_name"], item.validated["email"]) in existing
+        ]
+        for item in conflicts:
+            item.errors = self.key_error("同時更新により重複が発生しました（既に同じ取引先名称+Emailが登録されています）")
+        if not conflicts:
+            for item in items:
+                item.errors = self.key_error("DB登録時に整合性エラーが発生しました。再度実行してください。")
+
+    def key_error(self, message: str) -> dict[str, list[str]]:
+        return {api_settings.NON_FIELD_ERRORS_KEY: [message]}
+
+    def save(self, items: list[BulkItem]) -> None:
+        tenant = self.request.tenant
+        user = self.request.user
+        objs = [
+            Partner(**{**item.validated, "tenant": tenant, "create_user": user, "update_user": user})
+            for item in items
+        ]
+        if self.upsert:
+            Partner.objects.bulk_create(
+                objs, update_conflicts=True, unique_fields=UNIQUE_FIELDS, update_fields=UPDATE_FIELDS,
+            )
+        else:
+            Partner.objects.bulk_create(objs)
+
+        # bulk_create ではシグナルが飛ばないため、テナント集計はここで反映する
+        # （検証後に他のリクエストで登録された行への upsert は登録として数える。ずれは再集計で補正される）
+        deltas = Counter()
+        for item, obj in zip(items, objs):
+            item.obj = obj
+            deltas[partner_stats_key(obj)] += 1
+            if item.existing is not None:
+                deltas[(tenant.id, item.existing[1], False)] -= 1
+        apply_deltas(deltas)
+
+        # 件数が多いため行単位ではなく1イベントで通知する（クライアントは一覧を再取得）
+        publish_change(tenant_id=tenant.id, model="partner", op="bulk", count=len(objs))
+
+    def response(self, items: list[BulkItem], status_code: int) -> Response:
+        results = []
+        for item in items:
+            if item.errors:
+                results.append({"status": "error", "errors": item.errors})
+            elif item.obj is None:
+                results.append({"status": "skipped"})  # 他の項目のエラーにより保存しなかった
+            else:
+                results.append({"status": "updated" if item.existing else "created", "id": item.obj.pk})
+        return Response(
+            {
+                "created": sum(1 for r in results if r["status"] == "created"),
+                "updated": sum(1 for r in results if r["status"] == "updated"),
+                "errors": sum(1 for r in results if r["status"] == "error"),
+                "results": results,
+            },
+            status=status_code,
+        )
@@ -0,0 +1,19 @@
+def partner_csv_row(p) -> list[str]:
+    '''
+    取引先1件をCSVの1行（CSV_HEADERS の並び）に変換する
+    - 取引先区分は区分値ではなく日本語を出力する（インポートと同じ形式）
+    '''
+    return [
+        p.partner_name,
+        p.partner_name_kana or "",
+        p.get_partner_type_display(),
+        p.contact_name or "",
+        p.tel_number or "",
+        p.email,
+        p.postal_code or "",
+        p.state or "",
+        p.city or "",
+        p.address or "",
+        p.address2 or "",
+        "1" if p.is_deleted else "0",
+    ]
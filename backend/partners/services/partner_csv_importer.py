@@ -2,8 +2,12 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Any
 from api.base import BaseCsvImporter, RowError
+from api.changefeed import publish_change
+from api.postal import apply_postal_lookup
+from partners.duplicates import DuplicateIndex, PartnerKey, tenant_partner_keys
 from partners.models import Partner
 from partners.serializers import Serializer
+from tenants.stats import track_partners_created
 
 
 CSV_HEADERS = [
@@ -22,6 +26,11 @@ class PartnerOkRow:
 
 class CsvImporter(BaseCsvImporter):
     csv_headers = CSV_HEADERS
+    metrics_kind = "partner"
+
+    def __init__(self, *, request, file, check_duplicates: bool = False):
+        super().__init__(request=request, file=file)
+        self.check_duplicates = check_duplicates
 
     def error_file_prefix(self) -> str:
         return "partners_import_error"
@@ -29,6 +38,18 @@ class CsvImporter(BaseCsvImporter):
     def init_seen_state(self):
         return set()  # CSV内重複検出
 
+    def prefetch(self, rows):
+        # DB重複チェック用: CSVに出てくる Email を持つ既存の (取引先名称, Email) を1クエリで読む
+        emails = {(r.get("Email") or "").strip() for r in rows} - {""}
+        self.existing_keys = set(
+            Partner.objects.for_tenant(self.request.tenant, include_deleted=True)
+            .filter(email__in=emails)
+            .values_list("partner_name", "email")
+        )
+
+        # 重複候補チェック用: テナントの未削除の取引先をブロックごとに持つ（CSVの行も検証しながら加える）
+        self.duplicate_index = DuplicateIndex(tenant_partner_keys(self.request.tenant)) if self.check_duplicates else None
+
     def normalize_partner_type(self, v: str | None) -> str | None:
         if not v:
             return None
@@ -36,7 +57,6 @@ class CsvImporter(BaseCsvImporter):
 
     def validate_row(self, *, rowno: int, row: dict[str, Any], seen: set, ) -> list[str]:
         errs: list[str] = []
-        tenant = self.request.user.tenant
         partner_name = (row.get("取引先名称") or "").strip()
         email = (row.get("Email") or "").strip()
         pt = self.normalize_partner_type(row.get("区分"))
@@ -51,63 +71,48 @@ class CsvImporter(BaseCsvImporter):
             else:
                 seen.add(key)
 
-        serializer = Serializer(
-            data={
-                "partner_name": row.get("取引先名称"),
-                "partner_name_kana": row.get("取引先名称カナ"),
-                "partner_type": pt,
-                "contact_name": row.get("担当者名"),
-                "tel_number": row.get("電話番号"),
-                "email": row.get("Email"),
-                "postal_code": row.get("郵便番号"),
-                "state": row.get("都道府県"),
-                "city": row.get("市区町村"),
-                "address": row.get("住所"),
-                "address2": row.get("建物名等"),
-            },
-            context={"request": self.request},
-        )
-
-        if not serializer.is_valid():
-            for k, v in serializer.errors.items():
-                if isinstance(v, list):
-                    errs.append(f"{k}: " + " / ".join([str(x) for x in v]))
-                else:
-                    errs.append(f"{k}: {v}")
+        data = {
+            "partner_name": row.get("取引先名称"),
+            "partner_name_kana": row.get("取引先名称カナ"),
+            "partner_type": pt,
+            "contact_name": row.get("担当者名"),
+            "tel_number": row.get("電話番号"),
+            "email": row.get("Email"),
+            "postal_code": row.get("郵便番号"),
+            "state": row.get("都道府県"),
+            "city": row.get("市区町村"),
+            "address": row.get("住所"),
+            "address2": row.get("建物名等"),
+        }
+        # 郵便番号の形をそろえ、都道府県・市区町村と突き合わせる（空なら補う）
+        errs += apply_postal_lookup(data)
+        errs += self.validate_serializer(Serializer, rowno=rowno, data=data)
+
+        # 重複の可能性（名称の表記ゆれ・電話番号などの一致）
+        if self.duplicate_index is not None:
+            candidate = PartnerKey.from_values(f"{rowno}行目", data)
+            similar = self.duplicate_index.matches(candidate)
+            if similar:
+                # 既存の取引先は ID、CSV内の行は行番号で示す
+                names = "、".join(
+                    f"{m.partner_name}（{m.ref if isinstance(m.ref, str) else f'ID {m.ref}'}）" for m, _, _ in similar[:3]
+                )
+                errs.append(f"重複の可能性がある取引先があります: {names}")
+            self.duplicate_index.add(candidate)
 
-        # DB重複事前チェック（ユニーク制約）
-        if partner_name and email:
-            if Partner.objects.filter(tenant=tenant, partner_name=partner_name, email=email).exists():
-                errs.append("既に同じ取引先名称+Emailが登録されています")
+        # DB重複事前チェック（ユニーク制約。既存データは prefetch で取得済み）
+        if partner_name and email and (partner_name, email) in self.existing_keys:
+            errs.append("既に同じ取引先名称+Emailが登録されています")
 
         return errs
 
     def build_ok_row(self, *, rowno: int, row: dict[str, Any], seen: set) -> PartnerOkRow:
-        pt = self.normalize_partner_type(row.get("区分"))
-        serializer = Serializer(
-            data={
-                "partner_name": row.get("取引先名称"),
-                "partner_name_kana": row.get("取引先名称カナ"),
-                "partner_type": pt,
-                "contact_name": row.get("担当者名"),
-                "tel_number": row.get("電話番号"),
-                "email": row.get("Email"),
-                "postal_code": row.get("郵便番号"),
-                "state": row.get("都道府県"),
-                "city": row.get("市区町村"),
-                "address": row.get("住所"),
-                "address2": row.get("建物名等"),
-            },
-            context={"request": self.request},
-        )
-        serializer.is_valid(raise_exception=True)
-
         partner_name = (row.get("取引先名称") or "").strip()
         email = (row.get("Email") or "").strip()
-        return PartnerOkRow(rowno=rowno, row=row, key=(partner_name, email), validated=serializer.validated_data)
+        return PartnerOkRow(rowno=rowno, row=row, key=(partner_name, email), validated=self.validated[rowno])
 
     def save_ok_rows(self, ok_rows: list[PartnerOkRow]) -> int:
-        tenant = self.request.user.tenant
+        tenant = self.request.tenant
         user = self.request.user
 
         objs = [
@@ -120,14 +125,19 @@ class CsvImporter(BaseCsvImporter):
             for r in ok_rows
         ]
         Partner.objects.bulk_create(objs)
+        # bulk_create ではシグナルが飛ばないため、テナント集計はここで反映する
+        track_partners_created(objs)
+
+        # 件数が多いため行単位ではなく1イベントで通知する（クライアントは一覧を再取得）
+        publish_change(tenant_id=tenant.id, model="partner", op="import", count=len(objs))
         return len(objs)
 
     def on_integrity_error(self, ok_rows: list[PartnerOkRow]) -> list[RowError]:
-        tenant = self.request.user.tenant
+        tenant = self.request.tenant
         conflicts: list[RowError] = []
         for r in ok_rows:
             pn, em = r.key
-            if pn and em and Partner.objects.filter(tenant=tenant, partner_name=pn, email=em).exists():
+            if pn and em and Partner.objects.for_tenant(tenant, include_deleted=True).filter(partner_name=pn, email=em).exists():
                 conflicts.append(
                     RowError(
                         rowno=r.rowno,
@@ -1,3 +1,811 @@
-from django.test import TestCase
+import io
+import re
+import threading
+from datetime import timedelta
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from api.archive import archive_batch
+from api.base import backfill_search_keys
+from api.cache import bump_tenant_generation, tenant_cache_key
+from api.partitioning import PartitionSpec, convert_to_partitioned, is_partitioned
+from tenants.models import Tenant, TenantStats
+from tenants.stats import reconcile
+from .duplicates import duplicate_clusters, normalize_threshold
+from .models import Partner, PartnerArchive
+from .services.partner_csv_importer import CSV_HEADERS
+
+
+class PartnerPartitionPruningTests(TestCase):
+    '''
+    取引先マスタを tenant_id でハッシュパーティション化したとき、
+    テナントで絞り込んだクエリが1パーティションだけを走査することを EXPLAIN で確認する
+    '''
+
+    PARTITIONS = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        # テストDB上で変換する（クラス単位のトランザクションでロールバックされる）
+        if not is_partitioned(connection, Partner._meta.db_table):
+            convert_to_partitioned(connection, Partner, PartitionSpec(method="hash", partitions=cls.PARTITIONS))
+
+        cls.tenants = [
+            Tenant.objects.create(tenant_name=f"テナント{i}", representative_name="代表者", email=f"tenant{i}@example.com")
+            for i in range(3)
+        ]
+        Partner.objects.bulk_create(
+            Partner(tenant=t, partner_name=f"取引先{i}", email=f"p{i}@example.com", is_deleted=(i % 5 == 0))
+            for t in cls.tenants
+            for i in range(50)
+        )
+
+    def scanned_partitions(self, qs) -> set[str]:
+        plan = qs.explain()
+        return set(re.findall(rf"on ({Partner._meta.db_table}_p\d+)\b", plan))
+
+    def test_table_is_partitioned(self):
+        self.assertTrue(is_partitioned(connection, Partner._meta.db_table))
+
+    def test_tenant_list_query_prunes_to_one_partition(self):
+        tenant = self.tenants[0]
+        qs = Partner.objects.for_tenant(tenant).filter(partner_type="customer").order_by("partner_name")
+        self.assertEqual(len(self.scanned_partitions(qs)), 1)
+        self.assertEqual(qs.count(), 40)
+
+    def test_tenant_retrieve_prunes_to_one_partition(self):
+        tenant = self.tenants[1]
+        obj = Partner.objects.for_tenant(tenant).first()
+        qs = Partner.objects.for_tenant(tenant, include_deleted=True).filter(pk=obj.pk)
+        self.assertEqual(len(self.scanned_partitions(qs)), 1)
+        self.assertEqual(qs.get(), obj)
+
+    def test_unscoped_query_scans_all_partitions(self):
+        qs = Partner.objects.filter(partner_type="customer")
+        self.assertEqual(len(self.scanned_partitions(qs)), self.PARTITIONS)
+
+    def test_insert_after_conversion_uses_sequence(self):
+        tenant = self.tenants[2]
+        before = Partner.objects.order_by("-id").values_list("id", flat=True).first()
+        obj = Partner.objects.create(tenant=tenant, partner_name="追加取引先", email="new@example.com")
+        self.assertGreater(obj.pk, before)
+
+
+class PartnerTenantIsolationTests(TestCase):
+    '''
+    他テナントの取引先が一覧・詳細・更新・削除・復元・CSV出力のどこからも見えず、操作できないことと、
+    未削除行だけのクエリが部分インデックス（WHERE is_deleted = false）を使うことを確認する
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(tenant_name="自テナント", representative_name="代表者", email="own@example.com")
+        cls.other = Tenant.objects.create(tenant_name="他テナント", representative_name="代表者", email="other@example.com")
+        cls.user = User.objects.create_user(email="isolation@example.com", password="pw-12345678", tenant=cls.tenant)
+        cls.own = Partner.objects.create(tenant=cls.tenant, partner_name="自社の取引先", email="own@example.com")
+        cls.foreign = Partner.objects.create(tenant=cls.other, partner_name="他社の取引先", email="foreign@example.com")
+        cls.foreign_deleted = Partner.objects.create(
+            tenant=cls.other, partner_name="他社の削除済み", email="deleted@example.com", is_deleted=True,
+        )
+        User.objects.create_user(email="other-user@example.com", password="pw-12345678", tenant=cls.other)
+
+    def setUp(self):
+        cache.clear()
+        self.headers = {"Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    def request(self, method, path, data=None):
+        return getattr(self.client, method)(path, data, content_type="application/json", headers=self.headers)
+
+    def test_list_and_export_hide_other_tenants(self):
+        for params in ("", "?include_deleted=1", "?q=他社"):
+            names = [p["partner_name"] for p in self.request("get", f"/api/partners/{params}").json()["results"]]
+            self.assertNotIn("他社の取引先", names)
+            self.assertNotIn("他社の削除済み", names)
+        body = self.request("get", "/api/partners/export/?include_deleted=1").content.decode("utf-8")
+        self.assertIn("自社の取引先", body)
+        self.assertNotIn("他社", body)
+
+    def test_other_tenant_rows_are_not_found(self):
+        for pk in (self.foreign.pk, self.foreign_deleted.pk):
+            self.assertEqual(self.request("get", f"/api/partners/{pk}/?include_deleted=1").status_code, 404)
+            self.assertEqual(self.request("patch", f"/api/partners/{pk}/", {"partner_name": "x"}).status_code, 404)
+            self.assertEqual(self.request("delete", f"/api/partners/{pk}/").status_code, 404)
+            self.assertEqual(self.request("post", f"/api/partners/{pk}/restore/").status_code, 404)
+        self.foreign.refresh_from_db()
+        self.foreign_deleted.refresh_from_db()
+        self.assertEqual((self.foreign.partner_name, self.foreign.is_deleted), ("他社の取引先", False))
+        self.assertTrue(self.foreign_deleted.is_deleted)
+
+    def test_live_queries_use_partial_indexes(self):
+        # 件数の少ないテーブルでは実行計画が統計しだいで変わるため、行を足して統計を取り直す
+        Partner.objects.bulk_create(
+            Partner(tenant=self.tenant if i % 2 else self.other, partner_name=f"取引先{i}", email=f"p{i}@example.com",
+                    partner_type="customer" if i % 3 else "supplier", is_deleted=(i % 4 == 0))
+            for i in range(2000)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Partner._meta.db_table}")
+            cursor.execute(f"ANALYZE {User._meta.db_table}")
+
+        def used_indexes(qs) -> set[str]:
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            return set(re.findall(r"Index (?:Only )?Scan (?:Backward )?(?:using|on) (\w+)", qs.explain()))
+
+        partial = {index.name for model in (Partner, User) for index in model._meta.indexes if index.condition is not None}
+        live = Partner.objects.for_tenant(self.tenant)
+        # 一覧の1ページ目（既定の並び順）は並べ替えずにインデックス順で読む
+        self.assertEqual(used_indexes(live.order_by("partner_name")[:50]), {"partner_live_name_idx"})
+        self.assertLessEqual(used_indexes(live.filter(partner_type="customer").order_by("partner_name")), partial)
+        self.assertLessEqual(used_indexes(User.objects.for_tenant(self.tenant)), partial)
+        # 削除済みも含める場合は部分インデックスの条件を満たさないため使えない
+        self.assertFalse(used_indexes(Partner.objects.for_tenant(self.tenant, include_deleted=True)) & partial)
+
+
+class PartnerAsyncParityTests(TestCase):
+    '''
+    非同期版の一覧・詳細・CSV出力（/api/async/partners/）が、同期版（/api/partners/）と同じ応答を返すことを確認する
+    （ページングの形式・並び順・include_deleted でのアーカイブとの union・401 / 404 の本文）
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(tenant_name="テナント", representative_name="代表者", email="t@example.com")
+        cls.other = Tenant.objects.create(tenant_name="他テナント", representative_name="代表者", email="o@example.com")
+        cls.user = User.objects.create_user(email="parity@example.com", password="pw-12345678", tenant=cls.tenant)
+        Partner.objects.bulk_create(
+            Partner(tenant=cls.tenant, partner_name=f"取引先{i:02d}", email=f"p{i}@example.com",
+                    partner_type="supplier" if i % 3 == 0 else "customer", is_deleted=(i % 7 == 0))
+            for i in range(30)
+        )
+        cls.foreign = Partner.objects.create(tenant=cls.other, partner_name="他社", email="x@example.com")
+        cls.deleted = Partner.objects.filter(tenant=cls.tenant, is_deleted=True).order_by("pk").first()
+        archived = Partner.objects.filter(tenant=cls.tenant, is_deleted=True).order_by("-pk").first()
+        archived.updated_at = timezone.now() - timedelta(days=400)
+        Partner.objects.filter(pk=archived.pk).update(updated_at=archived.updated_at)
+        archive_batch(Partner, cutoff=timezone.now() - timedelta(days=365), batch_size=10)
+        cls.archived = PartnerArchive.objects.get(pk=archived.pk)
+
+    def setUp(self):
+        cache.clear()
+        self.headers = {"Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    async def get_both(self, path, params=None, *, headers=None):
+        headers = self.headers if headers is None else headers
+        sync = await sync_to_async(self.client.get)(f"/api/partners/{path}", params, headers=headers)
+        asynchronous = await self.async_client.get(f"/api/async/partners/{path}", params, headers=headers)
+        return sync, asynchronous
+
+    def assertSameJson(self, sync, asynchronous):
+        self.assertEqual(asynchronous.status_code, sync.status_code)
+        # next / previous の URL はパスだけが異なる
+        self.assertEqual(asynchronous.content.decode().replace("/api/async/", "/api/"), sync.content.decode())
+
+    async def test_list(self):
+        for params in (
+            {}, {"page": "2"}, {"page": "last"}, {"ordering": "-partner_name"}, {"ordering": "partner_type,-email"},
+            {"ordering": "password"}, {"partner_type": "supplier"}, {"q": "取引先1"},
+            {"include_deleted": "1"}, {"include_deleted": "1", "page": "2"}, {"facets": "partner_type"},
+            {"page": "9"}, {"page": "x"},
+        ):
+            with self.subTest(params=params):
+                self.assertSameJson(*await self.get_both("", params))
+
+        sync, asynchronous = await self.get_both("", {"include_deleted": "1", "page": "2"})
+        names = [p["partner_name"] for p in asynchronous.json()["results"]]
+        self.assertIn(self.archived.partner_name, names)
+        self.assertEqual(names, sorted(names))
+
+    async def test_detail(self):
+        own = await Partner.objects.for_tenant(self.tenant).afirst()
+        for path, params in (
+            (f"{own.pk}/", None),
+            (f"{self.deleted.pk}/", None),
+            (f"{self.deleted.pk}/", {"include_deleted": "1"}),
+            (f"{self.archived.pk}/", None),
+            (f"{self.archived.pk}/", {"include_deleted": "1"}),
+            (f"{self.foreign.pk}/", {"include_deleted": "1"}),
+        ):
+            with self.subTest(path=path, params=params):
+                self.assertSameJson(*await self.get_both(path, params))
+
+    async def test_export(self):
+        for params in ({}, {"include_deleted": "1", "ordering": "-partner_name"}, {"q": "p1@"}):
+            with self.subTest(params=params):
+                sync, asynchronous = await self.get_both("export/", params)
+                body = b"".join([chunk async for chunk in asynchronous.streaming_content])
+                self.assertEqual(body, sync.content)
+                self.assertEqual(asynchronous["Content-Disposition"], sync["Content-Disposition"])
+
+    async def test_unauthenticated(self):
+        for headers in ({}, {"Authorization": "Bearer invalid"}):
+            for path in ("", f"{self.foreign.pk}/", "export/"):
+                with self.subTest(headers=headers, path=path):
+                    sync, asynchronous = await self.get_both(path, headers=headers)
+                    self.assertEqual(sync.status_code, 401)
+                    self.assertSameJson(sync, asynchronous)
+                    self.assertEqual(asynchronous["WWW-Authenticate"], sync["WWW-Authenticate"])
+
+
+class PartnerSuggestTests(TestCase):
+    '''
+    取引先サジェスト（/api/partners/suggest/）の前方一致・件数の上限・キャッシュの無効化と、
+    UPPER(col) text_pattern_ops の部分インデックスを使うことを確認する
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(tenant_name="テナント", representative_name="代表者", email="t@example.com")
+        cls.other = Tenant.objects.create(tenant_name="他テナント", representative_name="代表者", email="o@example.com")
+        cls.user = User.objects.create_user(email="suggest@example.com", password="pw-12345678", tenant=cls.tenant)
+        Partner.objects.bulk_create([
+            Partner(tenant=cls.tenant, partner_name="ABC商事", partner_name_kana="エービーシーショウジ", email="a@example.com"),
+            Partner(tenant=cls.tenant, partner_name="abc物流", email="b@example.com"),
+            Partner(tenant=cls.tenant, partner_name="株式会社ABC", partner_name_kana="カブシキガイシャエービーシー", email="c@example.com"),
+            Partner(tenant=cls.tenant, partner_name="ABC削除済み", email="d@example.com", is_deleted=True),
+            Partner(tenant=cls.tenant, partner_name="100%商店", email="e@example.com"),
+            Partner(tenant=cls.other, partner_name="ABC他社", email="f@example.com"),
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.headers = {"Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    def suggest(self, **params):
+        response = self.client.get("/api/partners/suggest/", params, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return [p["partner_name"] for p in response.json()]
+
+    def test_prefix_match(self):
+        # 名称・カナの前方一致（英字は大文字小文字を区別しない）。途中一致・削除済み・他テナントは出ない
+        self.assertEqual(self.suggest(prefix="abc"), ["ABC商事", "abc物流"])
+        self.assertEqual(self.suggest(prefix="エービー"), ["ABC商事"])
+        self.assertEqual(self.suggest(prefix="カブシキ"), ["株式会社ABC"])
+        # LIKE のワイルドカードは文字として扱う
+        self.assertEqual(self.suggest(prefix="100%"), ["100%商店"])
+        self.assertEqual(self.suggest(prefix="%"), [])
+        self.assertEqual(self.suggest(prefix=" "), [])
+
+    @override_settings(PARTNER_SUGGEST_LIMIT=2, PARTNER_SUGGEST_MAX_LIMIT=3)
+    def test_limit_is_clamped(self):
+        Partner.objects.bulk_create(
+            Partner(tenant=self.tenant, partner_name=f"山田{i}", email=f"y{i}@example.com") for i in range(5)
+        )
+        self.assertEqual(len(self.suggest(prefix="山田")), 2)
+        self.assertEqual(len(self.suggest(prefix="山田", limit="1000")), 3)
+        self.assertEqual(len(self.suggest(prefix="山田", limit="0")), 1)
+        self.assertEqual(len(self.suggest(prefix="山田", limit="x")), 2)
+
+    def test_cache_invalidated_by_partner_write(self):
+        self.assertEqual(self.suggest(prefix="abc"), ["ABC商事", "abc物流"])
+        # キャッシュ済み（世代を上げない書き込みは反映されない）
+        Partner.objects.create(tenant=self.tenant, partner_name="ABC直接登録", email="g@example.com")
+        self.assertEqual(self.suggest(prefix="abc"), ["ABC商事", "abc物流"])
+
+        # API での書き込みはコミット後にテナントの世代を上げ、次のサジェストは引き直す
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/partners/", {"partner_name": "ABCアルファ", "email": "h@example.com"},
+                content_type="application/json", headers=self.headers,
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.suggest(prefix="abc"), ["ABCアルファ", "ABC商事", "ABC直接登録", "abc物流"])
+
+        # 他テナントの世代は上がらない
+        other_key = tenant_cache_key("partner_suggest", self.other.pk, "partner", "ABC", 10)
+        cache.set(other_key, ["cached"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/partners/{response.json()['id']}/", headers=self.headers)
+        self.assertEqual(cache.get(other_key), ["cached"])
+        self.assertEqual(self.suggest(prefix="abc"), ["ABC商事", "ABC直接登録", "abc物流"])
+
+    def test_uses_prefix_indexes(self):
+        Partner.objects.bulk_create(
+            Partner(tenant=self.tenant, partner_name=f"取引先{i}", partner_name_kana=f"トリヒキサキ{i}", email=f"p{i}@example.com")
+            for i in range(2000)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Partner._meta.db_table}")
+        with CaptureQueriesContext(connection) as ctx:
+            self.suggest(prefix="abc")
+        sql = next(q["sql"] for q in ctx.captured_queries if "LIKE" in q["sql"])
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(f"EXPLAIN {sql}")
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        self.assertIn("partner_name_prefix_idx", plan)
+        self.assertIn("partner_kana_prefix_idx", plan)
+
+
+class PartnerFacetTests(TestCase):
+    '''
+    一覧の facets=partner_type,state が、各項目について「他の項目の絞り込みだけを効かせた件数」を1クエリで返すことを確認する
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(tenant_name="テナント", representative_name="代表者", email="t@example.com")
+        cls.user = User.objects.create_user(email="facets@example.com", password="pw-12345678", tenant=cls.tenant)
+        rows = [
+            ("customer", "東京都", False), ("customer", "東京都", False), ("customer", "大阪府", False),
+            ("supplier", "東京都", False), ("supplier", None, False), ("both", "東京都", True),
+        ]
+        Partner.objects.bulk_create(
+            Partner(tenant=cls.tenant, partner_name=f"取引先{i}", email=f"p{i}@example.com",
+                    partner_type=pt, state=state, is_deleted=deleted)
+            for i, (pt, state, deleted) in enumerate(rows)
+        )
+
+    def setUp(self):
+        cache.clear()
+        token = RefreshToken.for_user(self.user).access_token
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+    def facets(self, **params):
+        response = self.client.get("/api/partners/", params, headers=self.headers)
+        data = response.json()
+        return data["count"], {f: {v["value"]: v["count"] for v in values} for f, values in data["facets"].items()}
+
+    def test_counts_ignore_own_selection(self):
+        count, facets = self.facets(facets="partner_type,state", state="東京都")
+        self.assertEqual(count, 3)
+        self.assertEqual(facets["partner_type"], {"customer": 2, "supplier": 1, "both": 0})
+        self.assertEqual(facets["state"], {"東京都": 3, "大阪府": 1, None: 1})
+
+        count, facets = self.facets(facets="state,partner_type", state="東京都", partner_type="customer", include_deleted="1")
+        self.assertEqual(count, 2)
+        self.assertEqual(facets["partner_type"], {"customer": 2, "supplier": 1, "both": 1})
+        self.assertEqual(facets["state"], {"東京都": 2, "大阪府": 1})
+
+    def test_one_extra_query_and_cached_until_write(self):
+        self.client.get("/api/partners/", headers=self.headers)  # 認証キャッシュを温める
+        with self.assertNumQueries(2):
+            self.client.get("/api/partners/", headers=self.headers)
+        with self.assertNumQueries(3):
+            self.client.get("/api/partners/", {"facets": "partner_type,state"}, headers=self.headers)
+        with self.assertNumQueries(2):
+            self.client.get("/api/partners/", {"facets": "partner_type,state"}, headers=self.headers)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                "/api/partners/", {"partner_name": "追加", "email": "new@example.com", "state": "大阪府"},
+                content_type="application/json", headers=self.headers,
+            )
+        _, facets = self.facets(facets="state")
+        self.assertEqual(facets["state"]["大阪府"], 2)
+
+
+class PartnerBulkTests(TestCase):
+    '''
+    POST /api/partners/bulk/ が、件数に関係なく一定のクエリ数で検証・登録し、items と同じ順で結果を返すことを確認する
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(tenant_name="テナント", representative_name="代表者", email="t@example.com")
+        cls.user = User.objects.create_user(email="bulk@example.com", password="pw-12345678", tenant=cls.tenant)
+        cls.existing = Partner.objects.create(tenant=cls.tenant, partner_name="既存", email="old@example.com")
+        Partner.objects.create(tenant=cls.tenant, partner_name="削除済", email="gone@example.com", is_deleted=True)
+        reconcile([cls.tenant.pk])
+
+    def setUp(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+    def post(self, body):
+        return self.client.post("/api/partners/bulk/", body, content_type="application/json", headers=self.headers)
+
+    def test_create_in_constant_queries(self):
+        self.post([{"partner_name": "温め", "email": "warm@example.com"}])  # 認証キャッシュを温める
+        with CaptureQueriesContext(connection) as small:
+            self.post([{"partner_name": "小", "email": "s@example.com"}])
+        with self.assertNumQueries(len(small)):
+            response = self.post([{"partner_name": f"取引先{i}", "email": f"p{i}@example.com"} for i in range(50)])
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["created"], len(data["results"])), (50, 50))
+        self.assertEqual(Partner.objects.get(pk=data["results"][7]["id"]).email, "p7@example.com")
+        self.assertEqual(reconcile([self.tenant.pk], fix=False), [])
+
+    def test_all_or_nothing_rejects_with_index_aligned_errors(self):
+        items = [
+            {"partner_name": "新規", "email": "new@example.com"},
+            {"partner_name": "既存", "email": "old@example.com"},
+            {"partner_name": "新規", "email": "new@example.com"},
+            {"partner_name": "不正", "email": "not-an-email"},
+        ]
+        response = self.post({"items": items})
+        self.assertEqual(response.status_code, 400)
+        results = response.json()["results"]
+        self.assertEqual([r["status"] for r in results], ["skipped", "error", "error", "error"])
+        self.assertIn("email", results[3]["errors"])
+        self.assertFalse(Partner.objects.filter(email="new@example.com").exists())
+
+        response = self.post({"items": items, "policy": "partial"})
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([r["status"] for r in response.json()["results"]], ["created", "error", "error", "error"])
+        self.assertTrue(Partner.objects.filter(email="new@example.com").exists())
+
+    def test_upsert_updates_existing_rows(self):
+        items = [
+            {"partner_name": "既存", "email": "old@example.com", "partner_type": "supplier", "city": "横浜市"},
+            {"partner_name": "追加", "email": "add@example.com"},
+            {"partner_name": "削除済", "email": "gone@example.com"},
+        ]
+        response = self.post({"items": items, "upsert": True, "policy": "partial"})
+        results = response.json()["results"]
+        self.assertEqual([r["status"] for r in results], ["updated", "created", "error"])
+        self.assertEqual(results[0]["id"], self.existing.pk)
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.partner_type, self.existing.city), ("supplier", "横浜市"))
+        self.assertEqual(reconcile([self.tenant.pk], fix=False), [])
+        self.assertEqual(TenantStats.objects.get(tenant=self.tenant, partner_type="supplier", is_deleted=False).partner_count, 1)
+
+    def test_rejects_too_many_items(self):
+        with self.settings(PARTNER_BULK_MAX_ITEMS=2):
+            response = self.post([{"partner_name": f"取引先{i}", "email": f"p{i}@example.com"} for i in range(3)])
+        self.assertEqual(response.status_code, 400)
+
+
+class PartnerDirtySaveTests(TestCase):
+    '''
+    更新時に変更された列だけを UPDATE し、変更がなければ行を書き換えない（更新日時も変わらない）ことを確認する
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(tenant_name="テナント", representative_name="代表者", email="t@example.com")
+        cls.user = User.objects.create_user(email="dirty@example.com", password="pw-12345678", tenant=cls.tenant)
+        cls.partner = Partner.objects.create(tenant=cls.tenant, partner_name="取引先", email="p@example.com", city="横浜市")
+
+    def setUp(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+    def patch(self, body):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.patch(
+                f"/api/partners/{self.partner.pk}/", body, content_type="application/json", headers=self.headers,
+            )
+        self.assertEqual(response.status_code, 200)
+        return [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]
+
+    def test_patch_updates_only_changed_columns(self):
+        updates = self.patch({"contact_name": "担当"})
+        self.assertEqual(len(updates), 1)
+        assigned = re.findall(r'"(\w+)" = ', updates[0].split(" WHERE ")[0])
+        self.assertEqual(sorted(assigned), ["contact_name", "update_user_id", "updated_at"])
+
+    def test_noop_patch_does_not_touch_row(self):
+        before = Partner.objects.get(pk=self.partner.pk).updated_at
+        self.assertEqual(self.patch({"city": "横浜市", "partner_name": "取引先"}), [])
+        self.assertEqual(Partner.objects.get(pk=self.partner.pk).updated_at, before)
+
+
+class PartnerDuplicateTests(TestCase):
+    '''
+    名称の表記ゆれ（法人格・全角半角）や電話番号の一致から重複候補をまとめ、CSV取込でも確認できることを確認する
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(tenant_name="テナント", representative_name="代表者", email="t@example.com")
+        cls.user = User.objects.create_user(email="dup@example.com", password="pw-12345678", tenant=cls.tenant)
+        Partner.objects.bulk_create([
+            Partner(tenant=cls.tenant, partner_name="株式会社ABC", email="sales@abc.co.jp", tel_number="03-1234-5678"),
+            Partner(tenant=cls.tenant, partner_name="(株)ＡＢＣ", email="info@abc.co.jp"),
+            Partner(tenant=cls.tenant, partner_name="エービーシー物流", partner_name_kana="ｴｰﾋﾞｰｼｰﾌﾞﾂﾘｭｳ",
+                    email="x@example.com", tel_number="0312345678"),
+            Partner(tenant=cls.tenant, partner_name="山田商店", email="yamada@example.com"),
+            Partner(tenant=cls.tenant, partner_name="ABC Co., Ltd.", email="old@abc.co.jp", is_deleted=True),
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.headers = {"Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    def test_clusters_normalized_names(self):
+        data = self.client.get("/api/partners/duplicates/", headers=self.headers).json()
+        self.assertEqual(data["count"], 1)
+        cluster = data["results"][0]
+        self.assertEqual(sorted(m["partner_name"] for m in cluster["members"]), ["(株)ＡＢＣ", "株式会社ABC"])
+        self.assertEqual(cluster["pairs"][0]["reasons"], ["name", "email_domain"])
+
+        # 電話番号だけが同じ取引先も、しきい値を下げれば候補になる
+        data = self.client.get("/api/partners/duplicates/", {"threshold": "0.2"}, headers=self.headers).json()
+        self.assertEqual(len(data["results"][0]["members"]), 3)
+
+    def test_csv_import_check(self):
+        body = ",".join(CSV_HEADERS) + "\n"
+        body += "ＡＢＣ株式会社,,顧客,,,new@abc.co.jp,,,,,,\n"
+        body += "鈴木工業,,顧客,,,s1@example.com,,,,,,\n"
+        body += "鈴木工業(株),,顧客,,,s2@example.com,,,,,,\n"
+
+        def upload(**extra):
+            file = SimpleUploadedFile("partners.csv", body.encode("utf-8"), content_type="text/csv")
+            return self.client.post("/api/partners/import/", {"file": file, **extra}, headers=self.headers)
+
+        errors = upload(check_duplicates="1").content.decode("utf-8-sig")
+        self.assertIn("重複の可能性がある取引先があります: 株式会社ABC（ID ", errors)
+        self.assertIn("鈴木工業（3行目）", errors)
+        self.assertEqual(upload().json(), {"count": 3})
+
+
+    def test_pairs_scored_once_per_generation(self):
+        # 最初の1回だけ比較し、しきい値を変えてもキャッシュした組を絞り込むだけ（クエリを発行しない）
+        with self.assertNumQueries(2):
+            self.assertEqual(len(duplicate_clusters(self.tenant, threshold=0.6)), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(duplicate_clusters(self.tenant, threshold=0.2)[0]["members"]), 3)
+            self.assertEqual(len(duplicate_clusters(self.tenant, threshold=0.21)[0]["members"]), 3)
+        self.assertEqual(normalize_threshold(0.61), 0.6)
+        self.assertEqual(normalize_threshold(0.05), 0.2)
+
+        # 取引先を書き込むと（コミット後に）世代が上がり、比較し直す
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/partners/", {"partner_name": "ＡＢＣ株式会社", "email": "new@abc.co.jp"},
+                content_type="application/json", headers=self.headers,
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(duplicate_clusters(self.tenant, threshold=0.6)[0]["members"]), 3)
+
+
+class PartnerDuplicateBackgroundTests(TransactionTestCase):
+    '''
+    取引先の多いテナントは重複候補をバックグラウンドで比較し、終わるまで 202 を返すことを確認する
+    '''
+
+    def setUp(self):
+        cache.clear()
+        self.tenant = Tenant.objects.create(tenant_name="テナント", representative_name="代表者", email="t@example.com")
+        self.user = User.objects.create_user(email="dup-bg@example.com", password="pw-12345678", tenant=self.tenant)
+        self.headers = {"Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+        Partner.objects.bulk_create([
+            Partner(tenant=self.tenant, partner_name="株式会社ABC", email="sales@abc.co.jp"),
+            Partner(tenant=self.tenant, partner_name="(株)ＡＢＣ", email="info@abc.co.jp"),
+        ])
+        reconcile([self.tenant.pk])
+
+    def get(self):
+        return self.client.get("/api/partners/duplicates/", headers=self.headers)
+
+    @override_settings(PARTNER_DUPLICATES_INLINE_MAX=1)
+    def test_large_tenant_built_in_background(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["status"], "building")
+        self.join_build()
+
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 1)
+
+
+    def join_build(self):
+        for thread in threading.enumerate():
+            if thread.name == f"partner-duplicates-{self.tenant.pk}":
+                thread.join(timeout=30)
+
+    @override_settings(PARTNER_DUPLICATES_INLINE_MAX=1)
+    def test_build_result_not_cached_under_newer_generation(self):
+        # 取引先テーブルをロックして比較を止めている間に世代を上げる
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f"LOCK TABLE {Partner._meta.db_table} IN ACCESS EXCLUSIVE MODE")
+            self.assertIsNone(duplicate_clusters(self.tenant))
+            bump_tenant_generation(self.tenant.id, "partner")
+        self.join_build()
+
+        # 比較前の世代の結果は使わず、新しい世代でもう一度比較する
+        self.assertEqual(self.get().status_code, 202)
+        self.join_build()
+        self.assertEqual(self.get().json()["count"], 1)
+
+class PartnerContactSearchTests(TestCase):
+    '''
+    電話番号・Email の検索用の列が登録・更新・一括登録・CSV取込で作られ、q= の電話番号・Email 検索に使われることを確認する
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(tenant_name="テナント", representative_name="代表者", email="t@example.com")
+        cls.user = User.objects.create_user(email="search@example.com", password="pw-12345678", tenant=cls.tenant)
+        Partner.objects.bulk_create([
+            Partner(tenant=cls.tenant, partner_name="東京商事", email="Sales@ABC.co.jp", tel_number="03-1234-5678"),
+            Partner(tenant=cls.tenant, partner_name="大阪商事", email="info@xyz.jp", tel_number="06-1234-5678"),
+            Partner(tenant=cls.tenant, partner_name="0312商店", email="shop@example.com"),
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.headers = {"Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    def search(self, q):
+        data = self.client.get("/api/partners/", {"q": q}, headers=self.headers).json()
+        return sorted(p["partner_name"] for p in data["results"])
+
+    def test_keys_maintained_on_write(self):
+        partner = Partner.objects.get(partner_name="東京商事")
+        self.assertEqual(
+            (partner.tel_digits, partner.email_lower, partner.email_domain), ("0312345678", "sales@abc.co.jp", "abc.co.jp"),
+        )
+        partner.tel_number = "03-9999-0000"
+        partner.save()
+        self.assertIn("tel_digits", partner.last_saved_fields)
+        partner.email = "Office@Def.jp"
+        partner.save(update_fields=["email"])
+        partner.refresh_from_db()
+        self.assertEqual(
+            (partner.tel_digits, partner.email_lower, partner.email_domain), ("0399990000", "office@def.jp", "def.jp"),
+        )
+
+        body = ",".join(CSV_HEADERS) + "\n" + "名古屋商事,,顧客,,052-111-2222,Nagoya@Example.com,,,,,,\n"
+        file = SimpleUploadedFile("partners.csv", body.encode("utf-8"), content_type="text/csv")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/partners/import/", {"file": file}, headers=self.headers)
+        self.assertEqual(
+            Partner.objects.filter(partner_name="名古屋商事").values_list("tel_digits", "email_domain").get(),
+            ("0521112222", "example.com"),
+        )
+
+    def test_csv_import_keeps_unicode_line_separators_in_values(self):
+        # CR / LF 以外の改行扱いの文字（NEL・LINE SEPARATOR など）は値の一部として読む
+        body = ",".join(CSV_HEADERS) + "\r\n"
+        body += "京都\x85商事,,顧客,担当\u2028者,,kyoto@example.com,,,,,,\r\n"
+        body += '"奈良\r\n商事",,顧客,\x0c,,nara@example.com,,,,,,\r\n'
+        file = SimpleUploadedFile("partners.csv", ("\ufeff" + body).encode("utf-8"), content_type="text/csv")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/partners/import/", {"file": file}, headers=self.headers)
+        self.assertEqual(response.json(), {"count": 2})
+        self.assertEqual(
+            Partner.objects.filter(email="kyoto@example.com").values_list("partner_name", "contact_name").get(),
+            ("京都\x85商事", "担当\u2028者"),
+        )
+        self.assertEqual(Partner.objects.get(email="nara@example.com").partner_name, "奈良\r\n商事")
+
+    def test_backfill_in_batches(self):
+        # マイグレーションの埋め直しは主キー順にバッチで進め、全行を埋める
+        Partner.objects.update(tel_digits="", email_lower="", email_domain="")
+        with CaptureQueriesContext(connection) as ctx:
+            backfill_search_keys(Partner, connection, batch_size=2)
+        self.assertEqual(len(ctx.captured_queries), 3)
+        self.assertEqual(
+            sorted(Partner.objects.values_list("tel_digits", "email_domain")),
+            [("", "example.com"), ("0312345678", "abc.co.jp"), ("0612345678", "xyz.jp")],
+        )
+
+    def test_query_routing(self):
+        # 数字（区切り・全角を問わない）は電話番号の前方一致。名称の数字には当たらない
+        self.assertEqual(self.search("0312345678"), ["東京商事"])
+        self.assertEqual(self.search("０３－１２３４"), ["東京商事"])
+        self.assertEqual(self.search("0312"), ["東京商事"])
+        # 「@」・ドメインは Email の前方一致（大文字小文字を区別しない）
+        self.assertEqual(self.search("sales@abc"), ["東京商事"])
+        self.assertEqual(self.search("@ABC.co.jp"), ["東京商事"])
+        self.assertEqual(self.search("xyz.jp"), ["大阪商事"])
+        # それ以外（3桁以下の数字を含む）は従来どおり部分一致
+        self.assertEqual(self.search("商事"), ["大阪商事", "東京商事"])
+        self.assertEqual(self.search("031"), ["0312商店"])
+
+
+class PartnerArchiveTests(TestCase):
+    '''
+    保持期間を過ぎた削除済みの取引先がバッチでアーカイブへ移り、一覧（include_deleted=1）・詳細・復元から扱えることを確認する
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(tenant_name="テナント", representative_name="代表者", email="t@example.com")
+        cls.other = Tenant.objects.create(tenant_name="他テナント", representative_name="代表者", email="o@example.com")
+        cls.user = User.objects.create_user(email="archive@example.com", password="pw-12345678", tenant=cls.tenant)
+        Partner.objects.bulk_create(
+            [Partner(tenant=cls.tenant, partner_name=f"古い{i}", email=f"old{i}@example.com", is_deleted=True) for i in range(5)]
+            + [
+                Partner(tenant=cls.tenant, partner_name="最近削除", email="recent@example.com", is_deleted=True),
+                Partner(tenant=cls.tenant, partner_name="有効", email="live@example.com"),
+                Partner(tenant=cls.other, partner_name="古い0", email="old0@example.com", is_deleted=True),
+            ]
+        )
+        Partner.objects.filter(partner_name__startswith="古い").update(updated_at=timezone.now() - timedelta(days=400))
+
+    def setUp(self):
+        cache.clear()
+        self.headers = {"Authorization": f"Bearer {RefreshToken.for_user(self.user).access_token}"}
+
+    def archive(self):
+        out = io.StringIO()
+        call_command("archive_deleted", batch_size=2, sleep=0, stdout=out)
+        return out.getvalue()
+
+    def request(self, method, path, **params):
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.client, method)(path, params, headers=self.headers)
+
+    def test_archive_moves_old_deleted_rows_in_batches(self):
+        output = self.archive()
+        self.assertIn("batch 3 moved 2 rows", output)  # 他テナントを含む6件を2件ずつ
+        self.assertIn("archived 6 rows", output)
+        self.assertEqual(PartnerArchive.objects.count(), 6)
+        self.assertEqual(
+            sorted(Partner.objects.values_list("partner_name", flat=True)), ["最近削除", "有効"],
+        )
+        self.assertEqual(self.archive().count("batch"), 0)
+
+    def test_list_and_retrieve_include_archived_rows(self):
+        self.archive()
+        archived = PartnerArchive.objects.get(tenant=self.tenant, partner_name="古い0")
+        self.assertEqual(self.request("get", "/api/partners/").json()["count"], 1)
+        data = self.request("get", "/api/partners/", include_deleted="1").json()
+        self.assertEqual(data["count"], 7)
+
+        self.assertEqual(self.request("get", f"/api/partners/{archived.pk}/").status_code, 404)
+        response = self.request("get", f"/api/partners/{archived.pk}/?include_deleted=1")
+        self.assertEqual(response.json()["partner_name"], "古い0")
+
+        response = self.client.patch(
+            f"/api/partners/{archived.pk}/?include_deleted=1", {"contact_name": "x"},
+            content_type="application/json", headers=self.headers,
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("restore", response.json()["detail"])
+
+    def test_restore_from_archive(self):
+        self.archive()
+        archived = PartnerArchive.objects.get(tenant=self.tenant, partner_name="古い1")
+        response = self.request("post", f"/api/partners/{archived.pk}/restore/")
+        self.assertEqual(response.status_code, 200)
+        partner = Partner.objects.get(pk=archived.pk)
+        self.assertEqual((partner.partner_name, partner.is_deleted, partner.update_user_id), ("古い1", False, self.user.pk))
+        self.assertFalse(PartnerArchive.objects.filter(pk=archived.pk).exists())
+
+        # 他テナントの行・存在しない行は 404
+        other = PartnerArchive.objects.get(tenant=self.other)
+        self.assertEqual(self.request("post", f"/api/partners/{other.pk}/restore/").status_code, 404)
+        self.assertEqual(self.request("post", "/api/partners/999999/restore/").status_code, 404)
+
+    def test_restore_conflict_keeps_archived_row(self):
+        self.archive()
+        archived = PartnerArchive.objects.get(tenant=self.tenant, partner_name="古い2")
+        Partner.objects.create(tenant=self.tenant, partner_name="古い2", email="old2@example.com")
+        response = self.request("post", f"/api/partners/{archived.pk}/restore/")
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(PartnerArchive.objects.filter(pk=archived.pk).exists())
+        self.assertFalse(Partner.objects.filter(pk=archived.pk).exists())
+
+
+class PartnerArchiveLockTests(TransactionTestCase):
+    '''
+    他のトランザクションが掴んでいる行はアーカイブで飛ばす（SKIP LOCKED）ことを確認する（コミット済みの行が必要なため TransactionTestCase）
+    '''
+
+    def test_locked_rows_are_skipped(self):
+        tenant = Tenant.objects.create(tenant_name="テナント", representative_name="代表者", email="t@example.com")
+        Partner.objects.bulk_create(
+            Partner(tenant=tenant, partner_name=f"古い{i}", email=f"old{i}@example.com", is_deleted=True) for i in range(3)
+        )
+        Partner.objects.update(updated_at=timezone.now() - timedelta(days=400))
+        locked = Partner.objects.order_by("id").first()
+
+        other = connections.create_connection(DEFAULT_DB_ALIAS)
+        try:
+            other.set_autocommit(False)
+            with other.cursor() as cursor:
+                cursor.execute(f"SELECT 1 FROM {Partner._meta.db_table} WHERE id = %s FOR UPDATE", [locked.pk])
+                moved = archive_batch(Partner, cutoff=timezone.now() - timedelta(days=365), batch_size=10)
+            other.rollback()
+        finally:
+            other.close()
+
+        self.assertEqual(moved, 2)
+        self.assertEqual(list(Partner.objects.values_list("pk", flat=True)), [locked.pk])
+        self.assertEqual(archive_batch(Partner, cutoff=timezone.now() - timedelta(days=365), batch_size=10), 1)
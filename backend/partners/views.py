@@ -1,18 +1,31 @@
 import csv
+import time
+from django.conf import settings
+from django.core.cache import cache
 from django.http import HttpResponse
-from django.shortcuts import get_object_or_404
+from django.db import IntegrityError, transaction
 from django.db.models import Q
+from django.http import Http404
 
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser
 
+from api.cache import tenant_cache_key
+from api.changefeed import publish_instance_change
+from api.metrics import record_export
 from config.settings import MAX_EXPORT_ROWS
-from .models import Partner
+from api.archive import unarchive
+from .duplicates import DEFAULT_THRESHOLD, duplicate_clusters, normalize_threshold
+from .filters import parse_facets, partner_facets, partner_queryset
+from .models import Partner, PartnerArchive
 from .serializers import Serializer
+from partners.services.partner_bulk_writer import POLICIES, PartnerBulkWriter
 from partners.services.partner_csv_importer import CsvImporter, CSV_HEADERS
+from partners.services.partner_csv_exporter import partner_csv_row
 
 
 class PartnerViewSet(viewsets.ModelViewSet):
@@ -20,12 +33,16 @@ class PartnerViewSet(viewsets.ModelViewSet):
     取引先(Partner)のCRUD + CSV入出力を提供する ViewSet。
 
     - 認可: ログイン済みユーザーのみ (IsAuthenticated)
-    - テナント分離: request.user.tenant に属するデータのみを扱う
+    - テナント分離: request.tenant（認証時に解決済み）に属するデータのみを扱う
     - 論理削除: destroy() は物理削除ではなく is_deleted=True にする
     - 追加機能:
         - restore: 論理削除の復元
         - export_csv: CSVエクスポート
         - import_csv: CSVインポート
+        - bulk: JSON での一括登録・更新
+        - suggest: 取引先名称/カナの前方一致サジェスト
+        - duplicates: 重複の可能性がある取引先のグループ
+        - 一覧の facets=partner_type,state: 絞り込み候補ごとの件数
     """
 
     # このViewSetが使用するSerializer
@@ -51,50 +68,83 @@ class PartnerViewSet(viewsets.ModelViewSet):
     ordering = ["partner_name"]
 
     def get_queryset(self):
-        # まずはテナント分離（他テナントのデータを見せない）
-        qs = Partner.objects.filter(tenant=self.request.user.tenant)
-
+        # テナント分離（他テナントのデータを見せない）
         # include_deleted=1 のときだけ削除済みも含める
-        include_deleted = self.request.query_params.get("include_deleted")
-        if include_deleted != "1":
-            qs = qs.filter(is_deleted=False)
-
-        # 取引先区分（partner_type）フィルタ
-        # 想定外の値は無視（400にはせず、単に絞り込みしない）
-        partner_type = (self.request.query_params.get("partner_type") or "").strip()
-        if partner_type:
-            allowed = {"customer", "supplier", "both"}
-            if partner_type in allowed:
-                qs = qs.filter(partner_type=partner_type)
-            # else: 不正値は無視
-
-        # フリーワード検索（部分一致）
-        q = (self.request.query_params.get("q") or "").strip()
-        if q:
-            qs = qs.filter(
-                Q(partner_name__icontains=q)
-                | Q(partner_name_kana__icontains=q)
-                | Q(contact_name__icontains=q)
-                | Q(email__icontains=q)
-                | Q(tel_number__icontains=q)
-            )
-        return qs
+        # 一覧/CSV出力で削除済みも含める場合は、アーカイブ済みの行も合わせて返す
+        return partner_queryset(self.request, include_archive=self.action in ("list", "export_csv"))
+
+    def list(self, request, *args, **kwargs):
+        """
+        一覧
+        - facets=partner_type,state を指定すると、候補ごとの件数を "facets" に付けて返す
+        """
+        response = super().list(request, *args, **kwargs)
+        fields = parse_facets(request.query_params)
+        if fields and isinstance(response.data, dict):
+            response.data["facets"] = partner_facets(request, fields)
+        return response
+
+    def paginate_queryset(self, queryset):
+        """
+        ページング処理
+        - 全行が request.tenant に属するため、テナントは行ごとに引かずに使い回す
+          （アーカイブとの union では select_related が使えないため、ここで補う）
+        """
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            for obj in page:
+                obj.tenant = self.request.tenant
+        return page
+
+    def get_object(self):
+        """
+        詳細/更新/削除の対象取得（テナントは取得済みの request.tenant を使い回す）
+        - include_deleted=1 の詳細は、アーカイブ済みの行も返す（参照のみ）
+        - アーカイブ済みの行の更新・削除は、restore で戻すまで 404（その旨を detail で返す）
+        """
+        try:
+            obj = super().get_object()
+        except Http404:
+            archived = self.get_archived_object()
+            if archived is None:
+                raise
+            if self.action != "retrieve":
+                raise NotFound("アーカイブ済みの取引先です。restore で復元してから操作してください")
+            obj = archived
+        obj.tenant = self.request.tenant
+        return obj
+
+    def get_archived_object(self):
+        """
+        include_deleted=1 のときの、アーカイブ済みの行（なければ None）
+        """
+        if self.request.query_params.get("include_deleted") != "1":
+            return None
+        try:
+            pk = int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except (TypeError, ValueError):
+            return None
+        return PartnerArchive.objects.for_tenant(self.request.tenant, include_deleted=True).filter(pk=pk).first()
 
     def perform_create(self, serializer):
         """
         データ登録処理
         """
         serializer.save(
-            tenant=self.request.user.tenant,
+            tenant=self.request.tenant,
             create_user=self.request.user,
             update_user=self.request.user,
         )
+        publish_instance_change(serializer.instance, "create")
 
     def perform_update(self, serializer):
         """
         データ更新処理
         """
         serializer.save(update_user=self.request.user)
+        # 変更された項目だけを保存する（変更がなければ行を書き換えず、通知もしない）
+        if serializer.instance.last_saved_fields:
+            publish_instance_change(serializer.instance, "update")
 
     def destroy(self, request, *args, **kwargs):
         """
@@ -104,6 +154,7 @@ class PartnerViewSet(viewsets.ModelViewSet):
         obj.is_deleted = True
         obj.update_user = request.user
         obj.save(update_fields=["is_deleted", "update_user", "updated_at"])
+        publish_instance_change(obj, "delete")
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=["post"])
@@ -112,17 +163,95 @@ class PartnerViewSet(viewsets.ModelViewSet):
         論理削除されたレコードを復元するアクション。
         """
         # self.get_object() は get_queryset() のフィルタが効いて削除済を拾えないのでNG
-        obj = get_object_or_404(Partner.objects.all(), pk=pk)
-        obj.is_deleted = False
-        obj.update_user = request.user
-        obj.save(update_fields=["is_deleted", "update_user", "updated_at"])
+        qs = Partner.objects.for_tenant(request.tenant, include_deleted=True)
+
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise Http404
+
+        # アーカイブ済みであれば、まず取引先マスタへ戻す（戻す処理と復元の保存は1つのトランザクションで行う）
+        try:
+            with transaction.atomic():
+                if not qs.filter(pk=pk).exists() and not unarchive(Partner, tenant=request.tenant, pk=pk):
+                    raise Http404
+                obj = qs.get(pk=pk)
+                obj.is_deleted = False
+                obj.update_user = request.user
+                obj.save(update_fields=["is_deleted", "update_user", "updated_at"])
+        except IntegrityError:
+            return Response(
+                {"detail": "既に同じ取引先名称+Emailが登録されているため復元できません"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        publish_instance_change(obj, "restore")
         return Response(self.get_serializer(obj).data, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=["get"], url_path="suggest")
+    def suggest(self, request):
+        """
+        取引先名称/カナの前方一致サジェスト
+        - 他画面の取引先選択用（件数取得・ページングなし）
+        - UPPER(col) の text_pattern_ops 部分インデックスで前方一致を引く
+        - テナント単位の短期メモキャッシュ（書き込み時に世代が上がり無効化される）
+        """
+        prefix = (request.query_params.get("prefix") or "").strip()
+        if not prefix:
+            return Response([])
+
+        try:
+            limit = int(request.query_params.get("limit") or settings.PARTNER_SUGGEST_LIMIT)
+        except ValueError:
+            limit = settings.PARTNER_SUGGEST_LIMIT
+        limit = max(1, min(limit, settings.PARTNER_SUGGEST_MAX_LIMIT))
+
+        tenant_id = request.tenant.id
+        key = tenant_cache_key("partner_suggest", tenant_id, "partner", prefix.upper(), limit)
+        data = cache.get(key)
+        if data is None:
+            qs = (
+                Partner.objects
+                .for_tenant(request.tenant)
+                .filter(Q(partner_name__istartswith=prefix) | Q(partner_name_kana__istartswith=prefix))
+                .order_by("partner_name", "id")
+                .values("id", "partner_name", "partner_name_kana", "partner_type")[:limit]
+            )
+            data = list(qs)
+            cache.set(key, data, timeout=settings.PARTNER_SUGGEST_CACHE_SECONDS)
+        return Response(data)
+
+    @action(detail=False, methods=["get"], url_path="duplicates")
+    def duplicates(self, request):
+        """
+        重複の可能性がある取引先のグループ（未削除の取引先が対象）
+        - threshold: 0.2〜1（既定 0.6。大きいほど確度の高いものだけ。0.05 刻みに丸める）
+        - limit: 返すグループ数の上限（既定 100）
+        - 名称の表記ゆれ（法人格・全角半角）や、電話番号・郵便番号・Email の一致から判定する（partners.duplicates）
+        - 取引先の多いテナントはバックグラウンドで比較し、終わるまでは 202（status=building）を返す
+        """
+        try:
+            threshold = float(request.query_params.get("threshold") or DEFAULT_THRESHOLD)
+            limit = int(request.query_params.get("limit") or 100)
+        except ValueError:
+            return Response({"detail": "threshold / limit の形式が正しくありません"}, status=400)
+        threshold = normalize_threshold(threshold)
+        limit = max(1, min(limit, 1000))
+
+        clusters = duplicate_clusters(request.tenant, threshold=threshold)
+        if clusters is None:
+            return Response(
+                {"status": "building", "detail": "重複候補を集計しています。しばらくしてから再度取得してください。"},
+                status=status.HTTP_202_ACCEPTED,
+            )
+        return Response({"count": len(clusters), "threshold": threshold, "results": clusters[:limit]})
+
     @action(detail=False, methods=["get"], url_path="export")
     def export_csv(self, request):
         """
         CSV出力処理
         """
+        started = time.perf_counter()
+
         # 件数制限処理
         qs = self.get_queryset()[:MAX_EXPORT_ROWS]
 
@@ -136,24 +265,12 @@ class PartnerViewSet(viewsets.ModelViewSet):
         writer.writerow(CSV_HEADERS)
 
         # データ行を書き込み
+        rows = 0
         for p in qs:
-            writer.writerow(
-                [
-                    p.partner_name,
-                    p.partner_name_kana or "",
-                    p.get_partner_type_display(), # 取引先区分は区分値ではなく日本語を表示
-                    p.contact_name or "",
-                    p.tel_number or "",
-                    p.email,
-                    p.postal_code or "",
-                    p.state or "",
-                    p.city or "",
-                    p.address or "",
-                    p.address2 or "",
-                    "1" if p.is_deleted else "0",
-                ]
-            )
+            writer.writerow(partner_csv_row(p))
+            rows += 1
 
+        record_export("partner", rows=rows, nbytes=len(response.content), seconds=time.perf_counter() - started)
         return response
 
     @action(detail=False, methods=["post"], url_path="import", parser_classes=[MultiPartParser, FormParser])
@@ -167,5 +284,35 @@ class PartnerViewSet(viewsets.ModelViewSet):
             return Response({"detail": "CSVファイルが指定されていません"}, status=400)
 
         # 実処理はサービス層に委譲
-        importer = CsvImporter(request=request, file=file)
-        return importer.run()
\ No newline at end of file
+        # check_duplicates=1 のときは、既存の取引先・CSV内で重複の可能性がある行もエラーにする
+        check_duplicates = str(request.data.get("check_duplicates", "")).lower() in ("1", "true", "on")
+        importer = CsvImporter(request=request, file=file, check_duplicates=check_duplicates)
+        return importer.run()
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        """
+        JSON での一括登録・更新
+        - 本文: {"items": [取引先, ...], "policy": "all_or_nothing" | "partial", "upsert": true | false}
+          （配列だけを送った場合は all_or_nothing・upsert なし）
+        - 結果は items と同じ順の "results" で返す
+        """
+        data = request.data
+        if isinstance(data, list):
+            data = {"items": data}
+        if not isinstance(data, dict) or not isinstance(data.get("items"), list):
+            return Response({"detail": "items に取引先の配列を指定してください"}, status=400)
+
+        items = data["items"]
+        if not items:
+            return Response({"detail": "items が空です"}, status=400)
+        if len(items) > settings.PARTNER_BULK_MAX_ITEMS:
+            return Response({"detail": f"一度に登録できるのは {settings.PARTNER_BULK_MAX_ITEMS} 件までです"}, status=400)
+
+        policy = data.get("policy") or POLICIES[0]
+        if policy not in POLICIES:
+            return Response({"detail": f"policy は {' / '.join(POLICIES)} のいずれかを指定してください"}, status=400)
+
+        # 実処理はサービス層に委譲
+        writer = PartnerBulkWriter(request=request, items=items, policy=policy, upsert=data.get("upsert") is True)
+        return writer.run()
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from .async_views import tenant_detail, tenant_list
+
+urlpatterns = [
+    path("", tenant_list),
+    path("<int:pk>/", tenant_detail),
+]
@@ -0,0 +1,29 @@
+from django.shortcuts import aget_object_or_404
+
+from api.async_views import apaginate, async_api_view, get_ordering, json_response
+from .filters import tenant_queryset
+from .serializers import TenantSerializer
+from .views import TenantViewSet
+
+
+def _serialize(rows):
+    return TenantSerializer(rows, many=True).data
+
+
+@async_api_view(auth_required=False)
+async def tenant_list(request):
+    """
+    テナント一覧（TenantViewSet.list の非同期版）
+    """
+    qs = tenant_queryset(request.GET)
+    qs = qs.order_by(*get_ordering(request, TenantViewSet.ordering_fields, TenantViewSet.ordering))
+    return json_response(await apaginate(request, qs, _serialize))
+
+
+@async_api_view(auth_required=False)
+async def tenant_detail(request, pk):
+    """
+    テナント詳細（TenantViewSet.retrieve の非同期版）
+    """
+    obj = await aget_object_or_404(tenant_queryset(request.GET), pk=pk)
+    return json_response(_serialize([obj])[0])
@@ -0,0 +1,33 @@
+from django.db.models import Q
+
+from api.base import contact_search_q
+
+from .models import Tenant
+
+
+def tenant_queryset(params):
+    '''
+    テナントの一覧用クエリセット
+    - params: クエリパラメータ（request.query_params / request.GET）
+    - include_deleted=1 のときだけ削除済みも含める
+    - 取引先件数（TenantStats）はページ分をまとめて1クエリで取得する
+    '''
+    qs = Tenant.objects.all().prefetch_related("stats").order_by("tenant_code")
+
+    include_deleted = params.get("include_deleted", "0")
+    if include_deleted != "1":
+        qs = qs.filter(is_deleted=False)
+
+    # 電話番号・Email らしい入力は検索用の列の前方一致、それ以外は部分一致
+    q = params.get("q", "").strip()
+    contact_q = contact_search_q(q) if q else None
+    if contact_q is not None:
+        qs = qs.filter(contact_q)
+    elif q:
+        qs = qs.filter(
+            Q(tenant_name__icontains=q) |
+            Q(representative_name__icontains=q) |
+            Q(email__icontains=q) |
+            Q(tel_number__icontains=q)
+        )
+    return qs
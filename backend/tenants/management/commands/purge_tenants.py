@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from tenants.models import Tenant, TenantPurgeJob
+from tenants.purge import job_lock, run_job, start_purge
+
+
+class Command(BaseCommand):
+    help = (
+        "Run pending tenant purge jobs (created by POST /api/tenants/<id>/purge/ or --tenant), deleting the tenant's "
+        "rows model by model in small throttled batches; interrupted jobs resume where they stopped"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenant", type=int, action="append", default=[], help="Create a purge job for this tenant id first (repeatable)")
+        parser.add_argument("--job", type=int, action="append", default=[], help="Only run these job ids (repeatable)")
+        parser.add_argument("--target-ms", type=float, default=200, help="Target duration of one batch; the batch size adapts to it")
+        parser.add_argument("--max-batch-size", type=int, default=10_000, help="Upper bound for the adaptive batch size")
+        parser.add_argument("--sleep", type=float, default=0.1, help="Seconds to sleep between batches")
+        parser.add_argument("--max-seconds", type=float, default=0, help="Stop after this many seconds per job (0 = run to completion)")
+        parser.add_argument("--retry-failed", action="store_true", help="Also resume jobs that previously failed")
+
+    def handle(self, *args, **options):
+        for tenant_id in options["tenant"]:
+            tenant = Tenant.objects.filter(pk=tenant_id).first()
+            if tenant is None:
+                raise CommandError(f"テナント {tenant_id} が見つかりません")
+            job, created = start_purge(tenant)
+            self.stdout.write(f"{'Created' if created else 'Existing'} purge job {job.pk} for tenant {tenant_id}")
+
+        statuses = list(TenantPurgeJob.ACTIVE_STATUSES) + (["failed"] if options["retry_failed"] else [])
+        jobs = TenantPurgeJob.objects.filter(status__in=statuses).order_by("created_at")
+        if options["job"]:
+            jobs = jobs.filter(pk__in=options["job"])
+
+        for job in jobs:
+            with job_lock(job) as locked:
+                if locked is None:
+                    self.stdout.write(f"Job {job.pk}: running in another process, skipped")
+                    continue
+                job.refresh_from_db()
+                if job.status == "failed":
+                    job.status = "running"
+                    try:
+                        job.save(update_fields=["status", "updated_at"])
+                    except IntegrityError:
+                        self.stdout.write(f"Job {job.pk}: tenant {job.tenant_id} already has an active job, skipped")
+                        continue
+                self._run(job, options)
+
+    def _run(self, job, options):
+        # 件数は初回の実行で数えるため、未実行のジョブは件数を出さない
+        rows = f", {job.total_rows:,} rows" if job.progress else ""
+        self.stdout.write(f"Job {job.pk}: purging tenant {job.tenant_id} ({job.tenant_name}){rows}")
+
+        def on_batch(job, label, deleted, elapsed_ms):
+            p = job.progress[label]
+            self.stdout.write(
+                f"  {label}: {p['deleted']:,}/{p['total']:,} (+{deleted:,} in {elapsed_ms:.0f}ms, next batch {job.batch_size:,})"
+            )
+
+        try:
+            run_job(
+                job,
+                target_ms=options["target_ms"],
+                max_batch_size=options["max_batch_size"],
+                sleep=options["sleep"],
+                max_seconds=options["max_seconds"],
+                on_batch=on_batch if options["verbosity"] > 1 else None,
+            )
+        except Exception as e:
+            self.stderr.write(self.style.ERROR(f"Job {job.pk}: failed: {e}"))
+            return
+
+        if job.status == "done":
+            self.stdout.write(self.style.SUCCESS(f"Job {job.pk}: deleted {job.deleted_rows:,} rows and tenant {job.tenant_id}"))
+        else:
+            self.stdout.write(f"Job {job.pk}: paused at {job.deleted_rows:,}/{job.total_rows:,} rows (resume by running again)")
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tenants.models import Tenant
+from tenants.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recount partners per tenant and fix drift in the TenantStats table, a batch of tenants at a time"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenant", type=int, action="append", default=[], help="Tenant id (repeatable, default: all tenants)")
+        parser.add_argument("--batch-size", type=int, default=50, help="Tenants recounted per transaction")
+        parser.add_argument("--sleep", type=float, default=0.1, help="Seconds to sleep between batches")
+        parser.add_argument("--dry-run", action="store_true", help="Only report drift, do not fix it")
+
+    def handle(self, *args, **options):
+        tenant_ids = options["tenant"] or list(Tenant.objects.order_by("pk").values_list("pk", flat=True))
+        batch_size = max(1, options["batch_size"])
+
+        drifted = 0
+        for start in range(0, len(tenant_ids), batch_size):
+            batch = tenant_ids[start:start + batch_size]
+            drift = reconcile(batch, fix=not options["dry_run"])
+            for (tenant_id, partner_type, is_deleted), stored, actual in drift:
+                self.stdout.write(
+                    f"tenant {tenant_id} {partner_type} {'deleted' if is_deleted else 'live'}: {stored} -> {actual}"
+                )
+            drifted += len(drift)
+            if start + batch_size < len(tenant_ids):
+                # 集計行をロックするため、他のリクエストへの影響を抑えるよう少し待つ
+                time.sleep(options["sleep"])
+
+        verb = "found" if options["dry_run"] else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"Checked {len(tenant_ids)} tenants, {verb} {drifted} drifted counts"))
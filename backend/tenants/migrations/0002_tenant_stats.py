@@ -0,0 +1,30 @@
+# Generated by Django 5.2.10 on 2026-10-19 03:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TenantStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('partner_type', models.CharField(max_length=20, verbose_name='取引先区分')),
+                ('is_deleted', models.BooleanField(verbose_name='削除フラグ')),
+                ('partner_count', models.BigIntegerField(default=0, verbose_name='取引先件数')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='tenants.tenant', verbose_name='テナント')),
+            ],
+            options={
+                'verbose_name': 'テナント集計',
+                'verbose_name_plural': 'テナント集計',
+                'constraints': [models.UniqueConstraint(fields=('tenant', 'partner_type', 'is_deleted'), name='unique_tenant_stats_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.10 on 2026-10-19 03:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0002_tenant_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TenantPurgeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tenant_id', models.BigIntegerField(db_index=True, verbose_name='テナントID')),
+                ('tenant_name', models.CharField(max_length=100, verbose_name='テナント名称')),
+                ('status', models.CharField(choices=[('pending', '待機中'), ('running', '実行中'), ('done', '完了'), ('failed', '失敗')], default='pending', max_length=10, verbose_name='状態')),
+                ('progress', models.JSONField(default=dict, verbose_name='進捗')),
+                ('batch_size', models.PositiveIntegerField(default=1000, verbose_name='バッチ件数')),
+                ('batches', models.PositiveIntegerField(default=0, verbose_name='実行済みバッチ数')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='エラー内容')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='開始日時')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='終了日時')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('requested_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='依頼者')),
+            ],
+            options={
+                'verbose_name': 'テナント削除ジョブ',
+                'verbose_name_plural': 'テナント削除ジョブ',
+                'ordering': ['-created_at'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'running'])), fields=('tenant_id',), name='unique_active_tenant_purge')],
+            },
+        ),
+    ]
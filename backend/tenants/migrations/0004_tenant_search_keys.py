@@ -0,0 +1,30 @@
+# Generated by Django 5.2.10 on 2026-10-19 03:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0003_tenant_purge_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenant',
+            name='email_domain',
+            field=models.CharField(blank=True, default='', editable=False, max_length=254, verbose_name='メールアドレスのドメイン'),
+        ),
+        migrations.AddField(
+            model_name='tenant',
+            name='email_lower',
+            field=models.CharField(blank=True, default='', editable=False, max_length=254, verbose_name='メールアドレス（小文字）'),
+        ),
+        migrations.AddField(
+            model_name='tenant',
+            name='tel_digits',
+            field=models.CharField(blank=True, default='', editable=False, max_length=20, verbose_name='電話番号（数字のみ）'),
+        ),
+    ]
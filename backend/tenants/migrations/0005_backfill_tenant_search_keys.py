@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from api.base import backfill_search_keys
+
+
+def backfill(apps, schema_editor):
+    '''
+    既存行の検索用の列（電話番号の数字のみ / 小文字の Email / Email のドメイン）を埋める
+    - atomic = False のため、バッチごとにコミットされる（全行をロックしたままにしない）
+    '''
+    backfill_search_keys(apps.get_model("tenants", "Tenant"), schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('tenants', '0004_tenant_search_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
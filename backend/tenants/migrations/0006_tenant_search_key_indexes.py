@@ -0,0 +1,29 @@
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+from api.partitioning import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY はトランザクション内で実行できない
+    atomic = False
+
+    dependencies = [
+        ('tenants', '0005_backfill_tenant_search_keys'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='tenant',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(models.F('tel_digits'), name='text_pattern_ops'), condition=models.Q(('is_deleted', False)), name='tenant_tel_digits_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='tenant',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(models.F('email_lower'), name='text_pattern_ops'), condition=models.Q(('is_deleted', False)), name='tenant_email_lower_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='tenant',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(models.F('email_domain'), name='text_pattern_ops'), condition=models.Q(('is_deleted', False)), name='tenant_email_domain_idx'),
+        ),
+    ]
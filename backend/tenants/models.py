@@ -3,13 +3,23 @@ from django.conf import settings
 from django.db import models
 from django.urls import reverse
 from django.core.validators import RegexValidator
+from api.base import ContactSearchFields, ContactSearchQuerySet, DirtyFieldsMixin, search_key_index
 
-class Tenant(models.Model):
+class Tenant(ContactSearchFields, DirtyFieldsMixin, models.Model):
     '''
     企業・組織情報を管理するモデル
     '''
     class Meta:
         ordering = ['tenant_code']
+        indexes = [
+            # 電話番号・Email での検索（q=）用
+            search_key_index('tel_digits', name='tenant_tel_digits_idx', scoped=False),
+            search_key_index('email_lower', name='tenant_email_lower_idx', scoped=False),
+            search_key_index('email_domain', name='tenant_email_domain_idx', scoped=False),
+        ]
+
+    # bulk_create / bulk_update でも検索用の列を更新する
+    objects = ContactSearchQuerySet.as_manager()
 
     tenant_code = models.UUIDField(
         default=uuid.uuid4,
@@ -90,7 +100,7 @@ class Tenant(models.Model):
         help_text='建物名・部屋番号などを150文字以内で入力してください。（任意）'
     )
 
-    # Tenantモデルだけは共通クラスの継承をしない
+    # Tenantモデルだけは共通クラスの継承をしない（変更項目だけの保存は DirtyFieldsMixin で揃える）
     is_deleted = models.BooleanField(default=False, verbose_name='削除フラグ')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='作成日時')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新日時')
@@ -114,3 +124,91 @@ class Tenant(models.Model):
 
     def get_absolute_url(self):
         return reverse('tenants:edit', kwargs={'pk': self.pk})
+
+
+class TenantStats(models.Model):
+    '''
+    テナントごとの取引先件数（区分 × 削除フラグ）
+    - 一覧・ダッシュボードで COUNT(*) GROUP BY を毎回流さないための集計テーブル
+    - 取引先の登録・区分変更・論理削除・復元・CSV取込のたびに差分で更新する（tenants.stats）
+    - アーカイブ済みの取引先は「削除済み」に含める（アーカイブ / 復元で件数は変わらない）
+    - ずれた場合は reconcile_tenant_stats コマンドで再集計する
+    '''
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='stats', verbose_name='テナント')
+    partner_type = models.CharField(max_length=20, verbose_name='取引先区分')
+    is_deleted = models.BooleanField(verbose_name='削除フラグ')
+    partner_count = models.BigIntegerField(default=0, verbose_name='取引先件数')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新日時')
+
+    class Meta:
+        verbose_name = 'テナント集計'
+        verbose_name_plural = 'テナント集計'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tenant', 'partner_type', 'is_deleted'],
+                name='unique_tenant_stats_key'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.tenant_id} {self.partner_type} deleted={self.is_deleted}: {self.partner_count}'
+
+
+class TenantPurgeJob(models.Model):
+    '''
+    テナントの物理削除ジョブ（purge_tenants コマンドで実行する）
+    - テナントに属する行をモデルごとに小さなバッチで削除する（1つの巨大なトランザクションにしない）
+    - 進捗はバッチごとに同じトランザクションで記録するため、中断しても続きから再開できる
+    - 最後にテナント自体を削除するため、テナントは外部キーではなく ID と名称で持つ
+    '''
+    STATUS_CHOICES = [
+        ('pending', '待機中'),
+        ('running', '実行中'),
+        ('done', '完了'),
+        ('failed', '失敗'),
+    ]
+    ACTIVE_STATUSES = ('pending', 'running')
+
+    tenant_id = models.BigIntegerField(db_index=True, verbose_name='テナントID')
+    tenant_name = models.CharField(max_length=100, verbose_name='テナント名称')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name='状態')
+    # {"app_label.ModelName": {"total": 初回実行時の件数, "deleted": 削除済み件数}}
+    progress = models.JSONField(default=dict, verbose_name='進捗')
+    batch_size = models.PositiveIntegerField(default=1000, verbose_name='バッチ件数')
+    batches = models.PositiveIntegerField(default=0, verbose_name='実行済みバッチ数')
+    last_error = models.TextField(blank=True, default='', verbose_name='エラー内容')
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+        verbose_name='依頼者'
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='作成日時')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='開始日時')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='終了日時')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新日時')
+
+    class Meta:
+        verbose_name = 'テナント削除ジョブ'
+        verbose_name_plural = 'テナント削除ジョブ'
+        ordering = ['-created_at']
+        constraints = [
+            # 1テナントにつき実行中のジョブは1つだけ
+            models.UniqueConstraint(
+                fields=['tenant_id'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='unique_active_tenant_purge'
+            )
+        ]
+
+    def __str__(self):
+        return f'purge {self.tenant_name} ({self.tenant_id}): {self.status}'
+
+    @property
+    def total_rows(self) -> int:
+        return sum(p['total'] for p in self.progress.values())
+
+    @property
+    def deleted_rows(self) -> int:
+        return sum(p['deleted'] for p in self.progress.values())
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from accounts.models import User
+from api.authentication import invalidate_users
+from api.partitioning import drop_list_partition, get_partition_spec, is_partitioned
+from .models import Tenant, TenantPurgeJob
+
+# テナントの物理削除（TenantPurgeJob）
+# - テナントを参照するモデルを、他から参照される側が後になる順に1つずつ削除する（取引先 → ユーザー → テナント）
+# - 1バッチ = 1トランザクション。所要時間が target_ms を超えたらバッチを半分に、半分未満なら倍にする
+# - バッチの間は sleep 秒待つ（他テナントのリクエストに DB を譲る）
+# - テナント専用の list パーティションがあれば、行を消さずにパーティションごと切り離して削除する
+
+MIN_BATCH_SIZE = 100
+LOCK_TIMEOUT_MS = 2000
+
+# ジョブを実行中のプロセスを1つに絞るためのアドバイザリロックの名前空間
+ADVISORY_LOCK_CLASS = 4404
+
+
+def purge_plan() -> list[tuple]:
+    '''
+    削除する (モデル, テナントへの外部キー名) を削除順に返す
+    - 他の対象モデルから参照されているモデル（ユーザーなど）は、参照する側より後にする
+    '''
+    targets = {}
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if field.many_to_one and field.related_model is Tenant:
+                targets[model] = field.name
+                break
+
+    def references(model, target):
+        return any(f.many_to_one and f.related_model is target for f in model._meta.concrete_fields)
+
+    ordered = []
+    remaining = sorted(targets, key=lambda m: m._meta.label)
+    while remaining:
+        ready = [m for m in remaining if not any(o is not m and references(o, m) for o in remaining)]
+        # 循環参照がある場合はそのままの順で消す（外部キーは Django 側の SET_NULL / CASCADE で処理される）
+        for model in ready or remaining:
+            ordered.append((model, targets[model]))
+            remaining.remove(model)
+    return ordered
+
+
+def start_purge(tenant: Tenant, *, user=None) -> tuple[TenantPurgeJob, bool]:
+    '''
+    テナントの削除ジョブを登録する（実行中のジョブがあればそれを返す）
+    - テナントを論理削除し、所属ユーザーを無効化する（以降はログイン・API 利用ができない）
+    - 戻り値: (ジョブ, 新規作成したか)
+    '''
+    with transaction.atomic():
+        job = TenantPurgeJob.objects.select_for_update().filter(
+            tenant_id=tenant.pk, status__in=TenantPurgeJob.ACTIVE_STATUSES
+        ).first()
+        if job is not None:
+            return job, False
+
+        Tenant.objects.filter(pk=tenant.pk).update(is_deleted=True, update_user=user, updated_at=timezone.now())
+        user_ids = list(User.objects.filter(tenant_id=tenant.pk).values_list("pk", flat=True))
+        User.objects.filter(pk__in=user_ids).update(is_active=False)
+        transaction.on_commit(lambda: invalidate_users(user_ids))
+
+        # 件数は run_job の初回に数える（テナント・ユーザーの行ロックを持ったまま全テーブルを数えない）
+        job = TenantPurgeJob.objects.create(
+            tenant_id=tenant.pk, tenant_name=tenant.tenant_name, progress={}, requested_by=user,
+        )
+    return job, True
+
+
+@contextmanager
+def job_lock(job: TenantPurgeJob):
+    '''
+    同じジョブを複数のプロセスで実行しないためのセッション単位のロック（取れなければ None を返す）
+    - プロセスが落ちれば接続と一緒に解放されるため、次回の実行で再開できる
+    '''
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s, %s)", [ADVISORY_LOCK_CLASS, job.pk])
+        locked = cursor.fetchone()[0]
+    try:
+        yield job if locked else None
+    finally:
+        if locked:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s, %s)", [ADVISORY_LOCK_CLASS, job.pk])
+
+
+def delete_batch(model, field: str, tenant_id: int, batch_size: int) -> int:
+    '''
+    テナントの行を最大 batch_size 件削除する（1トランザクション）
+    - ORM の delete() を使うため、ユーザーの SET_NULL やシグナルなどは通常どおり処理される
+      （参照もシグナルもない取引先などは DELETE 1文になる）
+    '''
+    manager = model._base_manager
+    pks = list(manager.filter(**{field: tenant_id}).order_by().values_list("pk", flat=True)[:batch_size])
+    if not pks:
+        return 0
+    _, per_model = manager.filter(**{field: tenant_id, "pk__in": pks}).delete()
+    return per_model.get(model._meta.label, 0)
+
+
+def drop_partition(model, tenant_id: int) -> bool:
+    '''
+    テナント専用の list パーティションがあれば切り離して削除する
+    '''
+    spec = get_partition_spec(model._meta.label)
+    table = model._meta.db_table
+    if spec is None or spec.method != "list" or not is_partitioned(connection, table):
+        return False
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('lock_timeout', %s, true)", [f"{LOCK_TIMEOUT_MS}ms"])
+        return drop_list_partition(connection, table, tenant_id)
+
+
+def run_job(
+    job: TenantPurgeJob,
+    *,
+    target_ms: float = 200,
+    max_batch_size: int = 10_000,
+    sleep: float = 0.1,
+    max_seconds: float = 0,
+    on_batch=None,
+) -> TenantPurgeJob:
+    '''
+    ジョブを進める（完了・失敗・max_seconds 経過のいずれかで戻る。途中で戻った場合は次回続きから）
+    - on_batch(job, label, deleted, elapsed_ms): バッチごとの通知（進捗表示用）
+    '''
+    started = time.monotonic()
+    if job.status == "pending":
+        job.status, job.started_at = "running", timezone.now()
+        job.save(update_fields=["status", "started_at", "updated_at"])
+
+    try:
+        # 初回はモデルごとの件数を数えて進捗に入れる（再開時は数え直さない）
+        plan = purge_plan()
+        counting = [(model, field) for model, field in plan if model._meta.label not in job.progress]
+        if counting:
+            for model, field in counting:
+                total = model._base_manager.filter(**{field: job.tenant_id}).count()
+                job.progress[model._meta.label] = {"total": total, "deleted": 0}
+            job.save(update_fields=["progress", "updated_at"])
+
+        # jsonb はキーの順序を保たないため、削除順は purge_plan() に従う
+        for model, field in plan:
+            label = model._meta.label
+            if drop_partition(model, job.tenant_id):
+                job.progress[label]["deleted"] = job.progress[label]["total"]
+                job.save(update_fields=["progress", "updated_at"])
+                continue
+
+            while True:
+                if max_seconds and time.monotonic() - started >= max_seconds:
+                    return job
+                t = time.perf_counter()
+                try:
+                    with transaction.atomic():
+                        with connection.cursor() as cursor:
+                            cursor.execute("SELECT set_config('lock_timeout', %s, true)", [f"{LOCK_TIMEOUT_MS}ms"])
+                        deleted = delete_batch(model, field, job.tenant_id, job.batch_size)
+                        if deleted:
+                            job.progress[label]["deleted"] += deleted
+                            job.batches += 1
+                            job.save(update_fields=["progress", "batches", "batch_size", "updated_at"])
+                except DatabaseError as e:
+                    # ロック待ちのタイムアウトなどはバッチを小さくしてやり直す
+                    job.refresh_from_db(fields=["progress", "batches"])
+                    if job.batch_size <= MIN_BATCH_SIZE:
+                        raise
+                    job.batch_size = max(MIN_BATCH_SIZE, job.batch_size // 2)
+                    job.last_error = str(e)
+                    job.save(update_fields=["batch_size", "last_error", "updated_at"])
+                    time.sleep(sleep)
+                    continue
+
+                elapsed_ms = (time.perf_counter() - t) * 1000
+                if not deleted:
+                    break
+
+                # 次のバッチの件数を所要時間に合わせて調整する（次のバッチの進捗と一緒に保存される）
+                if elapsed_ms > target_ms:
+                    job.batch_size = max(MIN_BATCH_SIZE, job.batch_size // 2)
+                elif elapsed_ms < target_ms / 2:
+                    job.batch_size = min(max_batch_size, job.batch_size * 2)
+                if on_batch:
+                    on_batch(job, label, deleted, elapsed_ms)
+                time.sleep(sleep)
+
+        Tenant.objects.filter(pk=job.tenant_id).delete()
+        job.status, job.finished_at = "done", timezone.now()
+        job.save(update_fields=["status", "finished_at", "updated_at"])
+    except Exception as e:
+        job.status, job.last_error, job.finished_at = "failed", str(e), timezone.now()
+        job.save(update_fields=["status", "last_error", "finished_at", "updated_at"])
+        raise
+    return job
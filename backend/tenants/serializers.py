@@ -1,7 +1,11 @@
 from rest_framework import serializers
-from .models import Tenant
+from .models import Tenant, TenantPurgeJob
+from .stats import summarize
 
 class TenantSerializer(serializers.ModelSerializer):
+    # 取引先件数（TenantStats の集計値。一覧では prefetch_related("stats") 済みの行を使う）
+    partner_counts = serializers.SerializerMethodField()
+
     class Meta:
         model = Tenant
         fields = [
@@ -21,5 +25,42 @@ class TenantSerializer(serializers.ModelSerializer):
             "create_user",
             "updated_at",
             "update_user",
+            "partner_counts",
         ]
-        read_only_fields = ["id", "tenant_code", "is_deleted", "created_at", "create_user", "updated_at", "update_user"]
\ No newline at end of file
+        read_only_fields = ["id", "tenant_code", "is_deleted", "created_at", "create_user", "updated_at", "update_user"]
+
+    def get_partner_counts(self, obj):
+        return summarize(obj.stats.all())
+
+
+class TenantPurgeJobSerializer(serializers.ModelSerializer):
+    total_rows = serializers.IntegerField(read_only=True)
+    deleted_rows = serializers.IntegerField(read_only=True)
+    percent = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TenantPurgeJob
+        fields = [
+            "id",
+            "tenant_id",
+            "tenant_name",
+            "status",
+            "progress",
+            "total_rows",
+            "deleted_rows",
+            "percent",
+            "batch_size",
+            "batches",
+            "last_error",
+            "requested_by",
+            "created_at",
+            "started_at",
+            "finished_at",
+            "updated_at",
+        ]
+        read_only_fields = fields
+
+    def get_percent(self, obj):
+        if obj.status == "done" or not obj.total_rows:
+            return 100.0 if obj.status == "done" else 0.0
+        return round(min(obj.deleted_rows / obj.total_rows, 1) * 100, 1)
@@ -0,0 +1,187 @@
+from __future__ import annotations
+import uuid
+from dataclasses import dataclass
+from typing import Any
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+from rest_framework.response import Response
+from accounts.models import User
+from api.base import BaseCsvImporter, RowError
+from api.postal import apply_postal_lookup
+from api.partitioning import provision_tenant_partitions
+from tenants.models import Tenant
+from tenants.serializers import TenantSerializer
+
+
+CSV_HEADERS = [
+    "テナント名称", "代表者名", "Email", "電話番号",
+    "郵便番号", "都道府県", "市区町村", "住所", "建物名等",
+]
+
+# 任意列: 「初期ユーザーEmail」列があれば、テナントごとに最初のユーザーも作成する
+USER_HEADERS = ["初期ユーザーEmail", "初期ユーザー姓", "初期ユーザー名"]
+
+# 一括登録の1回あたりの件数
+BATCH_SIZE = 1000
+
+
+class TenantImportSerializer(TenantSerializer):
+    '''
+    取込用（Email の一意チェックは行ごとのクエリではなく、取込前にまとめて行う）
+    '''
+
+    class Meta(TenantSerializer.Meta):
+        extra_kwargs = {"email": {"validators": []}}
+
+
+@dataclass
+class TenantOkRow:
+    rowno: int
+    row: dict[str, Any]
+    validated: dict[str, Any]
+    user_email: str | None
+
+
+class CsvImporter(BaseCsvImporter):
+    '''
+    テナントのCSV一括登録
+    - 既存テナント / ユーザーの Email は prefetch で1回ずつまとめて読み、行ごとには問い合わせない
+    - テナントコード（UUID）はモデル生成時にアプリ側で採番し、bulk_create で BATCH_SIZE 件ずつ登録する
+    - 初期ユーザーはパスワード未設定（ログイン不可）で作成する
+      （1件ずつのパスワードハッシュ計算を避けるため。パスワードは管理画面などで設定する）
+    - list パーティションは取込のコミット後に作る（取込中に取引先テーブルを排他ロックしない）
+    '''
+    csv_headers = CSV_HEADERS
+    metrics_kind = "tenant"
+
+    def error_file_prefix(self) -> str:
+        return "tenants_import_error"
+
+    def init_seen_state(self):
+        return {"tenant": set(), "user": set()}  # CSV内重複検出
+
+    def prefetch(self, rows):
+        # 初期ユーザー列がある場合はエラーCSVにも出す
+        self.csv_headers = CSV_HEADERS + [h for h in USER_HEADERS if h in self._fieldnames]
+        self.with_users = USER_HEADERS[0] in self._fieldnames
+
+        emails = {(r.get("Email") or "").strip() for r in rows} - {""}
+        self.existing_tenant_emails = set(Tenant.objects.filter(email__in=emails).order_by().values_list("email", flat=True))
+
+        self.existing_user_emails = set()
+        if self.with_users:
+            user_emails = {(r.get(USER_HEADERS[0]) or "").strip().lower() for r in rows} - {""}
+            self.existing_user_emails = set(
+                User.objects.annotate(email_lower=Lower("email"))
+                .filter(email_lower__in=user_emails)
+                .values_list("email_lower", flat=True)
+            )
+
+    def serializer_data(self, row: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "tenant_name": row.get("テナント名称"),
+            "representative_name": row.get("代表者名"),
+            "email": row.get("Email"),
+            "tel_number": row.get("電話番号"),
+            "postal_code": row.get("郵便番号"),
+            "state": row.get("都道府県"),
+            "city": row.get("市区町村"),
+            "address": row.get("住所"),
+            "address2": row.get("建物名等"),
+        }
+
+    def validate_row(self, *, rowno: int, row: dict[str, Any], seen: dict) -> list[str]:
+        errs: list[str] = []
+        email = (row.get("Email") or "").strip()
+
+        data = self.serializer_data(row)
+        # 郵便番号の形をそろえ、都道府県・市区町村と突き合わせる（空なら補う）
+        errs += apply_postal_lookup(data)
+        errs += self.validate_serializer(TenantImportSerializer, rowno=rowno, data=data)
+
+        # Email の重複（CSV内 / 登録済み）
+        if email:
+            if email in seen["tenant"]:
+                errs.append("CSV内で同じEmailが重複しています")
+            seen["tenant"].add(email)
+            if email in self.existing_tenant_emails:
+                errs.append("同じメールアドレスが既に登録されています")
+
+        user_email = (row.get(USER_HEADERS[0]) or "").strip() if self.with_users else ""
+        if user_email:
+            try:
+                validate_email(user_email)
+            except ValidationError:
+                errs.append("初期ユーザーEmailの形式が正しくありません")
+            key = user_email.lower()
+            if key in seen["user"]:
+                errs.append("CSV内で同じ初期ユーザーEmailが重複しています")
+            seen["user"].add(key)
+            if key in self.existing_user_emails:
+                errs.append("初期ユーザーEmailは既にユーザーとして登録されています")
+
+        return errs
+
+    def build_ok_row(self, *, rowno: int, row: dict[str, Any], seen: dict) -> TenantOkRow:
+        user_email = (row.get(USER_HEADERS[0]) or "").strip() if self.with_users else ""
+        return TenantOkRow(rowno=rowno, row=row, validated=self.validated[rowno], user_email=user_email or None)
+
+    def save_ok_rows(self, ok_rows: list[TenantOkRow]) -> int:
+        user = self.request.user
+
+        tenants = [
+            Tenant(tenant_code=uuid.uuid4(), create_user=user, update_user=user, **r.validated)
+            for r in ok_rows
+        ]
+        Tenant.objects.bulk_create(tenants, batch_size=BATCH_SIZE)
+        # bulk_create ではシグナルが飛ばないため、list パーティションはここで作る
+        # （親テーブルを排他ロックするため、取込のトランザクションがコミットされてから作る）
+        tenant_ids = [tenant.pk for tenant in tenants]
+        transaction.on_commit(lambda: provision_tenant_partitions(tenant_ids))
+
+        password = make_password(None)  # ログイン不可（パスワード未設定）
+        users = [
+            User(
+                tenant=tenant,
+                email=User.objects.normalize_email(r.user_email),
+                last_name=(r.row.get("初期ユーザー姓") or "").strip(),
+                first_name=(r.row.get("初期ユーザー名") or "").strip(),
+                password=password,
+                is_active=True,
+                create_user=user,
+                update_user=user,
+            )
+            for r, tenant in zip(ok_rows, tenants)
+            if r.user_email
+        ]
+        User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+        self.users_created = len(users)
+        return len(tenants)
+
+    def on_integrity_error(self, ok_rows: list[TenantOkRow]) -> list[RowError]:
+        # 検証後に他の取込・登録で同じ Email が登録された行
+        emails = set(
+            Tenant.objects.filter(email__in=[r.validated["email"] for r in ok_rows]).order_by().values_list("email", flat=True)
+        )
+        user_emails = set(
+            User.objects.annotate(email_lower=Lower("email"))
+            .filter(email_lower__in=[r.user_email.lower() for r in ok_rows if r.user_email])
+            .values_list("email_lower", flat=True)
+        )
+        conflicts: list[RowError] = []
+        for r in ok_rows:
+            if r.validated["email"] in emails or (r.user_email and r.user_email.lower() in user_emails):
+                conflicts.append(
+                    RowError(
+                        rowno=r.rowno,
+                        row=r.row,
+                        errors=["同時更新により重複が発生しました（既に同じメールアドレスが登録されています）"],
+                    )
+                )
+        return conflicts
+
+    def success_response(self, created_count: int):
+        return Response({"count": created_count, "users": getattr(self, "users_created", 0)}, status=200)
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+from collections import Counter
+from typing import Iterable
+
+from django.db import connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import TenantStats
+
+# テナント集計（TenantStats）の差分更新・再集計
+# - 差分は取引先の書き込みと同じトランザクションで反映する（ロールバックされれば集計も戻る）
+# - 集計行は (tenant, partner_type, is_deleted) の順に並べて更新する（同時更新でデッドロックしないため）
+# - 同じテナントへの同時書き込みは集計行のロックで直列化される（取込などの長いトランザクション中は待たされる）
+
+StatsKey = tuple[int, str, bool]
+
+
+def partner_stats_key(partner) -> StatsKey:
+    return (partner.tenant_id, partner.partner_type, bool(partner.is_deleted))
+
+
+def partner_types() -> list[str]:
+    from partners.models import Partner
+    return [value for value, _ in Partner.PARTNER_TYPE_CHOICES]
+
+
+def apply_deltas(deltas: Counter, *, using: str = "default") -> None:
+    '''
+    集計行に件数の増減を加える（行がなければ作る）
+    '''
+    rows = sorted((key, n) for key, n in deltas.items() if n)
+    if not rows:
+        return
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = qn(TenantStats._meta.db_table)
+    values = ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))
+    now = timezone.now()
+    params = [p for (tenant_id, partner_type, is_deleted), n in rows for p in (tenant_id, partner_type, is_deleted, n, now)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({qn('tenant_id')}, {qn('partner_type')}, {qn('is_deleted')}, "
+            f"{qn('partner_count')}, {qn('updated_at')}) VALUES {values} "
+            f"ON CONFLICT ({qn('tenant_id')}, {qn('partner_type')}, {qn('is_deleted')}) DO UPDATE SET "
+            f"{qn('partner_count')} = {table}.{qn('partner_count')} + EXCLUDED.{qn('partner_count')}, "
+            f"{qn('updated_at')} = EXCLUDED.{qn('updated_at')}",
+            params,
+        )
+
+
+def track_partner_save(partner, *, created: bool, using: str = "default") -> None:
+    '''
+    取引先1件の保存（登録・区分変更・論理削除・復元）を集計に反映する
+    - 変更前の区分・削除フラグは読み込み時に覚えた値（Partner.from_db）を使う
+    - 読み込まずに保存したインスタンスは変更前が分からないため反映しない（再集計で補正する）
+    '''
+    new = partner_stats_key(partner)
+    old = None if created else getattr(partner, "_loaded_stats_key", None)
+    if not created and (old is None or old == new):
+        return
+    deltas = Counter({new: 1})
+    if old is not None:
+        deltas[old] -= 1
+    apply_deltas(deltas, using=using)
+    partner._loaded_stats_key = new
+
+
+def track_partners_created(partners: Iterable, *, using: str = "default") -> None:
+    '''
+    bulk_create などシグナルが飛ばない一括登録を集計に反映する
+    '''
+    apply_deltas(Counter(partner_stats_key(p) for p in partners), using=using)
+
+
+def actual_counts(tenant_ids: list[int], *, using: str = "default") -> Counter:
+    '''
+    取引先マスタ・アーカイブから数え直した件数（アーカイブ済みは削除済みとして数える）
+    '''
+    from partners.models import Partner, PartnerArchive
+
+    counts = Counter()
+    rows = (
+        Partner.objects.using(using).filter(tenant_id__in=tenant_ids)
+        .values_list("tenant_id", "partner_type", "is_deleted").annotate(n=Count("id")).order_by()
+    )
+    for tenant_id, partner_type, is_deleted, n in rows:
+        counts[(tenant_id, partner_type, is_deleted)] += n
+    archived = (
+        PartnerArchive.objects.using(using).filter(tenant_id__in=tenant_ids)
+        .values_list("tenant_id", "partner_type").annotate(n=Count("id")).order_by()
+    )
+    for tenant_id, partner_type, n in archived:
+        counts[(tenant_id, partner_type, True)] += n
+    return counts
+
+
+def reconcile(tenant_ids: list[int], *, fix: bool = True, using: str = "default") -> list[tuple[StatsKey, int, int]]:
+    '''
+    指定テナントの集計を数え直し、ずれを返す（fix=True なら補正する）
+    - 戻り値: [(キー, 集計上の件数, 実際の件数)]
+    - 補正時は対象テナントの集計行を先にすべて作ってロックしてから数える
+      （ロック中の書き込みは集計行の更新で待たされ、補正後の値に差分が加わる）
+    '''
+    keys = sorted(
+        (tenant_id, partner_type, is_deleted)
+        for tenant_id in tenant_ids for partner_type in partner_types() for is_deleted in (False, True)
+    )
+    with transaction.atomic(using=using):
+        stats = TenantStats.objects.using(using).filter(tenant_id__in=tenant_ids)
+        if fix:
+            TenantStats.objects.using(using).bulk_create(
+                [TenantStats(tenant_id=t, partner_type=pt, is_deleted=d) for t, pt, d in keys],
+                ignore_conflicts=True,
+            )
+            stats = stats.select_for_update().order_by("tenant_id", "partner_type", "is_deleted")
+        stored = {(s.tenant_id, s.partner_type, s.is_deleted): s for s in stats}
+        actual = actual_counts(tenant_ids, using=using)
+
+        drift = []
+        for key in sorted(set(stored) | set(actual)):
+            have = stored[key].partner_count if key in stored else 0
+            if have != actual[key]:
+                drift.append((key, have, actual[key]))
+        if fix and drift:
+            now = timezone.now()
+            changed = []
+            for key, _, n in drift:
+                s = stored[key]
+                s.partner_count, s.updated_at = n, now
+                changed.append(s)
+            TenantStats.objects.using(using).bulk_update(changed, ["partner_count", "updated_at"])
+    return drift
+
+
+def summarize(stats: Iterable[TenantStats]) -> dict:
+    '''
+    集計行を API 用の形にまとめる
+    {"live": 件数, "deleted": 件数, "by_type": {区分: {"live": 件数, "deleted": 件数}}}
+    '''
+    by_type = {partner_type: {"live": 0, "deleted": 0} for partner_type in partner_types()}
+    for s in stats:
+        counts = by_type.setdefault(s.partner_type, {"live": 0, "deleted": 0})
+        counts["deleted" if s.is_deleted else "live"] += s.partner_count
+    return {
+        "live": sum(c["live"] for c in by_type.values()),
+        "deleted": sum(c["deleted"] for c in by_type.values()),
+        "by_type": by_type,
+    }
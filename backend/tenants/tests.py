@@ -1,3 +1,349 @@
-from django.test import TestCase
+import io
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from api.partitioning import (
+    PartitionSpec, convert_to_partitioned, is_partitioned, list_partition_name, provision_tenant_partitions,
+)
+from partners.models import Partner
+from partners.services.partner_csv_importer import CSV_HEADERS
+from .filters import tenant_queryset
+from .models import Tenant, TenantPurgeJob, TenantStats
+from .purge import run_job
+from .services.tenant_csv_importer import CSV_HEADERS as TENANT_CSV_HEADERS, USER_HEADERS
+from .stats import reconcile
+
+
+class TenantStatsTests(TestCase):
+    '''
+    取引先の登録・区分変更・論理削除・復元・CSV取込がテナント集計（TenantStats）に反映され、
+    数え直した件数と一致することを確認する
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(tenant_name="テナント", representative_name="代表者", email="t@example.com")
+        cls.user = User.objects.create_user(email="stats@example.com", password="pw-12345678", tenant=cls.tenant)
+
+    def setUp(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+    def counts(self):
+        return {
+            (s.partner_type, s.is_deleted): s.partner_count
+            for s in TenantStats.objects.filter(tenant=self.tenant) if s.partner_count
+        }
+
+    def test_partner_writes_update_counts(self):
+        pk = self.client.post(
+            "/api/partners/", {"partner_name": "取引先A", "email": "a@example.com", "partner_type": "customer"},
+            content_type="application/json", headers=self.headers,
+        ).json()["id"]
+        self.client.post(
+            "/api/partners/", {"partner_name": "取引先B", "email": "b@example.com", "partner_type": "customer"},
+            content_type="application/json", headers=self.headers,
+        )
+        self.assertEqual(self.counts(), {("customer", False): 2})
+
+        self.client.patch(f"/api/partners/{pk}/", {"partner_type": "supplier"}, content_type="application/json", headers=self.headers)
+        self.assertEqual(self.counts(), {("customer", False): 1, ("supplier", False): 1})
+
+        # 区分・削除フラグ以外の更新では変わらない
+        self.client.patch(f"/api/partners/{pk}/", {"contact_name": "担当"}, content_type="application/json", headers=self.headers)
+        self.client.delete(f"/api/partners/{pk}/", headers=self.headers)
+        self.assertEqual(self.counts(), {("customer", False): 1, ("supplier", True): 1})
+
+        self.client.post(f"/api/partners/{pk}/restore/", headers=self.headers)
+        self.assertEqual(self.counts(), {("customer", False): 1, ("supplier", False): 1})
+
+        body = ",".join(CSV_HEADERS) + "\n"
+        body += "".join(f"取込{i},トリコミ,仕入先,,,c{i}@example.com,,,,,,\n" for i in range(3))
+        file = SimpleUploadedFile("partners.csv", body.encode("utf-8"), content_type="text/csv")
+        self.client.post("/api/partners/import/", {"file": file}, headers=self.headers)
+        self.assertEqual(self.counts(), {("customer", False): 1, ("supplier", False): 4})
+        self.assertEqual(reconcile([self.tenant.pk], fix=False), [])
+
+    def test_reconcile_fixes_drift(self):
+        Partner.objects.bulk_create(
+            Partner(tenant=self.tenant, partner_name=f"取引先{i}", email=f"p{i}@example.com", is_deleted=(i % 4 == 0))
+            for i in range(8)
+        )
+        out = io.StringIO()
+        call_command("reconcile_tenant_stats", tenant=[self.tenant.pk], stdout=out)
+        self.assertIn("fixed 2 drifted counts", out.getvalue())
+        self.assertEqual(self.counts(), {("customer", False): 6, ("customer", True): 2})
+        self.assertEqual(reconcile([self.tenant.pk]), [])
+
+    def test_tenant_list_exposes_counts_without_per_row_queries(self):
+        other = Tenant.objects.create(tenant_name="他テナント", representative_name="代表者", email="o@example.com")
+        Partner.objects.bulk_create(
+            Partner(tenant=t, partner_name=f"取引先{i}", email=f"p{i}@example.com", partner_type="both")
+            for t in (self.tenant, other) for i in range(3)
+        )
+        reconcile([self.tenant.pk, other.pk])
+
+        self.client.get("/api/tenants/", headers=self.headers)  # 認証キャッシュを温める
+        with self.assertNumQueries(3):  # 件数 + テナント + 集計（prefetch）
+            response = self.client.get("/api/tenants/", headers=self.headers)
+        rows = {r["id"]: r["partner_counts"] for r in response.json()["results"]}
+        self.assertEqual(rows[other.pk]["live"], 3)
+        self.assertEqual(rows[other.pk]["by_type"]["both"], {"live": 3, "deleted": 0})
+
+
+class TenantPurgeTests(TestCase):
+    '''
+    テナント削除ジョブが、対象テナントの行だけをバッチで削除し、中断しても続きから再開できることを確認する
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.home = Tenant.objects.create(tenant_name="運営", representative_name="代表者", email="home@example.com")
+        cls.admin = User.objects.create_user(email="admin@example.com", password="pw-12345678", tenant=cls.home, is_staff=True)
+        cls.target = Tenant.objects.create(tenant_name="解約", representative_name="代表者", email="gone@example.com")
+        cls.member = User.objects.create_user(email="member@example.com", password="pw-12345678", tenant=cls.target)
+        for tenant in (cls.home, cls.target):
+            Partner.objects.bulk_create(
+                Partner(tenant=tenant, partner_name=f"取引先{i}", email=f"p{i}@example.com", create_user=cls.member)
+                for i in range(250)
+            )
+        reconcile([cls.home.pk, cls.target.pk])
+
+    def setUp(self):
+        token = RefreshToken.for_user(self.admin).access_token
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+    def request_purge(self, tenant):
+        return self.client.post(f"/api/tenants/{tenant.pk}/purge/", headers=self.headers)
+
+    def test_purge_runs_in_batches_and_reports_progress(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.request_purge(self.target)
+        self.assertEqual(response.status_code, 202)
+        job = response.json()
+        # 登録時は件数を数えない（初回の実行で数える）
+        self.assertEqual((job["progress"], job["total_rows"], job["percent"]), ({}, 0, 0.0))
+        self.assertFalse([q for q in queries.captured_queries if "COUNT(" in q["sql"]])
+        self.assertTrue(Tenant.objects.get(pk=self.target.pk).is_deleted)
+        self.assertFalse(User.objects.get(pk=self.member.pk).is_active)
+        self.assertEqual(self.request_purge(self.target).status_code, 200)  # 二重登録しない
+
+        TenantPurgeJob.objects.filter(pk=job["id"]).update(batch_size=100)
+        call_command("purge_tenants", sleep=0, stdout=io.StringIO())
+
+        job = self.client.get(f"/api/tenants/purge-jobs/{job['id']}/", headers=self.headers).json()
+        self.assertEqual((job["status"], job["deleted_rows"], job["percent"]), ("done", 257, 100.0))
+        self.assertEqual(job["total_rows"], 250 + 1 + 6)  # 取引先 + ユーザー + 集計行（区分 × 削除フラグ）
+        self.assertGreaterEqual(job["batches"], 3)
+        self.assertFalse(Tenant.objects.filter(pk=self.target.pk).exists())
+        self.assertEqual(Partner.objects.filter(tenant=self.home).count(), 250)
+        self.assertFalse(Partner.objects.filter(tenant=self.home, create_user__isnull=False).exists())
+
+    def test_failed_job_resumes_from_progress(self):
+        job = TenantPurgeJob.objects.get(pk=self.request_purge(self.target).json()["id"])
+        job.batch_size = 100
+        job.save()
+
+        def interrupt(job, label, deleted, elapsed_ms):
+            raise RuntimeError("interrupted")
+
+        with self.assertRaises(RuntimeError):
+            run_job(job, sleep=0, target_ms=10_000, on_batch=interrupt)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress["partners.Partner"]["deleted"]), ("failed", 100))
+
+        call_command("purge_tenants", retry_failed=True, sleep=0, stdout=io.StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.deleted_rows), ("done", 257))
+
+    def test_cannot_purge_own_tenant(self):
+        self.assertEqual(self.request_purge(self.home).status_code, 400)
+
+    def test_restore_rejected_until_purge_finishes(self):
+        job = TenantPurgeJob.objects.get(pk=self.request_purge(self.target).json()["id"])
+
+        def restore():
+            with self.captureOnCommitCallbacks(execute=True):
+                return self.client.post(f"/api/tenants/{self.target.pk}/restore/", headers=self.headers)
+
+        for job_status in ("pending", "running", "failed"):
+            TenantPurgeJob.objects.filter(pk=job.pk).update(status=job_status)
+            with self.subTest(status=job_status):
+                response = restore()
+                self.assertEqual(response.status_code, 409)
+                self.assertEqual(response.json()["job"]["id"], job.pk)
+                self.assertTrue(Tenant.objects.get(pk=self.target.pk).is_deleted)
+                self.assertFalse(User.objects.get(pk=self.member.pk).is_active)
+
+        # 削除が終わればテナント自体がない
+        TenantPurgeJob.objects.filter(pk=job.pk).update(status="pending")
+        call_command("purge_tenants", sleep=0, stdout=io.StringIO())
+        self.assertEqual(restore().status_code, 404)
+
+    def test_restore_without_purge_job(self):
+        Tenant.objects.filter(pk=self.target.pk).update(is_deleted=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/api/tenants/{self.target.pk}/restore/", headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Tenant.objects.get(pk=self.target.pk).is_deleted)
+
+
+class TenantCsvImportTests(TestCase):
+    '''
+    テナントのCSV取込が、行数に関係なく一定のクエリ数で重複チェック・登録を行い、初期ユーザーも作成することを確認する
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.home = Tenant.objects.create(tenant_name="運営", representative_name="代表者", email="home@example.com")
+        cls.admin = User.objects.create_user(email="admin@example.com", password="pw-12345678", tenant=cls.home, is_staff=True)
+
+    def setUp(self):
+        token = RefreshToken.for_user(self.admin).access_token
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+    def upload(self, lines, *, with_users=True):
+        headers = TENANT_CSV_HEADERS + (USER_HEADERS if with_users else [])
+        body = ",".join(headers) + "\n" + "".join(line + "\n" for line in lines)
+        file = SimpleUploadedFile("tenants.csv", body.encode("utf-8"), content_type="text/csv")
+        return self.client.post("/api/tenants/import/", {"file": file}, headers=self.headers)
+
+    def test_import_creates_tenants_and_initial_users_in_constant_queries(self):
+        self.upload(["会社S,代表,small@example.com,,,,,,,small-owner@example.com,,"])  # 認証キャッシュを温める
+        with CaptureQueriesContext(connection) as small:
+            self.upload([f"会社S{i},代表,s{i}@example.com,,,,,,,s{i}-owner@example.com,," for i in range(2)])
+
+        lines = [f"会社{i},代表{i},co{i}@example.com,03-0000-0000,,東京都,,,,Owner{i}@Example.com,山田,太郎" for i in range(30)]
+        lines.append("会社X,代表X,cox@example.com,,,,,,,,,")  # 初期ユーザーなし
+        with self.assertNumQueries(len(small)):
+            response = self.upload(lines)
+        self.assertEqual(response.json(), {"count": 31, "users": 30})
+
+        user = User.objects.get(email="Owner3@example.com")
+        self.assertEqual((user.tenant.email, user.last_name, user.is_staff), ("co3@example.com", "山田", False))
+        self.assertFalse(user.has_usable_password())
+        self.assertEqual(Tenant.objects.filter(email__startswith="co").values("tenant_code").distinct().count(), 31)
+
+        # 検索用の列も bulk_create で作られ、q= の電話番号検索に使われる
+        self.assertEqual(tenant_queryset({"q": "0300000000"}).count(), 30)
+        self.assertEqual(tenant_queryset({"q": "@example.com"}).count(), Tenant.objects.filter(email__endswith="@example.com").count())
+
+    def test_duplicates_rejected_with_error_csv(self):
+        lines = [
+            "会社A,代表,home@example.com,,,,,,,new@example.com,,",
+            "会社B,代表,b@example.com,,,,,,,ADMIN@example.com,,",
+            "会社C,代表,c@example.com,,,,,,,c-owner@example.com,,",
+            "会社D,代表,c@example.com,,,,,,,c-owner@example.com,,",
+        ]
+        response = self.upload(lines)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        body = response.content.decode("utf-8-sig")
+        self.assertIn("同じメールアドレスが既に登録されています", body)
+        self.assertIn("初期ユーザーEmailは既にユーザーとして登録されています", body)
+        self.assertIn("CSV内で同じEmailが重複しています", body)
+        self.assertEqual(len(body.strip().splitlines()), 1 + 3)
+        self.assertFalse(Tenant.objects.filter(email="b@example.com").exists())
+
+    def test_requires_staff(self):
+        member = User.objects.create_user(email="member@example.com", password="pw-12345678", tenant=self.home)
+        self.headers = {"Authorization": f"Bearer {RefreshToken.for_user(member).access_token}"}
+        self.assertEqual(self.upload(["会社A,代表,a@example.com,,,,,,,,,"]).status_code, 403)
+
+
+@override_settings(PARTITIONED_MODELS={"partners.Partner": {"method": "list"}})
+class TenantListPartitionTests(TestCase):
+    '''
+    取引先マスタを list パーティション化したとき、テナント用のパーティションが登録のコミット後に作られることを確認する
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        # テストDB上で変換する（クラス単位のトランザクションでロールバックされる）
+        if not is_partitioned(connection, Partner._meta.db_table):
+            convert_to_partitioned(connection, Partner, PartitionSpec(method="list"))
+        cls.home = Tenant.objects.create(tenant_name="運営", representative_name="代表者", email="home@example.com")
+        cls.admin = User.objects.create_user(email="admin@example.com", password="pw-12345678", tenant=cls.home, is_staff=True)
+
+    def has_partition(self, tenant_id) -> bool:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", [list_partition_name(Partner._meta.db_table, tenant_id)])
+            return cursor.fetchone()[0] is not None
+
+    def test_partition_created_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            tenant = Tenant.objects.create(tenant_name="新規", representative_name="代表者", email="new@example.com")
+        self.assertFalse(self.has_partition(tenant.pk))
+        for callback in callbacks:
+            callback()
+        self.assertTrue(self.has_partition(tenant.pk))
+
+    def test_rows_in_default_partition_are_reported(self):
+        # パーティションがないまま DEFAULT に入った行があるテナントは作成できない（エラーにはしない）
+        with self.captureOnCommitCallbacks():
+            tenant = Tenant.objects.create(tenant_name="新規", representative_name="代表者", email="new@example.com")
+        Partner.objects.create(tenant=tenant, partner_name="取引先", email="p@example.com")
+        with self.assertLogs("api.partitioning", "WARNING"):
+            self.assertEqual(provision_tenant_partitions([self.home.pk, tenant.pk]), [tenant.pk])
+        self.assertFalse(self.has_partition(tenant.pk))
+
+    def test_csv_import_creates_partitions_after_commit(self):
+        token = RefreshToken.for_user(self.admin).access_token
+
+        def upload(n):
+            body = ",".join(TENANT_CSV_HEADERS) + "\n" + "".join(f"会社{n}-{i},代表,c{n}-{i}@example.com,,,,,,\n" for i in range(n))
+            file = SimpleUploadedFile("tenants.csv", body.encode("utf-8"), content_type="text/csv")
+            with CaptureQueriesContext(connection) as queries:
+                with self.captureOnCommitCallbacks() as callbacks:
+                    response = self.client.post("/api/tenants/import/", {"file": file}, headers={"Authorization": f"Bearer {token}"})
+            self.assertEqual(response.json(), {"count": n, "users": 0})
+            return queries, callbacks
+
+        upload(1)  # 認証キャッシュを温める
+        small, _ = upload(2)
+        queries, callbacks = upload(20)
+        # 取込中はパーティションを作らない（取引先テーブルを排他ロックしない）。クエリ数も件数によらない
+        self.assertEqual(len(queries), len(small))
+        self.assertFalse(any("PARTITION OF" in q["sql"] for q in queries.captured_queries))
+        tenant_ids = list(Tenant.objects.filter(email__startswith="c20-").values_list("pk", flat=True))
+        self.assertFalse(any(self.has_partition(pk) for pk in tenant_ids))
+
+        for callback in callbacks:
+            callback()
+        self.assertTrue(all(self.has_partition(pk) for pk in tenant_ids))
+
+
+class TenantAsyncParityTests(TestCase):
+    '''
+    非同期版のテナント一覧・詳細（/api/async/tenants/）が、同期版（/api/tenants/）と同じ応答を返すことを確認する
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        Tenant.objects.bulk_create(
+            Tenant(tenant_name=f"テナント{i:02d}", representative_name="代表者", email=f"t{i}@example.com",
+                   tel_number=f"03-0000-{i:04d}", is_deleted=(i % 6 == 0))
+            for i in range(25)
+        )
+        cls.deleted = Tenant.objects.filter(is_deleted=True).first()
+
+    async def assertSameJson(self, path, params=None):
+        sync = await sync_to_async(self.client.get)(f"/api/tenants/{path}", params)
+        asynchronous = await self.async_client.get(f"/api/async/tenants/{path}", params)
+        self.assertEqual(asynchronous.status_code, sync.status_code)
+        self.assertEqual(asynchronous.content.decode().replace("/api/async/", "/api/"), sync.content.decode())
+
+    async def test_list_and_detail(self):
+        for path, params in (
+            ("", None), ("", {"page": "2"}), ("", {"ordering": "-tenant_name"}), ("", {"include_deleted": "1"}),
+            ("", {"q": "03-0000-001"}), ("", {"page": "5"}),
+            (f"{self.deleted.pk}/", None), (f"{self.deleted.pk}/", {"include_deleted": "1"}), ("999999/", None),
+        ):
+            with self.subTest(path=path, params=params):
+                await self.assertSameJson(path, params)
@@ -1,7 +1,9 @@
 from rest_framework.routers import DefaultRouter
-from .views import TenantViewSet
+from .views import TenantPurgeJobViewSet, TenantViewSet
 
 router = DefaultRouter()
+# "" の詳細ルート（<pk>/）に先に一致しないよう、先に登録する
+router.register(r"purge-jobs", TenantPurgeJobViewSet, basename="tenant-purge-job")
 router.register(r"", TenantViewSet, basename="tenant")
 
 urlpatterns = router.urls
\ No newline at end of file
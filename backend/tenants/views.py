@@ -1,10 +1,16 @@
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
-from django.db.models import Q
-from .models import Tenant
-from .serializers import TenantSerializer
+from api.changefeed import publish_instance_change
+from .filters import tenant_queryset
+from .models import Tenant, TenantPurgeJob
+from .purge import start_purge
+from .serializers import TenantPurgeJobSerializer, TenantSerializer
+from .services.tenant_csv_importer import CsvImporter
 
 class TenantViewSet(viewsets.ModelViewSet):
     serializer_class = TenantSerializer
@@ -22,28 +28,18 @@ class TenantViewSet(viewsets.ModelViewSet):
     ordering = ["tenant_name"]
 
     def get_queryset(self):
-        qs = Tenant.objects.all().order_by("tenant_code")
-
-        include_deleted = self.request.query_params.get("include_deleted", "0")
-        if include_deleted != "1":
-            qs = qs.filter(is_deleted=False)
-
-        q = self.request.query_params.get("q", "").strip()
-        if q:
-            qs = qs.filter(
-                Q(tenant_name__icontains=q) |
-                Q(representative_name__icontains=q) |
-                Q(email__icontains=q) |
-                Q(tel_number__icontains=q)
-            )
-        return qs
+        return tenant_queryset(self.request.query_params)
 
     def perform_create(self, serializer):
         # 必要なら create_user / update_user をセット
         serializer.save(create_user=self.request.user, update_user=self.request.user)
+        publish_instance_change(serializer.instance, "create", tenant_id=serializer.instance.pk)
 
     def perform_update(self, serializer):
         serializer.save(update_user=self.request.user)
+        # 変更された項目だけを保存する（変更がなければ行を書き換えず、通知もしない）
+        if serializer.instance.last_saved_fields:
+            publish_instance_change(serializer.instance, "update", tenant_id=serializer.instance.pk)
 
     def destroy(self, request, *args, **kwargs):
         # 論理削除
@@ -51,13 +47,66 @@ class TenantViewSet(viewsets.ModelViewSet):
         obj.is_deleted = True
         obj.update_user = request.user
         obj.save(update_fields=["is_deleted", "update_user", "updated_at"])
+        publish_instance_change(obj, "delete", tenant_id=obj.pk)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=["post"])
     def restore(self, request, pk=None):
         # self.get_object() は get_queryset() のフィルタが効いて削除済を拾えないのでNG
+        # 物理削除ジョブが終わっていない（待機中・実行中・失敗して再実行待ち）テナントは、
+        # 行の一部が既に削除されている場合があるため復元しない（409）
+        # テナント行をロックして確認するため、同時に依頼された削除（start_purge）とは順に処理される
+        with transaction.atomic():
+            obj = get_object_or_404(Tenant.objects.select_for_update(), pk=pk)
+            job = TenantPurgeJob.objects.filter(
+                tenant_id=obj.pk, status__in=[*TenantPurgeJob.ACTIVE_STATUSES, "failed"]
+            ).first()
+            if job is not None:
+                return Response(
+                    {"detail": "削除ジョブが完了していないため復元できません", "job": TenantPurgeJobSerializer(job).data},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            obj.is_deleted = False
+            obj.update_user = request.user
+            obj.save(update_fields=["is_deleted", "update_user", "updated_at"])
+            publish_instance_change(obj, "restore", tenant_id=obj.pk)
+        return Response(self.get_serializer(obj).data)
+
+    @action(
+        detail=False, methods=["post"], url_path="import",
+        parser_classes=[MultiPartParser, FormParser], permission_classes=[IsAdminUser],
+    )
+    def import_csv(self, request):
+        # CSVでテナントを一括登録する（「初期ユーザーEmail」列があれば初期ユーザーも作成する）
+        file = request.FILES.get("file")
+        if not file:
+            return Response({"detail": "CSVファイルが指定されていません"}, status=400)
+        return CsvImporter(request=request, file=file).run()
+
+    @action(detail=True, methods=["post"], permission_classes=[IsAdminUser])
+    def purge(self, request, pk=None):
+        # テナントの物理削除を依頼する（実際の削除は purge_tenants コマンドがバッチで行う）
+        # テナントは即時に論理削除され、所属ユーザーは無効化される
         obj = get_object_or_404(Tenant.objects.all(), pk=pk)
-        obj.is_deleted = False
-        obj.update_user = request.user
-        obj.save(update_fields=["is_deleted", "update_user", "updated_at"])
-        return Response(self.get_serializer(obj).data)
\ No newline at end of file
+        if obj.pk == request.user.tenant_id:
+            return Response({"detail": "自分の所属テナントは削除できません"}, status=status.HTTP_400_BAD_REQUEST)
+        job, created = start_purge(obj, user=request.user)
+        if created:
+            publish_instance_change(obj, "delete", tenant_id=obj.pk)
+        return Response(
+            TenantPurgeJobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK,
+        )
+
+
+class TenantPurgeJobViewSet(viewsets.ReadOnlyModelViewSet):
+    # テナント削除ジョブの進捗（管理者のみ）
+    serializer_class = TenantPurgeJobSerializer
+    permission_classes = [IsAdminUser]
+
+    def get_queryset(self):
+        qs = TenantPurgeJob.objects.all()
+        tenant_id = self.request.query_params.get("tenant_id")
+        if tenant_id and tenant_id.isdigit():
+            qs = qs.filter(tenant_id=int(tenant_id))
+        return qs
@@ -0,0 +1,26 @@
+import { useEffect, useRef } from "react";
+import { type ChangeEvent, subscribeChanges } from "../lib/changes";
+
+/**
+ * 変更フィードを購読し、指定モデルのイベントだけを受け取る。
+ * ハンドラは ref 経由で参照するので、再レンダーで再接続しない。
+ */
+export function useChangeFeed(
+  model: ChangeEvent["model"],
+  onChange: (e: ChangeEvent) => void,
+  onReset: () => void
+) {
+  const handlers = useRef({ onChange, onReset });
+  useEffect(() => {
+    handlers.current = { onChange, onReset };
+  });
+
+  useEffect(() => {
+    return subscribeChanges({
+      onChange: (e) => {
+        if (e.model === model) handlers.current.onChange(e);
+      },
+      onReset: () => handlers.current.onReset(),
+    });
+  }, [model]);
+}
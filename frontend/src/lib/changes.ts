@@ -0,0 +1,73 @@
+import { apiFetch } from "./api";
+
+// 変更フィードのイベント定義
+export type ChangeEvent = {
+  model: "partner" | "tenant";
+  op: "create" | "update" | "delete" | "restore" | "import" | "bulk";
+  id?: number;
+  updated_at?: string;
+  count?: number;
+};
+
+type Handlers = {
+  onChange: (e: ChangeEvent) => void;
+  // 取りこぼし発生時（全件再取得が必要）
+  onReset?: () => void;
+};
+
+const RECONNECT_MS = 3000;
+
+/**
+ * 変更フィード（SSE）を購読する
+ * - EventSource は Authorization ヘッダを付けられないため fetch のストリームで読む
+ * - 切断時は一定時間後に再接続する
+ * @returns 購読解除関数
+ */
+export function subscribeChanges(handlers: Handlers): () => void {
+  const ctrl = new AbortController();
+
+  const dispatch = (block: string) => {
+    let event = "message";
+    const data: string[] = [];
+    for (const line of block.split("\n")) {
+      if (line.startsWith("event:")) event = line.slice(6).trim();
+      else if (line.startsWith("data:")) data.push(line.slice(5).trim());
+    }
+    if (event === "reset") handlers.onReset?.();
+    else if (event === "change" && data.length) handlers.onChange(JSON.parse(data.join("\n")) as ChangeEvent);
+  };
+
+  (async () => {
+    while (!ctrl.signal.aborted) {
+      try {
+        const res = await apiFetch("/api/changes/", {
+          method: "GET",
+          headers: { Accept: "text/event-stream" },
+          signal: ctrl.signal,
+        });
+        if (!res.ok || !res.body) throw new Error(`change feed: ${res.status}`);
+
+        const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buf = "";
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buf += value;
+          let idx: number;
+          while ((idx = buf.indexOf("\n\n")) >= 0) {
+            dispatch(buf.slice(0, idx));
+            buf = buf.slice(idx + 2);
+          }
+        }
+        // 再接続までに起きた変更は拾えないので再取得させる
+        handlers.onReset?.();
+      } catch (e) {
+        if (ctrl.signal.aborted) return;
+        console.warn(e);
+      }
+      await new Promise((r) => setTimeout(r, RECONNECT_MS));
+    }
+  })();
+
+  return () => ctrl.abort();
+}
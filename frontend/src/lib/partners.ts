@@ -45,9 +45,16 @@ export type PartnerUpdatePayload = Partial<
   >
 >;
 
+// 一覧の絞り込み候補ごとの件数（facets=partner_type,state を指定したときだけ返る）
+// 各項目の件数には「他の項目」の絞り込みだけが効く（state が null の行は都道府県未設定）
+export type PartnerFacetField = "partner_type" | "state";
+export type PartnerFacets = Partial<Record<PartnerFacetField, { value: string | null; count: number }[]>>;
+
 type ListParams = {
   q?: string;
   partner_type?: Partner["partner_type"];
+  state?: string;
+  facets?: PartnerFacetField[];
   include_deleted?: boolean;
   ordering?: string;
   page?: number;
@@ -58,6 +65,8 @@ export function buildQuery(params?: ListParams) {
   const sp = new URLSearchParams();
   if (params?.q) sp.set("q", params.q);
   if (params?.partner_type) sp.set("partner_type", params.partner_type);
+  if (params?.state) sp.set("state", params.state);
+  if (params?.facets?.length) sp.set("facets", params.facets.join(","));
   if (params?.include_deleted) sp.set("include_deleted", "1");
   if (params?.ordering) sp.set("ordering", params.ordering);
   if (params?.page) sp.set("page", String(params.page));
@@ -103,6 +112,38 @@ export async function restorePartner(id: number): Promise<Partner> {
   return (await parseOrThrow(res)) as Partner;
 }
 
+// サジェスト結果（他画面の取引先選択用）
+export type PartnerSuggestion = Pick<Partner, "id" | "partner_name" | "partner_name_kana" | "partner_type">;
+
+export async function suggestPartners(prefix: string, limit?: number): Promise<PartnerSuggestion[]> {
+  const sp = new URLSearchParams({ prefix });
+  if (limit) sp.set("limit", String(limit));
+  const res = await apiFetch(`/api/partners/suggest/?${sp.toString()}`, { method: "GET" });
+  return (await parseOrThrow(res)) as PartnerSuggestion[];
+}
+
+// 重複の可能性がある取引先のグループ（/api/partners/duplicates/）
+export type PartnerDuplicateCluster = {
+  score: number; // 0〜1（グループ内の組の最大値）
+  members: Pick<Partner, "id" | "partner_name" | "partner_name_kana" | "tel_number" | "email" | "postal_code">[];
+  pairs: { refs: [number, number]; score: number; reasons: ("name" | "tel" | "postal_code" | "email" | "email_domain")[] }[];
+};
+
+/**
+ * 重複の可能性がある取引先のグループ
+ * @returns 取引先の多いテナントで集計中（202）の場合は null（しばらくしてから再取得する）
+ */
+export async function findDuplicatePartners(params?: { threshold?: number; limit?: number }): Promise<PartnerDuplicateCluster[] | null> {
+  const sp = new URLSearchParams();
+  if (params?.threshold != null) sp.set("threshold", String(params.threshold));
+  if (params?.limit != null) sp.set("limit", String(params.limit));
+  const qs = sp.toString();
+  const res = await apiFetch(qs ? `/api/partners/duplicates/?${qs}` : "/api/partners/duplicates/", { method: "GET" });
+  if (res.status === 202) return null;
+  const data = (await parseOrThrow(res)) as { results: PartnerDuplicateCluster[] };
+  return data.results;
+}
+
 export type Paginated<T> = {
   items: T[];
   count: number;
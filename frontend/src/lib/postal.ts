@@ -0,0 +1,28 @@
+import { apiFetch } from "./api";
+import { ApiError, parseOrThrow } from "./errors";
+
+// 郵便番号から引いた住所（1つの郵便番号に複数の町域がある場合は複数件）
+export type PostalAddress = {
+  state: string;
+  city: string;
+  town: string;
+};
+
+export type PostalLookup = {
+  postal_code: string; // 123-4567 の形
+  results: PostalAddress[];
+};
+
+/**
+ * 郵便番号から住所を引く
+ * @returns 該当なしの場合は null
+ */
+export async function lookupPostalCode(code: string): Promise<PostalLookup | null> {
+  const res = await apiFetch(`/api/postal/${encodeURIComponent(code)}/`, { method: "GET" });
+  try {
+    return (await parseOrThrow(res)) as PostalLookup;
+  } catch (e) {
+    if (e instanceof ApiError && e.status === 404) return null;
+    throw e;
+  }
+}
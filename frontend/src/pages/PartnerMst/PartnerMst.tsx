@@ -3,7 +3,8 @@ import { type Partner, type PartnerUpdatePayload, buildQuery } from "../../lib/p
 import { exportCSV, importCSV, downloadBlob, isImportCsvSuccess } from "../../lib/io";
 import { getYMDHMS } from "../../lib/api";
 import { useRowNavigator } from "../../hooks/useRowNavigator";
-import { listPartnersPaged, deletePartner, restorePartner, updatePartner, createPartner } from "../../lib/partners";
+import { listPartnersPaged, deletePartner, restorePartner, updatePartner, createPartner, getPartner } from "../../lib/partners";
+import { useChangeFeed } from "../../hooks/useChangeFeed";
 import DataTable from "../common/components/DataTable";
 import type { SortDir } from "../common/components/DataTable";
 import Pagination from "../common/components/Pagination";
@@ -219,6 +220,28 @@ export default function PartnerMst() {
     };
   }, [q, partnerType, includeDeleted, ordering, page, pageSize, reloadToken, selectedId, close, flash]);
 
+  // -----------------------------
+  // 他タブ・他ユーザーの変更を反映（変更フィード）
+  // - 表示中の行の更新は該当行だけ再取得して差し替える
+  // - 件数や並び順が変わり得る変更は一覧を再取得する
+  // -----------------------------
+  useChangeFeed(
+    "partner",
+    (e) => {
+      const id = e.id;
+      if (e.op === "update" && id != null) {
+        const current = rows.find((r) => r.id === id);
+        if (!current || current.updated_at === e.updated_at) return;
+        getPartner(id)
+          .then((p) => setRows((prev) => prev.map((r) => (r.id === p.id ? p : r))))
+          .catch((err) => console.error(err));
+        return;
+      }
+      bumpReload();
+    },
+    bumpReload
+  );
+
   // -----------------------------
   // 行クリック / 編集開始（アイコン）
   // -----------------------------